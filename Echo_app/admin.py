@@ -5,13 +5,16 @@ from .models import (
     Categoria, 
     Noticia, 
     InteracaoNoticia, 
-    Notificacao
+    Notificacao,
+    Recomendacao,
+    Tarefa
 )
 
 # 2. Sua configuração personalizada para PerfilUsuario (continua igual)
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_display = ("usuario", "data_criacao")
+    list_select_related = ("usuario",)
     search_fields = ("usuario__username", "biografia")
     list_filter = ("data_criacao",)
 
@@ -19,5 +22,35 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
 # (Você pode criar classes personalizadas para eles depois, se quiser)
 admin.site.register(Categoria)
 admin.site.register(Noticia)
-admin.site.register(InteracaoNoticia)
-admin.site.register(Notificacao)
\ No newline at end of file
+
+
+# O __str__ destes modelos lê usuario/noticia; sem select_related a listagem faz uma consulta por linha
+@admin.register(InteracaoNoticia)
+class InteracaoNoticiaAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "noticia", "tipo", "data_interacao")
+    list_filter = ("tipo",)
+    list_select_related = ("usuario", "noticia")
+    raw_id_fields = ("usuario", "noticia")
+
+
+@admin.register(Notificacao)
+class NotificacaoAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "data_criacao", "lida")
+    list_filter = ("lida",)
+    list_select_related = ("usuario",)
+    raw_id_fields = ("usuario", "noticia")
+
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ("funcao", "status", "tentativas", "data_criacao", "data_inicio", "data_conclusao")
+    list_filter = ("status", "funcao")
+    readonly_fields = ("data_criacao", "data_inicio", "data_conclusao", "erro")
+
+
+@admin.register(Recomendacao)
+class RecomendacaoAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "noticia", "pontuacao", "data_geracao")
+    list_select_related = ("usuario", "noticia")
+    search_fields = ("usuario__username",)
+    raw_id_fields = ("usuario", "noticia")
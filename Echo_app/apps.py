@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class EchoAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Echo_app'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import consultas_lentas, perfilamento, signals  # noqa: F401  (registra os receivers)
+
+        connection_created.connect(perfilamento.instalar_na_conexao, dispatch_uid='echo_perfilamento')
+        if settings.ECHO_CONSULTAS_LENTAS:
+            connection_created.connect(consultas_lentas.instalar_na_conexao, dispatch_uid='echo_consultas_lentas')
@@ -0,0 +1,47 @@
+"""
+Arquivos endereçados pelo conteúdo (fotos de perfil).
+
+O nome do arquivo no storage é o SHA-256 dos bytes (``fotos_perfil/ab/ab12...ef.png``):
+mandar a mesma foto de novo, ou a mesma foto em dois perfis, aponta para o
+arquivo que já existe em vez de gravar ``foto_x7Ab3kQ.png``. O espaço usado
+cresce com o número de imagens diferentes, não com o número de edições de perfil.
+
+Como um arquivo pode ser de vários perfis, trocar a foto nunca apaga a anterior
+na hora; o comando ``limpar_arquivos_orfaos`` remove depois o que nenhum
+registro usa mais. Os avatares prontos de ``static/avatars`` nem passam por
+aqui: o perfil guarda só o nome em ``avatar_padrao``.
+"""
+
+import hashlib
+import os
+
+EXTENSOES_EQUIVALENTES = {'.jpeg': '.jpg', '.jpe': '.jpg'}
+
+
+def resumo(arquivo):
+    """SHA-256 (hex) do conteúdo, lido em pedaços; o arquivo volta para o começo."""
+    sha = hashlib.sha256()
+    arquivo.seek(0)
+    for pedaco in arquivo.chunks():
+        sha.update(pedaco)
+    arquivo.seek(0)
+    return sha.hexdigest()
+
+
+def nome_por_conteudo(pasta, arquivo, resumo_hex=None):
+    extensao = os.path.splitext(arquivo.name or '')[1].lower()
+    extensao = EXTENSOES_EQUIVALENTES.get(extensao, extensao)
+    resumo_hex = resumo_hex or resumo(arquivo)
+    return f"{pasta.rstrip('/')}/{resumo_hex[:2]}/{resumo_hex}{extensao}"
+
+
+def salvar(campo, arquivo, resumo_hex=None):
+    """
+    Grava ``arquivo`` para o ``campo`` (FieldFile, ex.: ``perfil.foto_perfil``) e
+    retorna o nome a atribuir ao campo. Se o mesmo conteúdo já está no storage,
+    nada é gravado. ``resumo_hex`` evita reler o arquivo quando o hash já é conhecido.
+    """
+    nome = nome_por_conteudo(campo.field.upload_to, arquivo, resumo_hex)
+    if campo.storage.exists(nome):
+        return nome
+    return campo.storage.save(nome, arquivo)
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+User = get_user_model()
+
+
+class BackendComPerfil(ModelBackend):
+    """
+    Igual ao ModelBackend, mas carrega o ``perfil`` junto com o usuário da
+    sessão. O menu do ``base.html`` lê ``user.perfil.foto_perfil`` em toda
+    página, então isso economiza uma consulta por requisição logada.
+    """
+
+    def get_user(self, user_id):
+        try:
+            usuario = User._default_manager.select_related('perfil').get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
+
+    async def aget_user(self, user_id):
+        # Views assíncronas (request.auser()): o ModelBackend buscaria só o usuário, sem o perfil
+        try:
+            usuario = await User._default_manager.select_related('perfil').aget(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
@@ -0,0 +1,221 @@
+"""
+Sugestões de busca (autocompletar) servidas de uma trie em memória.
+
+A trie guarda títulos de notícias e nomes de categorias. Cada nó mantém só as
+``MAX_POR_NO`` sugestões mais recentes que passam por ele, então a consulta é
+uma descida de ``len(prefixo)`` nós e não toca no banco. Ao remover uma
+entrada, os nós que a listavam completam a lista com a melhor que sobrou na
+subárvore (as listas dos filhos mais as entradas que terminam no próprio nó).
+
+Ela é carregada na primeira consulta do processo e depois mantida pelos sinais
+de ``Noticia``/``Categoria`` (ver ``signals.py``). Como cada worker do gunicorn
+tem a sua cópia, ela também é recarregada do banco a cada
+``ECHO_AUTOCOMPLETAR_RECARGA`` segundos para pegar edições feitas em outros
+processos. A recarga roda numa thread, uma por vez: enquanto a trie nova é
+montada as consultas continuam respondendo com a atual, sem esperar o banco.
+Só a primeira carga do processo bloqueia quem consulta.
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from .busca import normalizar
+
+logger = logging.getLogger(__name__)
+
+MAX_POR_NO = 10  # Sugestões guardadas em cada nó
+PROFUNDIDADE_MAXIMA = 30  # Caracteres indexados a partir do início de cada palavra
+RECARGA_PADRAO = 300  # Segundos entre recargas completas
+
+
+class _No:
+    __slots__ = ('filhos', 'melhores', 'fim')
+
+    def __init__(self):
+        self.filhos = {}
+        self.melhores = []  # Chaves das entradas, da mais para a menos relevante
+        self.fim = None  # Chaves cujo sufixo termina neste nó (set criado só quando há alguma)
+
+
+class Trie:
+    """Trie de prefixos com as ``MAX_POR_NO`` melhores entradas por nó."""
+
+    def __init__(self):
+        self.raiz = _No()
+        self.entradas = {}  # chave -> (tipo, texto, url, peso)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _sufixos(texto):
+        # Cada palavra do texto vira um ponto de entrada ("novo hospital" casa com "hosp")
+        normalizado = ' '.join(normalizar(texto).split())
+        inicio = 0
+        while inicio < len(normalizado):
+            yield normalizado[inicio:inicio + PROFUNDIDADE_MAXIMA]
+            proximo = normalizado.find(' ', inicio)
+            if proximo == -1:
+                break
+            inicio = proximo + 1
+
+    def _peso(self, chave):
+        return self.entradas[chave][3]
+
+    def inserir(self, chave, tipo, texto, url, peso):
+        with self._lock:
+            if chave in self.entradas:
+                self.remover(chave)
+            self.entradas[chave] = (tipo, texto, url, peso)
+            for sufixo in self._sufixos(texto):
+                no = self.raiz
+                for letra in sufixo:
+                    no = no.filhos.setdefault(letra, _No())
+                    if chave in no.melhores:
+                        continue
+                    if len(no.melhores) < MAX_POR_NO or peso > self._peso(no.melhores[-1]):
+                        no.melhores.append(chave)
+                        no.melhores.sort(key=self._peso, reverse=True)
+                        del no.melhores[MAX_POR_NO:]
+                if no.fim is None:
+                    no.fim = set()
+                no.fim.add(chave)
+
+    def _melhores_da_subarvore(self, no, sem):
+        candidatas = set(no.fim or ())
+        for filho in no.filhos.values():
+            candidatas.update(filho.melhores)
+        candidatas.discard(sem)
+        return sorted(candidatas, key=self._peso, reverse=True)[:MAX_POR_NO]
+
+    def remover(self, chave):
+        with self._lock:
+            entrada = self.entradas.get(chave)
+            if entrada is None:
+                return
+            visitados = {}  # id(nó) -> (profundidade, pai, letra, nó), de todos os sufixos da entrada
+            for sufixo in self._sufixos(entrada[1]):
+                no = self.raiz
+                for profundidade, letra in enumerate(sufixo, 1):
+                    pai, no = no, no.filhos.get(letra)
+                    if no is None:
+                        break
+                    visitados[id(no)] = (profundidade, pai, letra, no)
+                else:
+                    if no.fim:
+                        no.fim.discard(chave)
+
+            # Do fundo para a raiz: cada nó se recompõe a partir dos filhos, que já estão certos
+            for _, pai, letra, no in sorted(visitados.values(), key=lambda item: -item[0]):
+                if chave in no.melhores:
+                    no.melhores = self._melhores_da_subarvore(no, chave)
+                if not no.filhos and not no.fim:
+                    del pai.filhos[letra]  # Ramo vazio
+            del self.entradas[chave]
+
+    def sugerir(self, prefixo, limite=8):
+        prefixo = ' '.join(normalizar(prefixo).split())[:PROFUNDIDADE_MAXIMA]
+        with self._lock:
+            no = self.raiz
+            for letra in prefixo:
+                no = no.filhos.get(letra)
+                if no is None:
+                    return []
+            return [self.entradas[chave] for chave in no.melhores[:limite]]
+
+
+_trie = None
+_carregada_em = 0.0
+_lock_carga = threading.Lock()  # Só uma carga por vez; fica preso enquanto a recarga roda na thread
+
+
+def _url_noticia(pk):
+    return reverse('Echo_app:noticia_detalhe', args=[pk])
+
+
+def _url_categoria(nome):
+    return f"{reverse('Echo_app:pesquisar_noticias')}?{urlencode({'q': nome})}"
+
+
+def _peso_noticia(data_publicacao):
+    return data_publicacao.timestamp() if data_publicacao else 0.0
+
+
+def carregar():
+    """Monta uma trie nova com todas as notícias e categorias e a publica."""
+    global _trie, _carregada_em
+    from .models import Categoria, Noticia
+
+    nova = Trie()
+    for pk, nome in Categoria.objects.values_list('id', 'nome'):
+        # Categorias ficam sempre acima das notícias
+        nova.inserir(f'c:{pk}', 'categoria', nome, _url_categoria(nome), float('inf'))
+    for pk, titulo, data in Noticia.objects.values_list('id', 'titulo', 'data_publicacao').iterator(chunk_size=2000):
+        nova.inserir(f'n:{pk}', 'noticia', titulo, _url_noticia(pk), _peso_noticia(data))
+    _trie, _carregada_em = nova, time.monotonic()
+    return nova
+
+
+def _recarregar():
+    """Corpo da thread de recarga: monta a trie nova e libera a vez para a próxima."""
+    try:
+        carregar()
+    except Exception:  # Segue servindo a trie antiga; a próxima consulta tenta de novo
+        logger.exception("Falha ao recarregar a trie do autocompletar")
+    finally:
+        _lock_carga.release()
+        connections.close_all()  # Conexões desta thread
+
+
+def _obter_trie():
+    if _trie is None:
+        with _lock_carga:  # Primeira carga: não há o que servir enquanto ela roda
+            if _trie is None:
+                carregar()
+        return _trie
+    recarga = getattr(settings, 'ECHO_AUTOCOMPLETAR_RECARGA', RECARGA_PADRAO)
+    # Com uma recarga já rodando o acquire falha na hora e a consulta usa a trie atual
+    if time.monotonic() - _carregada_em > recarga and _lock_carga.acquire(blocking=False):
+        if time.monotonic() - _carregada_em > recarga:
+            threading.Thread(target=_recarregar, name='echo-autocompletar', daemon=True).start()
+        else:  # Outra thread acabou de recarregar
+            _lock_carga.release()
+    return _trie
+
+
+def sugerir(prefixo, limite=8):
+    """Lista de dicionários {'tipo', 'texto', 'url'} para o prefixo digitado."""
+    return [
+        {'tipo': tipo, 'texto': texto, 'url': url}
+        for tipo, texto, url, _ in _obter_trie().sugerir(prefixo, limite)
+    ]
+
+
+# --- Atualização incremental (chamada pelos sinais) ---
+# Se a trie ainda não foi carregada neste processo não há o que atualizar:
+# a primeira consulta já vai ler o estado atual do banco.
+
+def atualizar_noticia(noticia):
+    if _trie is not None:
+        _trie.inserir(f'n:{noticia.pk}', 'noticia', noticia.titulo,
+                      _url_noticia(noticia.pk), _peso_noticia(noticia.data_publicacao))
+
+
+def remover_noticia(noticia_id):
+    if _trie is not None:
+        _trie.remover(f'n:{noticia_id}')
+
+
+def atualizar_categoria(categoria):
+    if _trie is not None:
+        _trie.inserir(f'c:{categoria.pk}', 'categoria', categoria.nome,
+                      _url_categoria(categoria.nome), float('inf'))
+
+
+def remover_categoria(categoria_id):
+    if _trie is not None:
+        _trie.remover(f'c:{categoria_id}')
@@ -0,0 +1,27 @@
+"""
+Avatares prontos (static/avatars/avatars1.png ... avatars16.png) escolhidos em
+``perfil_editar``. O perfil guarda só o nome em ``avatar_padrao`` e o template
+aponta para o arquivo estático (servido pelo WhiteNoise com cache longo), em
+vez de copiar o PNG para ``media/`` a cada escolha.
+"""
+
+import os
+
+from django.conf import settings
+
+PASTA_AVATARES = os.path.join(settings.BASE_DIR, 'static', 'avatars')
+LISTA_AVATARES = [f'avatars{i}.png' for i in range(1, 17)]
+
+
+def caminho_avatar(nome):
+    """Caminho do avatar pronto, ou None se o nome não for um dos avatares válidos."""
+    if nome not in LISTA_AVATARES:
+        return None
+    caminho = os.path.join(PASTA_AVATARES, nome)
+    return caminho if os.path.exists(caminho) else None
+
+
+def escolher(perfil, nome):
+    """Passa a usar o avatar pronto ``nome`` (só altera o objeto; quem chama salva)."""
+    perfil.avatar_padrao = nome
+    perfil.foto_perfil = None
@@ -0,0 +1,184 @@
+"""
+Índice de busca textual das notícias.
+
+- Postgres: tabela auxiliar com uma coluna ``tsvector`` (configuração
+  'simple', título com peso A e conteúdo com peso B) e índice GIN.
+- SQLite: tabela virtual FTS5 (tokenizer unicode61 sem acentos), ranqueada
+  com bm25.
+
+Nos dois bancos o texto passa pelo ``radical()`` antes de ser indexado e antes
+de ser pesquisado. O FTS5 não tem stemming em português, e o da configuração
+'portuguese' do Postgres não junta singular e plural de texto sem acento
+('eleicao' -> 'eleica', 'eleicoes' -> 'eleico'). Assim a mesma busca acha as
+mesmas notícias no desenvolvimento e em produção.
+
+A tabela é criada pela migração 0006 e mantida pelos sinais em ``signals.py``.
+Se o banco não tiver o índice, ``buscar_ids`` devolve ``None`` e a view cai
+no ``icontains`` antigo.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection, connections, router
+
+TABELA = 'Echo_app_busca_noticia'
+TAMANHO_LOTE = 1000  # Linhas por INSERT na reconstrução completa
+
+_PALAVRA = re.compile(r'[^\W_]+')
+
+# Sufixos derivacionais comuns (já sem acento), do mais longo para o mais curto
+_SUFIXOS = (
+    'amentos', 'imentos', 'adoras', 'adores', 'amento', 'imento', 'idades',
+    'mente', 'acoes', 'icoes', 'idade', 'istas', 'ismos', 'adora', 'ador',
+    'acao', 'icao', 'ista', 'ismo', 'avel', 'ivel', 'ezas', 'eza', 'oso', 'osa',
+)
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos ('Eleições' -> 'eleicoes')."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def radical(palavra):
+    """Stemmer leve para português (redução de plural, sufixo e vogal final)."""
+    if len(palavra) <= 3 or palavra.isdigit():
+        return palavra
+
+    # 1. Plural
+    if palavra.endswith(('oes', 'aes')):
+        palavra = palavra[:-3] + 'ao'
+    elif palavra.endswith('ais'):
+        palavra = palavra[:-3] + 'al'
+    elif palavra.endswith('eis'):
+        palavra = palavra[:-3] + 'el'
+    elif palavra.endswith('ns'):
+        palavra = palavra[:-2] + 'm'
+    elif palavra.endswith('s') and not palavra.endswith(('ss', 'us', 'is')):
+        palavra = palavra[:-1]
+
+    # 2. Sufixo derivacional (mantém pelo menos 4 letras de radical)
+    for sufixo in _SUFIXOS:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= 4:
+            palavra = palavra[:-len(sufixo)]
+            break
+
+    # 3. Vogal temática final
+    if len(palavra) > 3 and palavra[-1] in 'aeo':
+        palavra = palavra[:-1]
+    return palavra
+
+
+def termos(texto):
+    """Quebra o texto em radicais normalizados."""
+    return [radical(p) for p in _PALAVRA.findall(normalizar(texto))]
+
+
+def _texto_indexavel(texto):
+    return ' '.join(termos(texto))
+
+
+_bancos_com_indice = set()  # (alias, NAME) dos bancos onde a tabela já foi encontrada
+
+
+def disponivel(banco=connection):
+    """True se o banco (o atual, por padrão) tem a tabela do índice."""
+    if banco.vendor not in ('postgresql', 'sqlite'):
+        return False
+    chave = (banco.alias, str(banco.settings_dict['NAME']))
+    if chave not in _bancos_com_indice:
+        if TABELA not in banco.introspection.table_names(include_views=False):
+            return False
+        _bancos_com_indice.add(chave)
+    return True
+
+
+def _inserir(cursor, linhas):
+    if connection.vendor == 'sqlite':
+        cursor.executemany(
+            f'INSERT INTO "{TABELA}" (rowid, titulo, conteudo) VALUES (%s, %s, %s)',
+            [(pk, _texto_indexavel(titulo), _texto_indexavel(conteudo)) for pk, titulo, conteudo in linhas],
+        )
+    else:
+        cursor.executemany(
+            f'INSERT INTO "{TABELA}" (noticia_id, documento) VALUES '
+            f"(%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+            f'ON CONFLICT (noticia_id) DO UPDATE SET documento = EXCLUDED.documento',
+            [(pk, _texto_indexavel(titulo), _texto_indexavel(conteudo)) for pk, titulo, conteudo in linhas],
+        )
+
+
+def indexar(noticia):
+    """Insere ou atualiza uma notícia no índice."""
+    if not disponivel():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM "{TABELA}" WHERE rowid = %s', [noticia.pk])
+        _inserir(cursor, [(noticia.pk, noticia.titulo, noticia.conteudo)])
+
+
+def remover(noticia_id):
+    """Remove uma notícia do índice (no Postgres o ON DELETE CASCADE já cuida disso)."""
+    if not disponivel():
+        return
+    coluna = 'rowid' if connection.vendor == 'sqlite' else 'noticia_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABELA}" WHERE {coluna} = %s', [noticia_id])
+
+
+def reconstruir():
+    """Apaga e reconstrói o índice inteiro. Retorna o número de notícias indexadas."""
+    from .models import Noticia
+
+    if not disponivel():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{TABELA}"')
+        lote = []
+        for linha in Noticia.objects.values_list('id', 'titulo', 'conteudo').iterator(chunk_size=TAMANHO_LOTE):
+            lote.append(linha)
+            if len(lote) >= TAMANHO_LOTE:
+                _inserir(cursor, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            _inserir(cursor, lote)
+            total += len(lote)
+    return total
+
+
+def buscar_ids(termo, limite=20):
+    """
+    Retorna os IDs das notícias que casam com o termo, do mais relevante para o
+    menos relevante. O último termo é tratado como prefixo (busca enquanto digita).
+    Retorna None se o índice não estiver disponível.
+    """
+    from .models import Noticia
+
+    banco = connections[router.db_for_read(Noticia)]  # Uma réplica, se houver (replicas.py)
+    if not disponivel(banco):
+        return None
+
+    radicais = termos(termo)
+    if not radicais:
+        return []
+    if banco.vendor == 'sqlite':
+        consulta = ' '.join(f'"{r}"' for r in radicais[:-1]) + f' "{radicais[-1]}"*'
+        sql = (
+            f'SELECT rowid FROM "{TABELA}" WHERE "{TABELA}" MATCH %s '
+            f'ORDER BY bm25("{TABELA}", 10.0, 1.0), rowid DESC LIMIT %s'
+        )
+    else:
+        consulta = ' & '.join(radicais[:-1] + [f'{radicais[-1]}:*'])
+        sql = (
+            f"SELECT noticia_id FROM \"{TABELA}\", to_tsquery('simple', %s) consulta "
+            f'WHERE documento @@ consulta '
+            f'ORDER BY ts_rank(documento, consulta) DESC, noticia_id DESC LIMIT %s'
+        )
+
+    with banco.cursor() as cursor:
+        cursor.execute(sql, [consulta, limite])
+        return [linha[0] for linha in cursor.fetchall()]
@@ -0,0 +1,150 @@
+"""
+Cache de página inteira para visitantes anônimos (dashboard e detalhe da notícia).
+
+O decorador ``cache_anonimo`` guarda a resposta HTML pronta, com ETag e
+Last-Modified, e responde 304 para GETs condicionais. Usuários logados, POSTs,
+respostas que mexem em cookies (CSRF, sessão, mensagens) e qualquer status
+diferente de 200 passam direto, sem cache. O ``Cache-Control`` permite que um
+proxy na frente do site guarde a página e só a revalide (ETag/Last-Modified).
+
+A chave usa o caminho e só os parâmetros de ``parametros`` (nenhum, por
+padrão), em ordem fixa. Uma URL com qualquer outro parâmetro (``?utm_source=``,
+``?x=<aleatório>``) passa direto: não dá para encher o cache com variações da
+mesma página.
+
+A invalidação usa as mesmas gerações do ``cache_segmentos``: o dashboard
+depende de 'noticia' e 'categoria'; o detalhe depende de 'noticia:<pk>' e
+'categoria'. Os sinais incrementam essas gerações quando uma notícia é
+editada, então a próxima visita já vê a versão nova.
+
+Views assíncronas também podem ser decoradas: nesse caso ``ultima_modificacao``
+deve ser uma corrotina e o cache é lido/gravado com a API assíncrona.
+"""
+
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.encoding import escape_uri_path
+from django.utils.http import http_date
+
+from .cache_segmentos import ageracoes, geracoes, registrar
+
+PREFIXO = 'echo:pagina'
+TIMEOUT_PADRAO = 120  # Segundos
+
+
+def _pode_usar_cache(request, usuario, parametros):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if any(nome not in parametros for nome in request.GET):
+        return False
+    if 'messages' in request.COOKIES:  # Há mensagem pendente para mostrar a este visitante
+        return False
+    return not usuario.is_authenticated
+
+
+def _pode_guardar(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')  # A página usou {% csrf_token %}
+    )
+
+
+def _montar_resposta(entrada):
+    response = HttpResponse(entrada['conteudo'], content_type=entrada['content_type'])
+    response['ETag'] = entrada['etag']
+    if entrada['ultima_modificacao']:
+        response['Last-Modified'] = http_date(entrada['ultima_modificacao'])
+    return response
+
+
+def _finalizar(request, response):
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    patch_vary_headers(response, ['Cookie'])  # Logados e anônimos recebem páginas diferentes na mesma URL
+    return response
+
+
+def _entrada(response, data):
+    return {
+        'conteudo': response.content,
+        'content_type': response['Content-Type'],
+        'etag': '"%s"' % hashlib.md5(response.content, usedforsecurity=False).hexdigest(),
+        'ultima_modificacao': int(data.timestamp()) if data else None,
+    }
+
+
+def _responder(request, entrada):
+    response = _montar_resposta(entrada)
+    condicional = get_conditional_response(
+        request, etag=entrada['etag'], last_modified=entrada['ultima_modificacao'], response=response,
+    )
+    return _finalizar(request, condicional or response)
+
+
+def _caminho(request, parametros):
+    """Caminho + parâmetros conhecidos, na mesma ordem qualquer que seja a da URL."""
+    consulta = urlencode(sorted((nome, valor) for nome in parametros for valor in request.GET.getlist(nome)))
+    caminho = escape_uri_path(request.path)
+    return f'{caminho}?{consulta}' if consulta else caminho
+
+
+def _timeout():
+    return getattr(settings, 'ECHO_CACHE_PAGINAS_TIMEOUT', TIMEOUT_PADRAO)
+
+
+def cache_anonimo(nome, dependencias, ultima_modificacao, parametros=()):
+    """
+    ``dependencias(request, **kwargs)`` -> lista de gerações da página.
+    ``ultima_modificacao(request, **kwargs)`` -> datetime ou None (só chamado quando a página é gerada).
+    ``parametros``: parâmetros da query string que mudam a página (os demais desligam o cache).
+    """
+    def decorador(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _aview(request, *args, **kwargs):
+                if not _pode_usar_cache(request, await request.auser(), parametros):
+                    return await view(request, *args, **kwargs)
+
+                chave = f'{PREFIXO}:{nome}:{_caminho(request, parametros)}:{await ageracoes(dependencias(request, **kwargs))}'
+                entrada = await cache.aget(chave)
+                registrar(f'pagina:{nome}', entrada is not None)
+
+                if entrada is None:
+                    response = await view(request, *args, **kwargs)
+                    if hasattr(response, 'render') and callable(response.render):
+                        response = await sync_to_async(response.render)()
+                    if not _pode_guardar(request, response):
+                        return response
+                    entrada = _entrada(response, await ultima_modificacao(request, **kwargs))
+                    await cache.aset(chave, entrada, timeout=_timeout())
+                return _responder(request, entrada)
+            return _aview
+
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            if not _pode_usar_cache(request, request.user, parametros):
+                return view(request, *args, **kwargs)
+
+            chave = f'{PREFIXO}:{nome}:{_caminho(request, parametros)}:{geracoes(dependencias(request, **kwargs))}'
+            entrada = cache.get(chave)
+            registrar(f'pagina:{nome}', entrada is not None)
+
+            if entrada is None:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    response = response.render()
+                if not _pode_guardar(request, response):
+                    return response
+                entrada = _entrada(response, ultima_modificacao(request, **kwargs))
+                cache.set(chave, entrada, timeout=_timeout())
+            return _responder(request, entrada)
+        return _view
+    return decorador
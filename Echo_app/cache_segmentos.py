@@ -0,0 +1,99 @@
+"""
+Cache dos segmentos do dashboard (recomendadas, urgentes, últimas, categorias).
+
+Cada segmento declara de quais "gerações" depende ('noticia', 'categoria',
+'perfil:<id>'). A geração é um número guardado no próprio cache e entra na
+chave do segmento; quando uma notícia ou categoria muda, os sinais em
+``signals.py`` incrementam a geração e todas as chaves antigas deixam de ser
+lidas (expiram sozinhas pelo TIMEOUT). Não é preciso saber quais chaves apagar.
+
+O backend é o cache padrão do Django (``ECHO_CACHE_BACKEND`` no settings:
+memória local, arquivo ou banco). Com memória local cada processo tem o seu
+cache, então a invalidação só alcança o processo que salvou a notícia; com
+vários workers prefira 'arquivo' ou 'banco'.
+"""
+
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import perfilamento
+
+PREFIXO = 'echo:seg'
+TIMEOUT_PADRAO = 300  # Segundos
+
+_lock = threading.Lock()
+_metricas = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def _chave_geracao(nome):
+    return f'{PREFIXO}:geracao:{nome}'
+
+
+def geracoes(nomes):
+    chaves = [_chave_geracao(nome) for nome in nomes]
+    atuais = cache.get_many(chaves)
+    return '.'.join(str(atuais.get(chave, 0)) for chave in chaves)
+
+
+async def ageracoes(nomes):
+    chaves = [_chave_geracao(nome) for nome in nomes]
+    atuais = await cache.aget_many(chaves)
+    return '.'.join(str(atuais.get(chave, 0)) for chave in chaves)
+
+
+def invalidar(*nomes):
+    """Incrementa a geração dos nomes dados, invalidando todo segmento que dependa deles."""
+    for nome in nomes:
+        chave = _chave_geracao(nome)
+        try:
+            cache.incr(chave)
+        except ValueError:  # Geração ainda não existe no cache
+            cache.set(chave, 1, timeout=None)
+
+
+def registrar(segmento, acertou):
+    with _lock:
+        _metricas[segmento]['hits' if acertou else 'misses'] += 1
+    perfilamento.contar_cache(acertou)  # Também entra na medição da requisição
+
+
+def obter(segmento, dependencias, calcular, identificador=''):
+    """
+    Retorna o valor do segmento, calculando com ``calcular()`` em caso de miss.
+    ``identificador`` diferencia cópias do mesmo segmento (ex.: id do usuário).
+    """
+    chave = f'{PREFIXO}:{segmento}:{identificador}:{geracoes(dependencias)}'
+    valor = cache.get(chave)
+    if valor is not None:
+        registrar(segmento, True)
+        return valor
+    registrar(segmento, False)
+    valor = calcular()
+    cache.set(chave, valor, timeout=getattr(settings, 'ECHO_CACHE_SEGMENTOS_TIMEOUT', TIMEOUT_PADRAO))
+    return valor
+
+
+async def aobter(segmento, dependencias, calcular, identificador=''):
+    """Igual a ``obter``, para views assíncronas: ``calcular`` é uma corrotina (async ORM)."""
+    chave = f'{PREFIXO}:{segmento}:{identificador}:{await ageracoes(dependencias)}'
+    valor = await cache.aget(chave)
+    if valor is not None:
+        registrar(segmento, True)
+        return valor
+    registrar(segmento, False)
+    valor = await calcular()
+    await cache.aset(chave, valor, timeout=getattr(settings, 'ECHO_CACHE_SEGMENTOS_TIMEOUT', TIMEOUT_PADRAO))
+    return valor
+
+
+def metricas():
+    """Hits, misses e taxa de acerto por segmento (neste processo)."""
+    with _lock:
+        copia = {segmento: dict(valores) for segmento, valores in _metricas.items()}
+    for valores in copia.values():
+        total = valores['hits'] + valores['misses']
+        valores['taxa_acerto'] = round(valores['hits'] / total, 3) if total else 0.0
+    return copia
@@ -0,0 +1,149 @@
+"""
+Registro de consultas lentas, com a linha do ``Echo_app`` que as disparou.
+
+Um ``execute_wrapper`` (instalado em toda conexão nova, como o do
+``perfilamento.py``) cronometra cada consulta. As que passam de
+``ECHO_CONSULTAS_LENTAS_MS`` viram uma linha JSON em
+``ECHO_CONSULTAS_LENTAS_ARQUIVO``, com:
+
+- ``impressao``: hash do SQL normalizado (valores, listas de IN e VALUES
+  trocados por ``?``), igual para todas as execuções da "mesma" consulta;
+- ``origem``: primeiro arquivo do app na pilha (ex.: ``recomendacoes.py:41 em para``);
+- ``view``: a função de ``views.py`` por trás dela, quando está na pilha;
+- ``rota``: nome da URL da requisição (via ``perfilamento``). Nas views
+  assíncronas o ORM roda em outra thread e a pilha não chega à view: a rota é
+  o que diz de onde a consulta veio.
+
+As consultas rápidas custam só os dois ``perf_counter``. O arquivo é
+acrescentado por todos os processos (web e worker); o comando
+``consultas_lentas`` junta as linhas por impressão e mostra as piores
+(contagem, tempo total, média, máximo e de onde vêm). Como o arquivo não é
+rotacionado, em produção o registro fica desligado salvo pedido explícito
+(``ECHO_CONSULTAS_LENTAS=1``).
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import perfilamento
+
+PASTA_APP = os.path.dirname(os.path.abspath(__file__)) + os.sep
+IGNORADOS = {os.path.abspath(__file__), os.path.join(PASTA_APP, 'perfilamento.py'), os.path.join(PASTA_APP, 'tests.py')}
+ARQUIVO_VIEWS = os.path.join(PASTA_APP, 'views.py')
+
+_lock = threading.Lock()
+
+_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA_IN = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_VALUES = re.compile(r'\((?:\?, )*\?\)(?:, \((?:\?, )*\?\))+')
+_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar(sql):
+    """SQL sem os valores: ``WHERE id IN (%s, %s, %s)`` e ``WHERE id IN (7)`` viram ``WHERE id IN (...)``."""
+    sql = _ESPACOS.sub(' ', sql).strip().replace('%s', '?')
+    sql = _NUMERO.sub('?', _TEXTO.sub('?', sql))
+    return _VALUES.sub('(...)', _LISTA_IN.sub('IN (...)', sql))
+
+
+def impressao(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode()).hexdigest()[:12]
+
+
+def _origem():
+    """(origem, view) a partir da pilha: primeiro quadro do app e primeiro de views.py."""
+    origem = view = None
+    frame = sys._getframe(2)
+    while frame is not None and view is None:
+        arquivo = frame.f_code.co_filename
+        if arquivo.startswith(PASTA_APP) and arquivo not in IGNORADOS:
+            local = f'{os.path.relpath(arquivo, os.path.dirname(PASTA_APP.rstrip(os.sep)))}:{frame.f_lineno} em {frame.f_code.co_name}'
+            origem = origem or local
+            if arquivo == ARQUIVO_VIEWS:
+                view = local
+        frame = frame.f_back
+    return origem, view
+
+
+def _gravar(registro):
+    linha = json.dumps(registro, ensure_ascii=False) + '\n'
+    with _lock, open(settings.ECHO_CONSULTAS_LENTAS_ARQUIVO, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(linha)  # Uma escrita por linha em modo append: os processos não se misturam
+
+
+def _registrar_se_lenta(execute, sql, params, many, context):
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        if duracao_ms >= settings.ECHO_CONSULTAS_LENTAS_MS:
+            origem, view = _origem()
+            medicao = perfilamento.medicao_atual()
+            normalizado = normalizar(sql)
+            _gravar({
+                'quando': timezone.now().isoformat(timespec='seconds'),
+                'ms': round(duracao_ms, 2),
+                'impressao': impressao(normalizado),
+                'sql': normalizado,
+                'banco': context['connection'].alias,
+                'varias': many,  # executemany
+                'origem': origem,
+                'view': view,
+                'rota': medicao.rota if medicao else None,  # None: worker, shell, comandos
+            })
+
+
+def instalar_na_conexao(sender, connection, **kwargs):
+    """Receiver de ``connection_created`` (ligado em ``apps.py`` quando ECHO_CONSULTAS_LENTAS está ligado)."""
+    if _registrar_se_lenta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_se_lenta)
+
+
+def ler(caminho=None, desde=None):
+    """Registros do arquivo (os mais novos que ``desde``, se dado); linhas cortadas são ignoradas."""
+    caminho = caminho or settings.ECHO_CONSULTAS_LENTAS_ARQUIVO
+    try:
+        arquivo = open(caminho, encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with arquivo:
+        for linha in arquivo:
+            try:
+                registro = json.loads(linha)
+            except ValueError:  # Linha pela metade (processo morto no meio da escrita)
+                continue
+            if desde is None or registro['quando'] >= desde.isoformat(timespec='seconds'):
+                yield registro
+
+
+def agregar(registros):
+    """Por impressão: contagem, tempo total/médio/máximo (ms), SQL e as origens, views e rotas mais frequentes."""
+    grupos = {}
+    for registro in registros:
+        grupo = grupos.get(registro['impressao'])
+        if grupo is None:
+            grupo = grupos[registro['impressao']] = {
+                'impressao': registro['impressao'], 'sql': registro['sql'],
+                'contagem': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'origens': Counter(), 'views': Counter(), 'rotas': Counter(),
+            }
+        grupo['contagem'] += 1
+        grupo['total_ms'] += registro['ms']
+        grupo['max_ms'] = max(grupo['max_ms'], registro['ms'])
+        grupo['origens'][registro['origem'] or '(fora do app)'] += 1
+        if registro.get('view'):
+            grupo['views'][registro['view']] += 1
+        grupo['rotas'][registro.get('rota') or '(fora de requisição)'] += 1
+    for grupo in grupos.values():
+        grupo['media_ms'] = grupo['total_ms'] / grupo['contagem']
+    return list(grupos.values())
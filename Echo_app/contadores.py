@@ -0,0 +1,171 @@
+"""
+Contadores de curtidas e salvamentos das notícias.
+
+``Noticia.curtidas_count`` / ``salvamentos_count`` são atualizados com
+incrementos atômicos no banco (``F('campo') + 1``), sem recontar as interações
+e sem regravar a linha inteira da notícia. O custo de um clique é constante,
+não importa quantas interações a notícia já tenha.
+
+Modo write-behind (``ECHO_CONTADORES_WRITE_BEHIND = True``): em vez de um
+UPDATE por clique, os deltas ficam acumulados num buffer em memória e uma
+thread os aplica a cada ``ECHO_CONTADORES_INTERVALO`` segundos, num único
+UPDATE para todas as notícias alteradas. ``valor()`` soma o que ainda está no
+buffer, então o ``nova_contagem`` devolvido ao usuário continua certo. Cada
+processo tem o seu buffer; o que estiver pendente é descarregado ao encerrar.
+
+``reconciliar()`` (comando ``reconciliar_contadores``) recalcula os valores a
+partir de ``InteracaoNoticia`` para corrigir qualquer desvio.
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, Count, F, OuterRef, PositiveIntegerField, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_PADRAO = 5  # Segundos entre descargas do buffer
+
+CAMPOS = {
+    'CURTIDA': 'curtidas_count',
+    'SALVAMENTO': 'salvamentos_count',
+}
+
+
+def _somar(campo, delta):
+    if delta >= 0:
+        return F(campo) + delta
+    return Greatest(F(campo) + delta, Value(0))
+
+
+def incrementar(noticia_id, tipo, delta):
+    """Soma ``delta`` (positivo ou negativo) ao contador, nunca abaixo de zero."""
+    from .models import Noticia
+
+    if write_behind_ativo():
+        # Só entra no buffer se a transação da interação for confirmada
+        transaction.on_commit(lambda: _acumular(noticia_id, tipo, delta))
+        return
+    campo = CAMPOS[tipo]
+    Noticia.objects.filter(pk=noticia_id).update(**{campo: _somar(campo, delta)})
+
+
+def valor(noticia_id, tipo):
+    from .models import Noticia
+
+    gravado = Noticia.objects.filter(pk=noticia_id).values_list(CAMPOS[tipo], flat=True).first() or 0
+    return max(0, gravado + pendente(noticia_id, tipo))
+
+
+def alternar(usuario, noticia_id, tipo):
+    """
+    Liga/desliga a interação do usuário com a notícia e ajusta o contador.
+    Retorna True se a interação ficou ativa.
+    """
+    from .models import InteracaoNoticia
+
+    with transaction.atomic():
+        removidas, _ = InteracaoNoticia.objects.filter(usuario=usuario, noticia_id=noticia_id, tipo=tipo).delete()
+        if removidas:
+            incrementar(noticia_id, tipo, -removidas)
+            return False
+        try:
+            with transaction.atomic():
+                InteracaoNoticia.objects.create(usuario=usuario, noticia_id=noticia_id, tipo=tipo)
+        except IntegrityError:
+            # Clique duplo concorrente: a outra requisição já criou (e contou) a interação
+            return True
+        incrementar(noticia_id, tipo, 1)
+        return True
+
+
+def reconciliar(noticia_ids=None):
+    """Recalcula os contadores a partir das interações. Retorna o número de notícias atualizadas."""
+    from .models import InteracaoNoticia, Noticia
+
+    def total(tipo):
+        contagem = InteracaoNoticia.objects.filter(noticia=OuterRef('pk'), tipo=tipo).order_by().values(
+            'noticia'
+        ).annotate(total=Count('id')).values('total')
+        return Coalesce(Subquery(contagem), Value(0))
+
+    noticias = Noticia.objects.all()
+    if noticia_ids is not None:
+        noticias = noticias.filter(pk__in=noticia_ids)
+    return noticias.update(**{campo: total(tipo) for tipo, campo in CAMPOS.items()})
+
+
+# ===================== WRITE-BEHIND =====================
+
+_buffer = defaultdict(int)  # (noticia_id, tipo) -> delta ainda não gravado
+_lock = threading.Lock()
+_descarregador = None
+
+
+def write_behind_ativo():
+    return getattr(settings, 'ECHO_CONTADORES_WRITE_BEHIND', False)
+
+
+def pendente(noticia_id, tipo):
+    with _lock:
+        return _buffer.get((noticia_id, tipo), 0)
+
+
+def _acumular(noticia_id, tipo, delta):
+    with _lock:
+        _buffer[(noticia_id, tipo)] += delta
+    _iniciar_descarregador()
+
+
+def descarregar():
+    """Aplica todos os deltas pendentes num único UPDATE. Retorna o número de notícias afetadas."""
+    from .models import Noticia
+
+    with _lock:
+        deltas = {chave: delta for chave, delta in _buffer.items() if delta}
+        _buffer.clear()
+    if not deltas:
+        return 0
+
+    ids = {noticia_id for noticia_id, _ in deltas}
+    alteracoes = {}
+    for tipo, campo in CAMPOS.items():
+        casos = [
+            When(pk=noticia_id, then=_somar(campo, delta))
+            for (noticia_id, tipo_delta), delta in deltas.items() if tipo_delta == tipo
+        ]
+        if casos:
+            alteracoes[campo] = Case(*casos, default=F(campo), output_field=PositiveIntegerField())
+    try:
+        return Noticia.objects.filter(pk__in=ids).update(**alteracoes)
+    except Exception:
+        # Devolve os deltas ao buffer para a próxima rodada
+        with _lock:
+            for chave, delta in deltas.items():
+                _buffer[chave] += delta
+        logger.exception("Falha ao descarregar %s contadores pendentes", len(deltas))
+        return 0
+
+
+def _loop_descarregador():
+    intervalo = getattr(settings, 'ECHO_CONTADORES_INTERVALO', INTERVALO_PADRAO)
+    parar = threading.Event()
+    while not parar.wait(intervalo):
+        descarregar()
+        connections.close_all()  # Conexões desta thread
+
+
+def _iniciar_descarregador():
+    global _descarregador
+    if _descarregador is not None:
+        return
+    with _lock:
+        if _descarregador is None:
+            _descarregador = threading.Thread(target=_loop_descarregador, name='echo-contadores', daemon=True)
+            _descarregador.start()
+            atexit.register(descarregar)
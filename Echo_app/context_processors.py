@@ -0,0 +1,23 @@
+from django.conf import settings
+
+from .models import PerfilUsuario
+
+
+def notificacoes(request):
+    """
+    ``notificacoes_nao_lidas`` para o sino do ``base.html``. O número vem do
+    perfil, que o ``BackendComPerfil`` já carrega junto com o usuário da
+    sessão, então nenhuma página paga consulta extra por ele.
+    """
+    def nao_lidas():
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            return 0
+        try:
+            return usuario.perfil.notificacoes_nao_lidas
+        except PerfilUsuario.DoesNotExist:
+            return 0
+
+    # Função (e não o valor) para só tocar em request.user se o template usar a variável
+    # push_ativo: o sino abre a conexão SSE (só quando servido por ASGI, ver ECHO_PUSH_SSE)
+    return {'notificacoes_nao_lidas': nao_lidas, 'push_ativo': settings.ECHO_PUSH_SSE}
@@ -0,0 +1,54 @@
+"""
+E-mails enviados pela aplicação. O envio roda na fila de tarefas para a
+requisição não ficar esperando o SMTP.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from . import perfilamento, recuperacao_senha
+from .tarefas import tarefa
+
+User = get_user_model()
+
+
+@tarefa(max_tentativas=4)
+def enviar_codigo_otp(usuario_id, token, reenvio=False):
+    """
+    Envia o código de recuperação de senha (template otp_email_body.html).
+
+    A tarefa recebe só o token da recuperação: o código é lido na hora do envio
+    (``recuperacao_senha``), para não ficar guardado em ``Tarefa.argumentos``
+    depois de expirar. Recuperação expirada ou encerrada: não há o que enviar.
+    """
+    recuperacao = recuperacao_senha.carregar(token)
+    if recuperacao is None or recuperacao.usuario_id != usuario_id:
+        return
+    otp = recuperacao.codigo
+    user = User.objects.get(pk=usuario_id)
+    if reenvio:
+        assunto = 'Reenvio do Seu Código de Recuperação de Senha - Echo'
+        email_titulo = 'Reenvio de Código de Recuperação de Senha'
+    else:
+        assunto = 'Seu Código de Recuperação de Senha - Echo'
+        email_titulo = 'Código de Recuperação de Senha'
+
+    email_context = {
+        'otp': otp,
+        'user': user,
+        'email_titulo': email_titulo,
+    }
+    html_message = render_to_string('Echo_app/otp_email_body.html', email_context)
+    plain_message = strip_tags(html_message)
+
+    with perfilamento.externa('smtp'):  # Tarefas síncronas (desenvolvimento) contam na requisição
+        send_mail(
+            assunto,
+            plain_message,  # Corpo do e-mail em texto
+            None,  # Usa DEFAULT_FROM_EMAIL
+            [user.email],
+            html_message=html_message,  # Corpo do e-mail em HTML
+            fail_silently=False,  # Falha vira exceção -> a fila tenta de novo
+        )
@@ -0,0 +1,210 @@
+"""
+Versões responsivas das imagens enviadas (capa da notícia e foto de perfil).
+
+As fotos chegam do jeito que o usuário mandou (PNGs de vários MB), mas os
+cards e o avatar do menu mostram miniaturas. A cada upload a tarefa
+``processar`` gera, ao lado do original, cópias redimensionadas em AVIF, WebP
+e JPEG (``noticias/foto.png.640w.webp``), sem EXIF/GPS, e guarda o mapa no
+campo ``*_versoes`` do modelo:
+
+    {'original': 'noticias/foto.png', 'largura': 2048, 'altura': 1365,
+     'versoes': {'avif': {'320': 'noticias/foto.png.320w.avif', ...}, 'webp': {...}, 'jpeg': {...}}}
+
+O template usa ``{% imagem_responsiva %}`` (templatetags/imagens.py), que monta
+um ``<picture>`` com ``srcset``/``sizes`` e cai no arquivo original enquanto as
+versões não existem. Imagens antigas são convertidas pelo comando
+``gerar_versoes_imagens`` (em vários processos).
+
+``gerar_arquivos`` não toca no banco, só no storage, para poder rodar num
+``ProcessPoolExecutor``.
+"""
+
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+
+from . import cache_segmentos
+from .tarefas import tarefa
+
+logger = logging.getLogger(__name__)
+
+# Larguras geradas por tipo de imagem (px). Nunca amplia: larguras maiores que o original são puladas.
+LARGURAS = {
+    'noticia': (320, 640, 1024, 1600),
+    'perfil': (48, 96, 192, 384),
+}
+
+# Formato -> (extensão, tipo MIME, opções do Pillow). A ordem é a de preferência no <picture>.
+FORMATOS = {
+    'avif': ('avif', 'image/avif', {'quality': 50, 'speed': 6}),
+    'webp': ('webp', 'image/webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+FORMATO_PADRAO = 'jpeg'  # Vai no <img> para navegadores sem AVIF/WebP
+
+# Modelo, campo da imagem e campo do mapa de versões de cada tipo
+CAMPOS = {
+    'noticia': ('Noticia', 'imagem', 'imagem_versoes'),
+    'perfil': ('PerfilUsuario', 'foto_perfil', 'foto_versoes'),
+}
+
+
+def formatos_disponiveis():
+    """Formatos que o Pillow instalado consegue gravar (AVIF depende da libavif)."""
+    return [formato for formato in FORMATOS if formato == 'jpeg' or features.check(formato)]
+
+
+# ===================== GERAÇÃO =====================
+
+def _preparar(imagem, formato):
+    # JPEG não tem transparência: o fundo vira branco. Os outros mantêm o canal alfa.
+    tem_alfa = imagem.mode in ('RGBA', 'LA', 'PA') or (imagem.mode == 'P' and 'transparency' in imagem.info)
+    if not tem_alfa:
+        return imagem.convert('RGB') if imagem.mode != 'RGB' else imagem
+    imagem = imagem.convert('RGBA')
+    if formato != 'jpeg':
+        return imagem
+    fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+    fundo.paste(imagem, mask=imagem.getchannel('A'))
+    return fundo
+
+
+def _larguras_alvo(tipo, largura_original):
+    larguras = [largura for largura in LARGURAS[tipo] if largura <= largura_original]
+    return larguras or [largura_original]  # Original menor que todas: uma versão só, do tamanho dele
+
+
+def _nome_versao(nome, largura, formato):
+    return f'{nome}.{largura}w.{FORMATOS[formato][0]}'
+
+
+def gerar_arquivos(nome, tipo, storage=None):
+    """Gera e grava as versões de ``nome`` (caminho no storage) e retorna o mapa para ``*_versoes``."""
+    storage = storage or default_storage
+    with storage.open(nome, 'rb') as arquivo:
+        imagem = Image.open(arquivo)
+        maior = max(LARGURAS[tipo])
+        if imagem.format == 'JPEG':
+            imagem.draft('RGB', (maior, maior))  # Decodifica o JPEG já reduzido (bem mais rápido em fotos grandes)
+        imagem = ImageOps.exif_transpose(imagem)  # Aplica a rotação do EXIF antes de descartar o EXIF
+        imagem.load()
+
+    largura, altura = imagem.size
+    versoes = {}
+    for largura_alvo in _larguras_alvo(tipo, largura):
+        altura_alvo = max(1, round(altura * largura_alvo / largura))
+        reduzida = imagem.resize((largura_alvo, altura_alvo), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for formato in formatos_disponiveis():
+            copia = _preparar(reduzida, formato)
+            copia.info = {}  # Sem EXIF, GPS, XMP nem perfil de cor do original
+            conteudo = io.BytesIO()
+            copia.save(conteudo, format=formato.upper(), **FORMATOS[formato][2])
+            caminho = _nome_versao(nome, largura_alvo, formato)
+            if storage.exists(caminho):
+                storage.delete(caminho)  # Mesmo nome sempre (o storage renomearia para foto_abc123...)
+            versoes.setdefault(formato, {})[str(largura_alvo)] = storage.save(caminho, ContentFile(conteudo.getvalue()))
+    return {'original': nome, 'largura': largura, 'altura': altura, 'versoes': versoes}
+
+
+def remover_arquivos(mapa, storage=None):
+    storage = storage or default_storage
+    for por_largura in (mapa or {}).get('versoes', {}).values():
+        for caminho in por_largura.values():
+            try:
+                storage.delete(caminho)
+            except OSError:
+                logger.warning("Não foi possível apagar a versão %s", caminho)
+
+
+# ===================== MODELOS =====================
+
+def modelo_de(tipo):
+    from django.apps import apps
+
+    nome_modelo, campo, campo_versoes = CAMPOS[tipo]
+    return apps.get_model('Echo_app', nome_modelo), campo, campo_versoes
+
+
+def desatualizada(objeto, tipo):
+    """True se a imagem do objeto mudou (ou sumiu) desde que as versões foram geradas."""
+    _, campo, campo_versoes = CAMPOS[tipo]
+    nome = getattr(objeto, campo).name or ''
+    mapa = getattr(objeto, campo_versoes) or {}
+    return mapa.get('original', '') != nome
+
+
+def gravar(tipo, pk, nome, mapa):
+    """
+    Salva o mapa de versões se a imagem ainda for ``nome`` e apaga as versões da
+    imagem anterior. Usa UPDATE (sem save) para não disparar os sinais de novo.
+    """
+    modelo, campo, campo_versoes = modelo_de(tipo)
+    anterior = modelo.objects.filter(pk=pk).values_list(campo_versoes, flat=True).first()
+    mesma_imagem = Q(**{campo: nome}) if nome else Q(**{campo: ''}) | Q(**{f'{campo}__isnull': True})
+    if not modelo.objects.filter(mesma_imagem, pk=pk).update(**{campo_versoes: mapa}):
+        if not em_uso(tipo, nome):
+            remover_arquivos(mapa)  # Trocaram a imagem enquanto processávamos: a próxima tarefa cuida da nova
+        return False
+    if anterior and anterior.get('original') != nome and not em_uso(tipo, anterior.get('original')):
+        remover_arquivos(anterior)  # Arquivos endereçados pelo conteúdo podem ser de outro registro também
+    if tipo == 'noticia':
+        cache_segmentos.invalidar('noticia', f'noticia:{pk}')  # Cards e página da notícia passam a usar o srcset
+    return True
+
+
+def em_uso(tipo, nome):
+    """True se algum registro ainda aponta para o arquivo ``nome``."""
+    modelo, campo, _ = modelo_de(tipo)
+    return bool(nome) and modelo.objects.filter(**{campo: nome}).exists()
+
+
+def versoes_prontas(tipo, nome, exceto=None):
+    """Mapa já gerado para o mesmo arquivo em outro registro (mesma foto em dois perfis), ou None."""
+    modelo, campo, campo_versoes = modelo_de(tipo)
+    return modelo.objects.filter(**{campo: nome, f'{campo_versoes}__original': nome}).exclude(pk=exceto).values_list(
+        campo_versoes, flat=True
+    ).first()
+
+
+@tarefa(max_tentativas=3)
+def processar(tipo, pk):
+    modelo, campo, campo_versoes = modelo_de(tipo)
+    objeto = modelo.objects.filter(pk=pk).only('pk', campo, campo_versoes).first()
+    if objeto is None or not desatualizada(objeto, tipo):
+        return
+    nome = getattr(objeto, campo).name or ''
+    mapa = {}
+    if nome:
+        mapa = versoes_prontas(tipo, nome, exceto=pk) or gerar_arquivos(nome, tipo)
+    gravar(tipo, pk, nome, mapa)
+
+
+# ===================== TEMPLATES =====================
+
+def srcset(mapa, formato):
+    por_largura = (mapa or {}).get('versoes', {}).get(formato, {})
+    larguras = sorted(por_largura, key=int)
+    return ', '.join(f'{default_storage.url(por_largura[largura])} {largura}w' for largura in larguras)
+
+
+def url_versao(mapa, largura, formato=FORMATO_PADRAO):
+    """URL da menor versão com pelo menos ``largura`` px (ou a maior que houver); None sem versões."""
+    por_largura = (mapa or {}).get('versoes', {}).get(formato, {})
+    if not por_largura:
+        return None
+    larguras = sorted(int(chave) for chave in por_largura)
+    escolhida = next((chave for chave in larguras if chave >= largura), larguras[-1])
+    return default_storage.url(por_largura[str(escolhida)])
+
+
+def url_para(arquivo, mapa, largura, formato=FORMATO_PADRAO):
+    """URL da versão de ``arquivo`` com pelo menos ``largura`` px, ou a do original se ainda não houver versões."""
+    if not arquivo:
+        return None
+    if (mapa or {}).get('original') == arquivo.name:
+        return url_versao(mapa, largura, formato) or arquivo.url
+    return arquivo.url
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from . import teste_carga
+from .gerar_dados import SENHA_PADRAO
+
+ESPERA_SUBIDA = 30  # Segundos para o servidor começar a responder
+
+
+def servidores(porta, workers, threads):
+    """Deploy atual (gunicorn síncrono, WSGI) e o mesmo código servido por ASGI (uvicorn)."""
+    endereco = f'127.0.0.1:{porta}'
+    return {
+        'WSGI': [
+            sys.executable, '-m', 'gunicorn', 'Echoproject.wsgi:application',
+            '--bind', endereco, '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning',
+        ],
+        'ASGI': [
+            sys.executable, '-m', 'gunicorn', 'Echoproject.asgi:application', '-k', 'uvicorn.workers.UvicornWorker',
+            '--bind', endereco, '--workers', str(workers), '--log-level', 'warning',
+        ],
+    }
+
+
+def subir(comando, url, env=None):
+    """Inicia o servidor e espera ele responder em ``url`` (``env``: variáveis extras)."""
+    processo = subprocess.Popen(comando, cwd=settings.BASE_DIR, env={**os.environ, **(env or {})})
+    limite = time.monotonic() + ESPERA_SUBIDA
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise CommandError(f"O servidor saiu com código {processo.returncode} (gunicorn/uvicorn instalados?).")
+        try:
+            urllib.request.urlopen(url + '/', timeout=1).read()
+            return processo
+        except urllib.error.HTTPError:
+            return processo  # Respondeu, mesmo que com erro
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.3)
+    processo.kill()
+    raise CommandError(f"O servidor não respondeu em {ESPERA_SUBIDA}s.")
+
+
+def derrubar(processo):
+    processo.terminate()
+    try:
+        processo.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe o projeto com gunicorn (WSGI) e depois com gunicorn + UvicornWorker (ASGI), roda a mesma "
+        "carga do teste_carga contra cada um e compara req/s e p95 por rota. Use um banco populado "
+        "com gerar_dados; em SQLite as escritas concorrentes serializam, prefira o Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--porta', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2, help="Processos de cada servidor.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads por worker no WSGI.")
+        parser.add_argument('--duracao', type=float, default=20, help="Segundos de carga em cada servidor.")
+        parser.add_argument('--concorrencia', type=int, default=32, help="Clientes simultâneos.")
+        parser.add_argument('--logados', type=float, default=0.5, help="Fração dos clientes que faz login (0 a 1).")
+        parser.add_argument('--senha', default=SENHA_PADRAO, help="Senha dos usuários carga_*.")
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--semente', type=int, default=1, help="Mesma sequência de rotas nos dois servidores.")
+
+    def handle(self, *args, **options):
+        url = f"http://127.0.0.1:{options['porta']}"
+        medidas = {}
+        for nome, comando in servidores(options['porta'], options['workers'], options['threads']).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {nome}: {' '.join(comando[2:])}"))
+            processo = subir(comando, url)
+            try:
+                carga = teste_carga.Command(stdout=self.stdout, stderr=self.stderr)
+                decorrido = carga.carregar({**options, 'url': url})
+                medidas[nome] = {linha[0]: linha for linha in carga.estatisticas(decorrido)}
+            finally:
+                derrubar(processo)
+        self._comparar(medidas['WSGI'], medidas['ASGI'])
+
+    def _comparar(self, wsgi, asgi):
+        self.stdout.write(
+            f"\n{'rota':<18}{'WSGI req/s':>12}{'ASGI req/s':>12}{'ganho':>8}"
+            f"{'WSGI p95':>10}{'ASGI p95':>10}{'erros W/A':>11}"
+        )
+        for rota in list(teste_carga.MISTURA) + ['TOTAL']:
+            if rota not in wsgi or rota not in asgi:
+                continue
+            _, _, erros_w, rps_w, _, p95_w, _ = wsgi[rota]
+            _, _, erros_a, rps_a, _, p95_a, _ = asgi[rota]
+            ganho = f"{rps_a / rps_w:.2f}x" if rps_w else '-'
+            self.stdout.write(
+                f"{rota:<18}{rps_w:>12.1f}{rps_a:>12.1f}{ganho:>8}{p95_w:>10.1f}{p95_a:>10.1f}{f'{erros_w}/{erros_a}':>11}"
+            )
@@ -0,0 +1,122 @@
+import threading
+import time
+import urllib.parse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.urls import reverse
+
+from Echo_app.models import Categoria
+
+from . import teste_carga
+from .comparar_asgi_wsgi import derrubar, servidores, subir
+
+MODOS = ('nova', 'persistente', 'pool')  # Valores de ECHO_DB_CONEXOES (ver settings)
+
+
+def sessoes_abertas_no_banco():
+    """Total de conexões já aceitas pelo banco atual (pg_stat_database.sessions, Postgres 14+); None se não houver."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sessions FROM pg_stat_database WHERE datname = current_database()")
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência por requisição de uma view barata (filtrar_noticias) com cada modo de conexão ao "
+        "Postgres (ECHO_DB_CONEXOES: nova, persistente, pool), subindo o gunicorn uma vez por modo, e conta "
+        "quantas conexões o banco precisou aceitar em cada um. Rode com o Postgres configurado (DBNAME etc.) "
+        "e populado com gerar_dados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', nargs='+', choices=MODOS, default=list(MODOS))
+        parser.add_argument('--porta', type=int, default=8766)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=4, help="Threads por worker (WSGI).")
+        parser.add_argument('--asgi', action='store_true', help="Serve por ASGI (uvicorn) em vez de WSGI.")
+        parser.add_argument('--requisicoes', type=int, default=500, help="Requisições medidas por modo.")
+        parser.add_argument('--concorrencia', type=int, default=1,
+                            help="Clientes simultâneos (1 = latência pura de cada requisição).")
+        parser.add_argument('--aquecimento', type=int, default=20, help="Requisições descartadas antes de medir.")
+        parser.add_argument('--caminho', help="Outra URL a medir (padrão: filtrar_noticias da primeira categoria).")
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("O comparativo é para o Postgres: defina DBNAME, DBUSER, DBPASS (e DBHOST) no ambiente.")
+        caminho = options['caminho'] or self._caminho_padrao()
+        url = f"http://127.0.0.1:{options['porta']}"
+        comando = servidores(options['porta'], options['workers'], options['threads'])['ASGI' if options['asgi'] else 'WSGI']
+        self.stdout.write(f"Medindo {caminho} ({options['requisicoes']} requisições, {options['concorrencia']} clientes por modo).")
+
+        resultados = {}
+        for modo in options['modos']:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== ECHO_DB_CONEXOES={modo}"))
+            processo = subir(comando, url, env={'ECHO_DB_CONEXOES': modo})
+            try:
+                self._medir(url, caminho, options, options['aquecimento'])  # Sobe os pools/conexões de todos os workers
+                antes = sessoes_abertas_no_banco()
+                latencias, erros, decorrido = self._medir(url, caminho, options, options['requisicoes'])
+                depois = sessoes_abertas_no_banco()
+            finally:
+                derrubar(processo)
+            novas = depois - antes if antes is not None and depois is not None else None
+            resultados[modo] = (latencias, erros, decorrido, novas)
+            self.stdout.write(f"{len(latencias)} requisições em {decorrido:.1f}s, {erros} com erro.")
+
+        self._relatorio(resultados)
+
+    def _caminho_padrao(self):
+        categoria = Categoria.objects.order_by('pk').values_list('nome', flat=True).first()
+        if categoria is None:
+            raise CommandError("Não há categorias no banco. Rode `manage.py gerar_dados` antes.")
+        return f"{reverse('Echo_app:filtrar_noticias')}?categoria={urllib.parse.quote(categoria)}"
+
+    def _medir(self, url, caminho, options, total):
+        latencias = []
+        erros = [0]
+        restantes = [total]
+        lock = threading.Lock()
+
+        def executar():
+            cliente = teste_carga.Cliente(url, options['timeout'])
+            while True:
+                with lock:
+                    if restantes[0] <= 0:
+                        return
+                    restantes[0] -= 1
+                inicio = time.perf_counter()
+                status = cliente.requisitar(caminho)
+                duracao = time.perf_counter() - inicio
+                with lock:
+                    latencias.append(duracao)
+                    if not 200 <= status < 400:
+                        erros[0] += 1
+
+        threads = [threading.Thread(target=executar, daemon=True) for _ in range(options['concorrencia'])]
+        inicio = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencias.sort()
+        return latencias, erros[0], time.monotonic() - inicio
+
+    def _relatorio(self, resultados):
+        self.stdout.write(
+            f"\n{'modo':<13}{'req/s':>8}{'média ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>7}"
+            f"{'conexões novas':>16}{'p50 vs 1º':>11}"
+        )
+        p50_base = None
+        for modo, (latencias, erros, decorrido, novas) in resultados.items():
+            media = sum(latencias) / len(latencias) * 1000 if latencias else 0.0
+            p50, p95, p99 = (teste_carga.percentil(latencias, p) * 1000 for p in (50, 95, 99))
+            p50_base = p50_base or p50
+            self.stdout.write(
+                f"{modo:<13}{len(latencias) / decorrido:>8.1f}{media:>10.2f}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}"
+                f"{erros:>7}{'-' if novas is None else novas:>16}{f'{p50_base / p50:.2f}x' if p50 else '-':>11}"
+            )
@@ -0,0 +1,62 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Echo_app import consultas_lentas
+
+ORDENS = {
+    'total': lambda grupo: grupo['total_ms'],
+    'contagem': lambda grupo: grupo['contagem'],
+    'media': lambda grupo: grupo['media_ms'],
+    'max': lambda grupo: grupo['max_ms'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra as consultas lentas registradas (ECHO_CONSULTAS_LENTAS_ARQUIVO) agrupadas pelo SQL normalizado, "
+        "das que mais custaram para as que menos custaram, com as linhas do app que as disparam."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--ordem', choices=sorted(ORDENS), default='total', help="Critério (padrão: tempo total).")
+        parser.add_argument('--horas', type=float, help="Só registros das últimas N horas.")
+        parser.add_argument('--arquivo', help="Outro arquivo JSONL (ex.: copiado da produção).")
+        parser.add_argument('--origens', type=int, default=3, help="Quantas origens mostrar por consulta.")
+        parser.add_argument('--limpar', action='store_true', help="Apaga o arquivo depois de mostrar.")
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo'] or settings.ECHO_CONSULTAS_LENTAS_ARQUIVO
+        desde = timezone.now() - timedelta(hours=options['horas']) if options['horas'] else None
+        grupos = consultas_lentas.agregar(consultas_lentas.ler(caminho, desde))
+        if not grupos:
+            self.stdout.write(f"Nenhuma consulta lenta registrada em {caminho}.")
+            return
+
+        total_geral = sum(grupo['total_ms'] for grupo in grupos)
+        grupos.sort(key=ORDENS[options['ordem']], reverse=True)
+        self.stdout.write(
+            f"{sum(grupo['contagem'] for grupo in grupos)} consultas lentas registradas, "
+            f"{len(grupos)} diferentes, {total_geral / 1000:.1f}s no total.\n"
+        )
+        for posicao, grupo in enumerate(grupos[:options['top']], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{posicao} [{grupo['impressao']}] {grupo['contagem']}x  total {grupo['total_ms']:.0f} ms "
+                f"({grupo['total_ms'] / total_geral:.0%})  média {grupo['media_ms']:.1f} ms  máx {grupo['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  {grupo['sql'][:400]}")
+            rotas = ', '.join(f'{rota} ({vezes}x)' for rota, vezes in grupo['rotas'].most_common(options['origens']))
+            self.stdout.write(f"  rotas: {rotas}")
+            for origem, vezes in grupo['origens'].most_common(options['origens']):
+                self.stdout.write(f"    {vezes:>5}x {origem}")
+            for view, vezes in grupo['views'].most_common(options['origens']):
+                if view not in grupo['origens']:  # Consulta vinda de um módulo auxiliar: mostra a view também
+                    self.stdout.write(f"    {vezes:>5}x   via {view}")
+
+        if options['limpar'] and not options['arquivo']:
+            os.remove(caminho)
+            self.stdout.write(self.style.SUCCESS(f"{caminho} apagado."))
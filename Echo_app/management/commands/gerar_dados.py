@@ -0,0 +1,167 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Echo_app import busca, contadores, notificacoes, recomendacoes, relacionadas
+from Echo_app.models import Categoria, InteracaoNoticia, Noticia, Notificacao, PerfilUsuario
+
+User = get_user_model()
+
+LOTE = 2000
+PREFIXO_USUARIO = 'carga_'
+SENHA_PADRAO = 'carga-echo-123'
+CATEGORIAS_PADRAO = [
+    'Política', 'Economia', 'Esportes', 'Tecnologia', 'Educação', 'Saúde',
+    'Cultura', 'Mundo', 'Ciência', 'Entretenimento', 'Cidades', 'Meio Ambiente',
+]
+PALAVRAS = (
+    'governo eleição congresso votação reforma inflação juros mercado dólar empresa '
+    'campeonato final gol técnico seleção clube tecnologia celular aplicativo internet '
+    'escola universidade vestibular professor hospital vacina pesquisa saúde festival '
+    'cinema música show cidade trânsito chuva obra prefeitura clima floresta energia'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos (usuários, notícias, curtidas/salvamentos e notificações) "
+        "com bulk_create, para testes de carga. Os usuários criados se chamam carga_<n>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000)
+        parser.add_argument('--noticias', type=int, default=5000)
+        parser.add_argument('--interacoes', type=int, default=20, help="Média de curtidas+salvamentos por usuário.")
+        parser.add_argument('--notificacoes', type=int, default=50,
+                            help="Notícias recentes que geram notificação para os interessados na categoria.")
+        parser.add_argument('--senha', default=SENHA_PADRAO, help="Senha de todos os usuários gerados.")
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--sem-indices', action='store_true',
+                            help="Não reconstrói busca, relacionadas e recomendações no final.")
+
+    def handle(self, *args, **options):
+        self.aleatorio = random.Random(options['semente'])
+        inicio = time.perf_counter()
+
+        with transaction.atomic():
+            categorias = self._categorias()
+            usuarios = self._etapa("usuários e perfis", self._usuarios, options['usuarios'], options['senha'], categorias)
+            noticias = self._etapa("notícias", self._noticias, options['noticias'], categorias, usuarios)
+            self._etapa("curtidas e salvamentos", self._interacoes, usuarios, noticias, options['interacoes'])
+            self._etapa("notificações", self._notificacoes, noticias, options['notificacoes'])
+            self._etapa("contadores", contadores.reconciliar)
+            self._etapa("não lidas por perfil", notificacoes.reconciliar_nao_lidas)
+
+        if not options['sem_indices']:
+            self._etapa("índice de busca", busca.reconstruir)
+            self._etapa("afinidades", recomendacoes.reaprender)
+            self._etapa("listas de recomendações", recomendacoes.recalcular_todos)
+            try:
+                self._etapa("notícias relacionadas", relacionadas.reconstruir)
+            except ImportError:
+                self.stdout.write(self.style.WARNING("NumPy/SciPy não instalados; relacionadas não recalculadas."))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dados gerados em {time.perf_counter() - inicio:.1f}s. Senha dos usuários {PREFIXO_USUARIO}*: {options['senha']}"
+        ))
+
+    def _etapa(self, nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        quantidade = len(resultado) if isinstance(resultado, list) else resultado
+        self.stdout.write(f"  {nome}: {quantidade} em {time.perf_counter() - inicio:.2f}s")
+        return resultado
+
+    def _categorias(self):
+        existentes = set(Categoria.objects.values_list('nome', flat=True))
+        Categoria.objects.bulk_create([Categoria(nome=nome) for nome in CATEGORIAS_PADRAO if nome not in existentes])
+        return list(Categoria.objects.all())
+
+    def _usuarios(self, quantidade, senha, categorias):
+        # O hash é calculado uma vez só: com PBKDF2 ele custaria ~0,3s por usuário
+        hash_senha = make_password(senha)
+        primeiro = User.objects.filter(username__startswith=PREFIXO_USUARIO).count()
+        nomes = [f'{PREFIXO_USUARIO}{primeiro + i}' for i in range(quantidade)]
+        User.objects.bulk_create(
+            [User(username=nome, email=f'{nome}@example.com', password=hash_senha) for nome in nomes], batch_size=LOTE,
+        )
+        usuarios = []
+        for inicio in range(0, len(nomes), LOTE):
+            usuarios.extend(User.objects.filter(username__in=nomes[inicio:inicio + LOTE]).values_list('pk', flat=True))
+
+        # bulk_create não dispara o post_save que cria o perfil
+        PerfilUsuario.objects.bulk_create([PerfilUsuario(usuario_id=pk) for pk in usuarios], batch_size=LOTE)
+        perfis = []
+        for inicio in range(0, len(usuarios), LOTE):
+            perfis.extend(PerfilUsuario.objects.filter(usuario_id__in=usuarios[inicio:inicio + LOTE]).values_list('pk', flat=True))
+        Interesse = PerfilUsuario.categorias_de_interesse.through
+        Interesse.objects.bulk_create([
+            Interesse(perfilusuario_id=perfil_id, categoria_id=categoria.pk)
+            for perfil_id in perfis
+            for categoria in self.aleatorio.sample(categorias, self.aleatorio.randint(0, 4))
+        ], batch_size=LOTE, ignore_conflicts=True)
+        return usuarios
+
+    def _noticias(self, quantidade, categorias, usuarios):
+        agora = timezone.now()
+        autores = usuarios[:max(1, len(usuarios) // 50)]  # Poucos editores publicam tudo
+        Noticia.objects.bulk_create([
+            Noticia(
+                titulo=' '.join(self.aleatorio.sample(PALAVRAS, 6)).capitalize(),
+                conteudo=' '.join(self.aleatorio.choices(PALAVRAS, k=self.aleatorio.randint(150, 600))),
+                data_publicacao=agora - timedelta(minutes=self.aleatorio.expovariate(1 / 4320)),  # Média de 3 dias
+                autor_id=self.aleatorio.choice(autores) if autores else None,
+                categoria=self.aleatorio.choice(categorias),
+                urgente=self.aleatorio.random() < 0.05,
+            )
+            for _ in range(quantidade)
+        ], batch_size=LOTE)
+        return list(Noticia.objects.order_by('-pk').values_list('pk', 'categoria_id')[:quantidade])
+
+    def _interacoes(self, usuarios, noticias, media_por_usuario):
+        # Popularidade com cauda longa (Zipf): poucas notícias concentram a maioria das curtidas
+        pesos = [1 / (posicao + 1) ** 1.1 for posicao in range(len(noticias))]
+        ordem = self.aleatorio.sample(noticias, len(noticias))
+        acumulados = []
+        total = 0.0
+        for peso in pesos:
+            total += peso
+            acumulados.append(total)
+
+        criadas = 0
+        lote = []
+        for usuario_id in usuarios:
+            quantidade = min(len(noticias), int(self.aleatorio.expovariate(1 / max(media_por_usuario, 1))))
+            escolhidas = {ordem_id for ordem_id, _ in self.aleatorio.choices(ordem, cum_weights=acumulados, k=quantidade)}
+            for noticia_id in escolhidas:
+                lote.append(InteracaoNoticia(usuario_id=usuario_id, noticia_id=noticia_id, tipo='CURTIDA'))
+                if self.aleatorio.random() < 0.3:  # Quem salva quase sempre também curtiu
+                    lote.append(InteracaoNoticia(usuario_id=usuario_id, noticia_id=noticia_id, tipo='SALVAMENTO'))
+            if len(lote) >= LOTE:
+                criadas += len(InteracaoNoticia.objects.bulk_create(lote, ignore_conflicts=True))
+                lote = []
+        criadas += len(InteracaoNoticia.objects.bulk_create(lote, ignore_conflicts=True))
+        return criadas
+
+    def _notificacoes(self, noticias, quantidade):
+        Interesse = PerfilUsuario.categorias_de_interesse.through
+        interessados = {}
+        for usuario_id, categoria_id in Interesse.objects.values_list('perfilusuario__usuario_id', 'categoria_id').iterator():
+            interessados.setdefault(categoria_id, []).append(usuario_id)
+
+        criadas = 0
+        recentes = Noticia.objects.filter(pk__in=[pk for pk, _ in noticias[:quantidade]])  # As últimas geradas
+        for noticia_id, categoria_id, titulo in recentes.values_list('pk', 'categoria_id', 'titulo'):
+            lote = [
+                Notificacao(usuario_id=usuario_id, noticia_id=noticia_id, manchete=f"🚨 NOVIDADE: {titulo[:250]}",
+                            lida=self.aleatorio.random() < 0.6)
+                for usuario_id in interessados.get(categoria_id, [])
+            ]
+            criadas += len(Notificacao.objects.bulk_create(lote, batch_size=LOTE))
+        return criadas
@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from Echo_app import imagens
+
+
+def _iniciar_processo():
+    # Com 'spawn' (macOS/Windows) o processo filho começa sem o Django configurado
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as versões responsivas (AVIF/WebP/JPEG) das imagens já enviadas, em vários processos. "
+        "Por padrão só processa imagens sem versões ou cujas versões são de outro arquivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=sorted(imagens.CAMPOS), action='append',
+                            help="noticia e/ou perfil (padrão: os dois).")
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--todas', action='store_true', help="Refaz também as que já estão em dia.")
+
+    def handle(self, *args, **options):
+        pendentes = []  # (tipo, pk, nome)
+        for tipo in options['tipo'] or sorted(imagens.CAMPOS):
+            modelo, campo, campo_versoes = imagens.modelo_de(tipo)
+            linhas = modelo.objects.exclude(Q(**{campo: ''}) | Q(**{f'{campo}__isnull': True}))
+            for pk, nome, mapa in linhas.values_list('pk', campo, campo_versoes).iterator():
+                if options['todas'] or (mapa or {}).get('original') != nome:
+                    pendentes.append((tipo, pk, nome))
+        if not pendentes:
+            self.stdout.write("Todas as imagens já têm versões.")
+            return
+        self.stdout.write(f"{len(pendentes)} imagens em {options['processos']} processos ({', '.join(imagens.formatos_disponiveis())}).")
+
+        inicio = time.perf_counter()
+        connections.close_all()  # Os processos filhos não devem herdar a conexão aberta
+        geradas = falhas = 0
+        with ProcessPoolExecutor(max_workers=options['processos'], initializer=_iniciar_processo) as pool:
+            futuros = {pool.submit(imagens.gerar_arquivos, nome, tipo): (tipo, pk, nome) for tipo, pk, nome in pendentes}
+            for futuro in as_completed(futuros):
+                tipo, pk, nome = futuros[futuro]
+                try:
+                    mapa = futuro.result()
+                except Exception as erro:  # Arquivo sumido, corrompido ou formato desconhecido
+                    falhas += 1
+                    self.stderr.write(self.style.WARNING(f"  {nome}: {erro}"))
+                    continue
+                # A gravação no banco fica no processo principal (os filhos só mexem nos arquivos)
+                imagens.gravar(tipo, pk, nome, mapa)
+                geradas += 1
+
+        estilo = self.style.SUCCESS if not falhas else self.style.WARNING
+        self.stdout.write(estilo(f"{geradas} imagens processadas, {falhas} com erro, em {time.perf_counter() - inicio:.1f}s."))
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Echo_app import armazenamento, avatares, imagens
+from Echo_app.models import PerfilUsuario
+
+
+def _arquivos(storage, pasta):
+    """Todos os arquivos abaixo de ``pasta`` no storage (recursivo)."""
+    try:
+        subpastas, arquivos = storage.listdir(pasta)
+    except FileNotFoundError:
+        return
+    for arquivo in arquivos:
+        yield f'{pasta}/{arquivo}'
+    for subpasta in subpastas:
+        yield from _arquivos(storage, f'{pasta}/{subpasta}')
+
+
+class Command(BaseCommand):
+    help = (
+        "Libera espaço em media/: troca cópias dos avatares prontos por referência (avatar_padrao), "
+        "passa fotos de perfil antigas para nomes por conteúdo (juntando duplicadas) e apaga arquivos "
+        "e versões que nenhum registro usa mais."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Só mostra o que seria feito.")
+        parser.add_argument('--idade-minima', type=float, default=24,
+                            help="Horas: arquivos mais novos que isso não são apagados (uploads em andamento).")
+
+    def handle(self, *args, **options):
+        self.simular = options['simular']
+        self._avatares_e_duplicadas()
+        self._orfaos(timezone.now() - timedelta(hours=options['idade_minima']))
+
+    def _avatares_e_duplicadas(self):
+        prontos = {}
+        for nome in avatares.LISTA_AVATARES:
+            caminho = avatares.caminho_avatar(nome)
+            if caminho:
+                with open(caminho, 'rb') as arquivo:
+                    prontos[armazenamento.resumo(File(arquivo))] = nome
+
+        campo = PerfilUsuario._meta.get_field('foto_perfil')
+        convertidos = renomeados = 0
+        perfis = PerfilUsuario.objects.exclude(foto_perfil='').exclude(foto_perfil__isnull=True)
+        for perfil in perfis.only('pk', 'foto_perfil').iterator():
+            nome = perfil.foto_perfil.name
+            try:
+                with perfil.foto_perfil.open('rb') as arquivo:
+                    resumo_hex = armazenamento.resumo(arquivo)
+                    if resumo_hex in prontos:
+                        convertidos += 1
+                        if not self.simular:
+                            PerfilUsuario.objects.filter(pk=perfil.pk).update(
+                                avatar_padrao=prontos[resumo_hex], foto_perfil=None, foto_versoes={},
+                            )
+                        continue
+                    novo = armazenamento.nome_por_conteudo(campo.upload_to, arquivo, resumo_hex)
+                    if novo == nome:
+                        continue
+                    renomeados += 1
+                    if not self.simular:
+                        novo = armazenamento.salvar(perfil.foto_perfil, arquivo, resumo_hex)
+                        PerfilUsuario.objects.filter(pk=perfil.pk, foto_perfil=nome).update(foto_perfil=novo)
+                        imagens.processar.enfileirar_unica(tipo='perfil', pk=perfil.pk)  # Versões do nome novo
+            except FileNotFoundError:
+                self.stderr.write(self.style.WARNING(f"  {nome}: arquivo não encontrado (perfil {perfil.pk})"))
+        self.stdout.write(f"Cópias de avatares prontos viraram referência: {convertidos}")
+        self.stdout.write(f"Fotos passadas para nome por conteúdo: {renomeados}")
+
+    def _orfaos(self, limite):
+        storage = default_storage
+        usados = set()
+        pastas = set()
+        for tipo in imagens.CAMPOS:
+            modelo, campo, campo_versoes = imagens.modelo_de(tipo)
+            pastas.add(modelo._meta.get_field(campo).upload_to.rstrip('/'))
+            for nome, mapa in modelo.objects.values_list(campo, campo_versoes).iterator():
+                if nome:
+                    usados.add(nome)
+                for por_largura in (mapa or {}).get('versoes', {}).values():
+                    usados.update(por_largura.values())
+
+        apagados = bytes_liberados = recentes = 0
+        for pasta in sorted(pastas):
+            for caminho in _arquivos(storage, pasta):
+                if caminho in usados:
+                    continue
+                if storage.get_modified_time(caminho) > limite:
+                    recentes += 1
+                    continue
+                tamanho = storage.size(caminho)
+                self.stdout.write(f"  {'(simulação) ' if self.simular else ''}apagando {caminho} ({tamanho / 1024:.0f} KB)")
+                if not self.simular:
+                    storage.delete(caminho)
+                apagados += 1
+                bytes_liberados += tamanho
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{apagados} arquivos órfãos{' (simulação)' if self.simular else ''}, "
+            f"{bytes_liberados / 1024 / 1024:.1f} MB; {recentes} recentes demais para apagar."
+        ))
+
@@ -0,0 +1,126 @@
+import secrets
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from Echo_app import recuperacao_senha
+from Echo_app.models import Noticia
+
+User = get_user_model()
+
+# Valores de ECHO_SESSOES (ver settings)
+MODOS = {
+    'banco': 'django.contrib.sessions.backends.db',
+    'cache_banco': 'django.contrib.sessions.backends.cached_db',
+    'assinada': 'django.contrib.sessions.backends.signed_cookies',
+}
+FASES = ('anônimo', 'recuperação', 'logado', 'sair')
+COMANDOS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+SENHA = 'Medir-sessoes-1'
+
+
+class Command(BaseCommand):
+    help = (
+        "Conta as consultas à tabela de sessões (django_session) por requisição num roteiro de navegação "
+        "(leitura anônima, recuperação de senha, login, leitura logada, saída) com cada modo de sessão "
+        "(ECHO_SESSOES). Com o cache das sessões no banco (ECHO_CACHE_COMPARTILHADO='banco'), as consultas à "
+        "tabela dele aparecem à parte (sessões em cache e recuperações de senha). Tudo roda dentro de uma transação desfeita no fim: não sobra usuário nem sessão."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', nargs='+', choices=sorted(MODOS), default=list(MODOS))
+        parser.add_argument('--leituras', type=int, default=20, help="Requisições de leitura por fase.")
+
+    def handle(self, *args, **options):
+        self.noticia = Noticia.objects.order_by('-data_publicacao').values_list('pk', flat=True).first()
+        resultados = {}
+        for modo in options['modos']:
+            with override_settings(SESSION_ENGINE=MODOS[modo], ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                with transaction.atomic():
+                    resultados[modo] = self._medir(options['leituras'])
+                    transaction.set_rollback(True)
+        self._relatorio(resultados)
+
+    def _medir(self, leituras):
+        """Roda o roteiro; devolve as requisições por fase e Counter[(tabela, fase, comando)] das consultas."""
+        usuario = User.objects.create_user(f'medir_sessoes_{secrets.token_hex(4)}', 'medir_sessoes@example.com', SENHA)
+        cliente = Client()
+        requisicoes = Counter()
+        consultas = Counter()
+        fase = [None]
+
+        tabelas = {'django_session': 'sessao'}
+        cache_das_sessoes = settings.CACHES[settings.SESSION_CACHE_ALIAS]
+        if cache_das_sessoes['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+            tabelas[cache_das_sessoes['LOCATION']] = 'cache'
+
+        def contar(execute, sql, params, many, context):
+            for tabela, nome in tabelas.items():
+                if tabela in sql:
+                    consultas[nome, fase[0], sql.lstrip().split(None, 1)[0].upper()] += 1
+            return execute(sql, params, many, context)
+
+        def requisitar(nome_fase, metodo, caminho, dados=None):
+            fase[0] = nome_fase
+            requisicoes[nome_fase] += 1
+            return getattr(cliente, metodo)(caminho, dados)
+
+        with connection.execute_wrapper(contar):
+            for _ in range(leituras):
+                requisitar('anônimo', 'get', reverse('Echo_app:dashboard'))
+                if self.noticia:
+                    requisitar('anônimo', 'get', reverse('Echo_app:noticia_detalhe', args=[self.noticia]))
+
+            requisitar('recuperação', 'get', reverse('Echo_app:esqueci_senha'))
+            requisitar('recuperação', 'post', reverse('Echo_app:esqueci_senha'), {'email': usuario.email})
+            requisitar('recuperação', 'post', reverse('Echo_app:verificar_codigo'), {'codigo': '000000'})
+            requisitar('recuperação', 'post', reverse('Echo_app:verificar_codigo'), {'codigo': self._codigo(cliente)})
+            requisitar('recuperação', 'post', reverse('Echo_app:redefinir_senha_final'),
+                       {'new_password1': SENHA, 'new_password2': SENHA})
+
+            requisitar('logado', 'post', reverse('Echo_app:entrar'), {'username': usuario.username, 'password': SENHA})
+            for _ in range(leituras):
+                requisitar('logado', 'get', reverse('Echo_app:dashboard'))
+                requisitar('logado', 'get', reverse('Echo_app:lista_notificacoes'))
+                if self.noticia:
+                    requisitar('logado', 'get', reverse('Echo_app:noticia_detalhe', args=[self.noticia]))
+
+            requisitar('sair', 'post', reverse('Echo_app:sair'))
+        return requisicoes, consultas
+
+    def _codigo(self, cliente):
+        """O código enviado por e-mail, lido do cache como a view o lê (o envio fica na transação desfeita)."""
+        pedido = RequestFactory().get('/')
+        pedido.COOKIES = {nome: cookie.value for nome, cookie in cliente.cookies.items()}
+        recuperacao = recuperacao_senha.atual(pedido)
+        return recuperacao.codigo if recuperacao else ''
+
+    def _relatorio(self, resultados):
+        com_cache = any(tabela == 'cache' for _, consultas in resultados.values() for tabela, _, _ in consultas)
+        self.stdout.write(
+            f"{'modo':<13}{'fase':<13}{'req':>5}" + ''.join(f'{comando:>8}' for comando in COMANDOS)
+            + f"{'leituras/req':>14}{'escritas/req':>14}"
+            + (f"{'cache lê/req':>14}{'cache grava/req':>17}" if com_cache else '')
+        )
+        for modo, (requisicoes, consultas) in resultados.items():
+            for fase in (*FASES, 'total'):
+                fases = FASES if fase == 'total' else (fase,)
+                total_req = sum(requisicoes[f] for f in fases) or 1
+                contagens = [sum(consultas['sessao', f, comando] for f in fases) for comando in COMANDOS]
+                linha = (
+                    f"{modo:<13}{fase:<13}{total_req:>5}" + ''.join(f'{n:>8}' for n in contagens)
+                    + f"{contagens[0] / total_req:>14.2f}{sum(contagens[1:]) / total_req:>14.2f}"
+                )
+                if com_cache:
+                    cache = [sum(consultas['cache', f, comando] for f in fases) for comando in COMANDOS]
+                    linha += f"{cache[0] / total_req:>14.2f}{sum(cache[1:]) / total_req:>17.2f}"
+                self.stdout.write(self.style.MIGRATE_HEADING(linha) if fase == 'total' else linha)
+            anonimas = consultas['sessao', 'anônimo', 'INSERT'] + consultas['sessao', 'recuperação', 'INSERT']
+            estilo = self.style.SUCCESS if not anonimas else self.style.WARNING
+            self.stdout.write(estilo(f"{modo}: {anonimas} linha(s) de sessão criadas por anônimos.\n"))
@@ -0,0 +1,72 @@
+import logging
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from Echo_app import notificacoes, tarefas
+
+logger = logging.getLogger('Echo_app.tarefas')
+
+
+class Command(BaseCommand):
+    help = "Executa as tarefas da fila (e-mails, notificações, imagens) com um pool de threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Número de threads executando tarefas.")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--relatorio', type=float, default=60.0, help="Segundos entre os relatórios de status.")
+        parser.add_argument('--uma-vez', action='store_true', help="Esvazia a fila e termina (útil em cron e testes).")
+
+    def handle(self, *args, **options):
+        self.parar = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda *_: self.parar.set())
+            signal.signal(signal.SIGTERM, lambda *_: self.parar.set())
+
+        tarefas.recuperar_abandonadas()
+        tarefas.limpar_concluidas()
+
+        if options['uma_vez']:
+            executadas = self._esvaziar()
+            self.stdout.write(self.style.SUCCESS(f"{executadas} tarefas executadas."))
+            return
+
+        workers = [
+            threading.Thread(target=self._loop, args=(options['intervalo'],), name=f'echo-worker-{i}', daemon=True)
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} workers processando a fila. Ctrl+C para parar.")
+
+        while not self.parar.wait(options['relatorio']):
+            tarefas.recuperar_abandonadas()
+            self.stdout.write(f"Fila: {tarefas.estatisticas()['fila']} | Notificações: {notificacoes.estatisticas()}")
+            connections.close_all()
+
+        for worker in workers:
+            worker.join()
+
+    def _esvaziar(self):
+        executadas = 0
+        while (item := tarefas.reservar()) is not None:
+            tarefas.executar(item)
+            executadas += 1
+        return executadas
+
+    def _loop(self, intervalo):
+        try:
+            while not self.parar.is_set():
+                close_old_connections()
+                item = tarefas.reservar()
+                if item is None:
+                    self.parar.wait(intervalo)
+                    continue
+                inicio = time.perf_counter()
+                ok = tarefas.executar(item)
+                logger.info("%s %s em %.3fs", item, "ok" if ok else "com erro", time.perf_counter() - inicio)
+        finally:
+            connections.close_all()
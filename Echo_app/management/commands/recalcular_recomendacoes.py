@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from Echo_app import recomendacoes
+
+
+class Command(BaseCommand):
+    help = "Recalcula as listas de recomendações pré-calculadas (de um usuário ou de todos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, help="ID do usuário (padrão: todos com alguma afinidade).")
+        parser.add_argument('--reaprender', action='store_true',
+                            help="Refaz antes as afinidades (HistoricoInteresse) a partir de todas as curtidas e salvamentos.")
+
+    def handle(self, *args, **options):
+        if options['reaprender']:
+            linhas = recomendacoes.reaprender()
+            self.stdout.write(f"{linhas} afinidades usuário/categoria recalculadas.")
+        if options['usuario']:
+            linhas = recomendacoes.recalcular(options['usuario'])
+            self.stdout.write(self.style.SUCCESS(f"{linhas} recomendações gravadas para o usuário {options['usuario']}."))
+            return
+        total = recomendacoes.recalcular_todos()
+        self.stdout.write(self.style.SUCCESS(f"Recomendações recalculadas para {total} usuários."))
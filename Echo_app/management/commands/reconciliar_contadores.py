@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from Echo_app import contadores, notificacoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula curtidas_count e salvamentos_count de todas as notícias a partir das interações "
+        "e o contador de notificações não lidas de cada perfil."
+    )
+
+    def handle(self, *args, **options):
+        atualizadas = contadores.reconciliar()
+        self.stdout.write(self.style.SUCCESS(f"{atualizadas} notícias reconciliadas."))
+        perfis = notificacoes.reconciliar_nao_lidas()
+        self.stdout.write(self.style.SUCCESS(f"{perfis} perfis com o contador de não lidas reconciliado."))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Echo_app import relacionadas
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero os vizinhos por conteúdo (TF-IDF) de todas as notícias."
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = relacionadas.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"Vizinhos de {total} notícias recalculados em {time.perf_counter() - inicio:.1f}s."
+        ))
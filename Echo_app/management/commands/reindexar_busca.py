@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Echo_app import busca
+
+
+class Command(BaseCommand):
+    help = "Reconstrói do zero o índice de busca textual das notícias."
+
+    def handle(self, *args, **options):
+        if not busca.disponivel():
+            raise CommandError("Índice de busca indisponível neste banco. Rode as migrações primeiro.")
+        total = busca.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{total} notícias indexadas."))
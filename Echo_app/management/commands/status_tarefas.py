@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from Echo_app import tarefas
+
+
+class Command(BaseCommand):
+    help = "Mostra o tamanho da fila de tarefas e a latência por tipo de tarefa na última hora."
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(tarefas.estatisticas(), indent=2, ensure_ascii=False))
@@ -0,0 +1,195 @@
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from Echo_app.models import Noticia
+
+from .gerar_dados import PALAVRAS, PREFIXO_USUARIO, SENHA_PADRAO
+
+User = get_user_model()
+
+# Rota -> peso no sorteio. Curtidas e notificações só são sorteadas por usuários logados.
+MISTURA = {
+    'dashboard': 40,
+    'noticia_detalhe': 30,
+    'pesquisar': 10,
+    'curtir': 10,
+    'notificacoes': 10,
+}
+AMOSTRA_NOTICIAS = 2000
+
+
+def percentil(valores_ordenados, p):
+    """Percentil ``p`` (0-100) por interpolação linear de uma lista já ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    posicao = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (posicao - inferior)
+
+
+class Cliente:
+    """Um navegador simulado: cookies próprios e, opcionalmente, uma sessão logada."""
+
+    def __init__(self, base, timeout):
+        self.base = base.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.logado = False
+
+    def csrf(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def requisitar(self, caminho, dados=None, cabecalhos=None):
+        """Retorna o status HTTP (0 em erro de conexão)."""
+        corpo = urllib.parse.urlencode(dados).encode() if dados is not None else None
+        requisicao = urllib.request.Request(self.base + caminho, data=corpo, headers={
+            'Referer': self.base + '/', **(cabecalhos or {}),
+        })
+        try:
+            with self.abridor.open(requisicao, timeout=self.timeout) as resposta:
+                resposta.read()
+                return resposta.status
+        except urllib.error.HTTPError as erro:
+            erro.read()
+            return erro.code
+        except (urllib.error.URLError, OSError):
+            return 0
+
+    def entrar(self, username, senha):
+        caminho = reverse('Echo_app:entrar')
+        self.requisitar(caminho)  # Só para receber o cookie csrftoken
+        self.requisitar(caminho, {'username': username, 'password': senha, 'csrfmiddlewaretoken': self.csrf()})
+        self.logado = any(c.name == 'sessionid' for c in self.cookies)
+        return self.logado
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera carga contra um servidor rodando (runserver ou gunicorn) com uma mistura de "
+        "rotas (dashboard, detalhe, pesquisa, curtidas, notificações) e mostra p50/p95/p99 "
+        "e requisições por segundo de cada rota. Use gerar_dados antes para ter usuários carga_*."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Endereço do servidor.")
+        parser.add_argument('--duracao', type=float, default=30, help="Segundos de carga.")
+        parser.add_argument('--concorrencia', type=int, default=8, help="Clientes simultâneos (threads).")
+        parser.add_argument('--logados', type=float, default=0.5, help="Fração dos clientes que faz login (0 a 1).")
+        parser.add_argument('--senha', default=SENHA_PADRAO, help="Senha dos usuários carga_*.")
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--semente', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self._relatorio(self.carregar(options))
+
+    def carregar(self, options):
+        """Roda a carga descrita em ``options`` e retorna os segundos decorridos (resultados em ``self.resultados``)."""
+        noticias = list(Noticia.objects.order_by('-data_publicacao').values_list('pk', flat=True)[:AMOSTRA_NOTICIAS])
+        if not noticias:
+            raise CommandError("Não há notícias no banco. Rode `manage.py gerar_dados` antes.")
+        quantidade_logados = round(options['concorrencia'] * options['logados'])
+        usuarios = list(User.objects.filter(username__startswith=PREFIXO_USUARIO).order_by('?').values_list(
+            'username', flat=True
+        )[:quantidade_logados])
+
+        self.aleatorio = random.Random(options['semente'])
+        self.noticias = noticias
+        self.resultados = {}  # rota -> ([latências em s], erros)
+        self.lock = threading.Lock()
+
+        clientes = []
+        for i in range(options['concorrencia']):
+            cliente = Cliente(options['url'], options['timeout'])
+            if i < len(usuarios) and not cliente.entrar(usuarios[i], options['senha']):
+                self.stderr.write(self.style.WARNING(f"Login falhou para {usuarios[i]}; segue como anônimo."))
+            clientes.append(cliente)
+        logados = sum(c.logado for c in clientes)
+        self.stdout.write(
+            f"Carga em {options['url']} por {options['duracao']:.0f}s: "
+            f"{len(clientes)} clientes ({logados} logados), {len(noticias)} notícias sorteáveis."
+        )
+
+        fim = time.monotonic() + options['duracao']
+        threads = [
+            threading.Thread(target=self._executar, args=(cliente, fim, random.Random(self.aleatorio.random())), daemon=True)
+            for cliente in clientes
+        ]
+        inicio = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - inicio
+
+    def _executar(self, cliente, fim, aleatorio):
+        rotas = [rota for rota in MISTURA if cliente.logado or rota not in ('curtir', 'notificacoes')]
+        pesos = [MISTURA[rota] for rota in rotas]
+        while time.monotonic() < fim:
+            rota = aleatorio.choices(rotas, weights=pesos)[0]
+            caminho, dados, cabecalhos = self._montar(rota, cliente, aleatorio)
+            inicio = time.perf_counter()
+            status = cliente.requisitar(caminho, dados, cabecalhos)
+            duracao = time.perf_counter() - inicio
+            with self.lock:
+                latencias, erros = self.resultados.setdefault(rota, ([], [0]))
+                latencias.append(duracao)
+                if not 200 <= status < 400:
+                    erros[0] += 1
+
+    def _montar(self, rota, cliente, aleatorio):
+        """Retorna (caminho, dados do POST ou None, cabeçalhos)."""
+        # Notícias recentes são mais visitadas: sorteio enviesado para o começo da lista
+        noticia_id = self.noticias[min(int(aleatorio.expovariate(1 / 50)), len(self.noticias) - 1)]
+        if rota == 'dashboard':
+            return reverse('Echo_app:dashboard'), None, {}
+        if rota == 'noticia_detalhe':
+            return reverse('Echo_app:noticia_detalhe', args=[noticia_id]), None, {}
+        if rota == 'pesquisar':
+            termo = urllib.parse.quote(aleatorio.choice(PALAVRAS))
+            return f"{reverse('Echo_app:pesquisar_noticias')}?q={termo}", None, {'X-Requested-With': 'XMLHttpRequest'}
+        if rota == 'curtir':
+            return reverse('Echo_app:curtir_noticia', args=[noticia_id]), {}, {
+                'X-CSRFToken': cliente.csrf(), 'X-Requested-With': 'XMLHttpRequest',
+            }
+        return reverse('Echo_app:lista_notificacoes'), None, {}
+
+    def estatisticas(self, decorrido):
+        """Linhas (rota, reqs, erros, req/s, p50, p95, p99 em ms) por rota e a linha TOTAL."""
+        linhas = []
+        todas = []
+        total_erros = 0
+        for rota in MISTURA:
+            if rota not in self.resultados:
+                continue
+            latencias, erros = self.resultados[rota]
+            latencias.sort()
+            todas.extend(latencias)
+            total_erros += erros[0]
+            linhas.append(self._linha(rota, latencias, erros[0], decorrido))
+        todas.sort()
+        linhas.append(self._linha('TOTAL', todas, total_erros, decorrido))
+        return linhas
+
+    def _relatorio(self, decorrido):
+        self.stdout.write(f"\n{'rota':<18}{'reqs':>8}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        linhas = self.estatisticas(decorrido)
+        for rota, reqs, erros, por_segundo, p50, p95, p99 in linhas:
+            self.stdout.write(f"{rota:<18}{reqs:>8}{erros:>7}{por_segundo:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+        total, total_erros = linhas[-1][1], linhas[-1][2]
+        estilo = self.style.SUCCESS if not total_erros else self.style.WARNING
+        self.stdout.write(estilo(f"\n{total} requisições em {decorrido:.1f}s, {total_erros} com erro."))
+
+    def _linha(self, rota, latencias, erros, decorrido):
+        p50, p95, p99 = (percentil(latencias, p) * 1000 for p in (50, 95, 99))
+        return rota, len(latencias), erros, len(latencias) / decorrido, p50, p95, p99
@@ -0,0 +1,47 @@
+# Índice de busca textual das notícias (ver Echo_app/busca.py)
+
+from django.db import migrations
+
+TABELA = 'Echo_app_busca_noticia'
+
+
+def criar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE "{TABELA}" ('
+            f'noticia_id bigint PRIMARY KEY REFERENCES "Echo_app_noticia" (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'documento tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX "{TABELA}_documento_gin" ON "{TABELA}" USING GIN (documento)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE "{TABELA}" USING fts5('
+            f"titulo, conteudo, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    else:
+        return
+
+    # Indexa as notícias que já existem
+    from Echo_app import busca
+    Noticia = apps.get_model('Echo_app', 'Noticia')
+    linhas = list(Noticia.objects.using(schema_editor.connection.alias).values_list('id', 'titulo', 'conteudo'))
+    if linhas:
+        with schema_editor.connection.cursor() as cursor:
+            busca._inserir(cursor, linhas)
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{TABELA}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0005_remove_noticia_midia_noticia_imagem'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
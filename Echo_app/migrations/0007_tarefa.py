@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0006_indice_busca_noticia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('funcao', models.CharField(max_length=200, verbose_name='Função')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDA', 'Concluída'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=10, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveIntegerField(default=5, verbose_name='Máximo de Tentativas')),
+                ('executar_apos', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar Após')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('data_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Início da Execução')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Fim da Execução')),
+                ('erro', models.TextField(blank=True, verbose_name='Último Erro')),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['executar_apos', 'id'],
+                'indexes': [models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0007_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noticia',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Última Atualização'),
+            preserve_default=False,
+        ),
+    ]
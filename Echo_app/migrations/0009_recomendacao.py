@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0008_noticia_data_atualizacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recomendacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField(verbose_name='Pontuação')),
+                ('data_geracao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Geração')),
+                ('noticia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendacoes', to='Echo_app.noticia', verbose_name='Notícia')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendacoes', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Recomendação',
+                'verbose_name_plural': 'Recomendações',
+                'indexes': [models.Index(fields=['usuario', '-pontuacao'], name='recomendacao_usuario_idx')],
+                'unique_together': {('usuario', 'noticia')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0009_recomendacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoticiaRelacionada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similaridade', models.FloatField(verbose_name='Similaridade')),
+                ('posicao', models.PositiveSmallIntegerField(verbose_name='Posição')),
+                ('noticia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vizinhos', to='Echo_app.noticia', verbose_name='Notícia')),
+                ('relacionada', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Echo_app.noticia', verbose_name='Notícia Relacionada')),
+            ],
+            options={
+                'verbose_name': 'Notícia Relacionada',
+                'verbose_name_plural': 'Notícias Relacionadas',
+                'indexes': [models.Index(fields=['noticia', 'posicao'], name='relacionada_noticia_idx')],
+                'unique_together': {('noticia', 'relacionada')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0010_noticiarelacionada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interacaonoticia',
+            index=models.Index(fields=['usuario', 'tipo', '-data_interacao'], name='interacao_usuario_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(condition=models.Q(('urgente', True)), fields=['-data_publicacao'], name='noticia_urgentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(condition=models.Q(('urgente', False)), fields=['-data_publicacao'], name='noticia_nao_urgentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['categoria', '-data_publicacao'], name='noticia_categoria_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['-data_publicacao'], name='noticia_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='noticia',
+            index=models.Index(fields=['-curtidas_count'], name='noticia_curtidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', False)), fields=['usuario', '-data_criacao'], name='notificacao_nao_lida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', True)), fields=['usuario', '-data_criacao'], name='notificacao_lida_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0011_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='interacaonoticia',
+            name='interacao_usuario_tipo_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notificacao',
+            name='notificacao_nao_lida_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notificacao',
+            name='notificacao_lida_idx',
+        ),
+        migrations.AddIndex(
+            model_name='interacaonoticia',
+            index=models.Index(fields=['usuario', 'tipo', '-data_interacao', '-id'], name='interacao_usuario_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', False)), fields=['usuario', '-data_criacao', '-id'], name='notificacao_nao_lida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('lida', True)), fields=['usuario', '-data_criacao', '-id'], name='notificacao_lida_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_contador(apps, schema_editor):
+    # Mesmo cálculo de notificacoes.reconciliar_nao_lidas, com os modelos históricos
+    Notificacao = apps.get_model('Echo_app', 'Notificacao')
+    PerfilUsuario = apps.get_model('Echo_app', 'PerfilUsuario')
+    banco = schema_editor.connection.alias
+    contagem = Notificacao.objects.using(banco).filter(usuario=OuterRef('usuario'), lida=False).order_by().values(
+        'usuario'
+    ).annotate(total=Count('id')).values('total')
+    PerfilUsuario.objects.using(banco).update(notificacoes_nao_lidas=Coalesce(Subquery(contagem), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0012_indices_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='notificacoes_nao_lidas',
+            field=models.PositiveIntegerField(default=0, verbose_name='Notificações Não Lidas'),
+        ),
+        migrations.RunPython(preencher_contador, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0013_perfilusuario_notificacoes_nao_lidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noticia',
+            name='imagem_versoes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Versões da Imagem'),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='foto_versoes',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Versões da Foto'),
+        ),
+    ]
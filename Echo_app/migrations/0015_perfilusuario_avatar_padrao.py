@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Echo_app', '0014_versoes_imagens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='avatar_padrao',
+            field=models.CharField(blank=True, default='', max_length=30, verbose_name='Avatar Padrão'),
+        ),
+    ]
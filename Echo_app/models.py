@@ -1,4 +1,4 @@
-from django.db import models  # Importa classes base de modelos do Django
+from django.db import models, transaction  # Importa classes base de modelos do Django
 from django.contrib.auth import get_user_model  # Função para pegar o modelo de usuário configurado
 from django.utils import timezone  # Para lidar com datas e horários
 from django.db.models.signals import post_save  # Sinal executado após salvar um modelo
@@ -18,10 +18,12 @@ class Noticia(models.Model):  # Modelo que representa uma notícia
         null=True,              # Permite valor nulo no banco de dados
         verbose_name="Imagem da Notícia"
     )
+    imagem_versoes = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Versões da Imagem")  # Tamanhos/formatos gerados por imagens.py
     
     fotografo = models.CharField(max_length=255, blank=True, null=True, verbose_name="Fotógrafo")
     conteudo = models.TextField(verbose_name="Conteúdo Completo")
     data_publicacao = models.DateTimeField(default=timezone.now, verbose_name="Data de Publicação")
+    data_atualizacao = models.DateTimeField(auto_now=True, verbose_name="Última Atualização")  # Usado no Last-Modified das páginas em cache
     autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='noticias_criadas', verbose_name="Autor/Editor")
     curtidas_count = models.PositiveIntegerField(default=0, verbose_name="Total de Curtidas")
     salvamentos_count = models.PositiveIntegerField(default=0, verbose_name="Total de Salvamentos")
@@ -67,63 +69,28 @@ class Noticia(models.Model):  # Modelo que representa uma notícia
         # 2. Salva o objeto Noticia no banco de dados
         super().save(*args, **kwargs)
 
-        # 3. Dispara a lógica de notificação
-        if disparar_notificacao and self.categoria:
-            
-            try:
-                # Busca os usuários interessados. Assumindo que PerfilUsuario e Notificacao estão definidos.
-                perfis_interessados = PerfilUsuario.objects.filter(
-                    categorias_de_interesse=self.categoria
-                ).select_related('usuario')
-
-                # Cria as notificações
-                for perfil in perfis_interessados:
-                    if perfil.usuario:
-                        Notificacao.objects.create(
-                            usuario=perfil.usuario,
-                            noticia=self, 
-                            # O texto da manchete pode ser ajustado aqui
-                            manchete=f"🚨 NOVIDADE: {self.titulo[:250]}",
-                            lida=False
-                        )
-            except NameError as e:
-                 # Esta exceção pega a falta dos modelos se eles não estiverem importados
-                 print(f"AVISO: Modelos PerfilUsuario ou Notificacao não encontrados para criar a notificação. Erro: {e}")
-                 pass
+        # 3. Dispara a lógica de notificação (em lote e fora da requisição do editor)
+        if disparar_notificacao and self.categoria_id:
+            from .notificacoes import agendar_envio
+            agendar_envio(self.pk)
 
     class Meta:
         verbose_name = "Notícia"
         verbose_name_plural = "Notícias"
         ordering = ['-data_publicacao']
+        indexes = [
+            # Urgentes / últimas do dashboard. Parciais porque o Django compara booleanos sem "= valor"
+            # (WHERE "urgente" / WHERE NOT "urgente"), o que impede o SQLite de usar um índice composto.
+            models.Index(fields=['-data_publicacao'], name='noticia_urgentes_idx', condition=models.Q(urgente=True)),
+            models.Index(fields=['-data_publicacao'], name='noticia_nao_urgentes_idx', condition=models.Q(urgente=False)),
+            models.Index(fields=['categoria', '-data_publicacao'], name='noticia_categoria_data_idx'),  # Filtro por categoria
+            models.Index(fields=['-data_publicacao'], name='noticia_data_idx'),  # Ordenação padrão
+            models.Index(fields=['-curtidas_count'], name='noticia_curtidas_idx'),  # Mais curtidas (visitantes)
+        ]
 
     def __str__(self):
         return self.titulo
 
-    @staticmethod
-    def recomendar_para(usuario):
-        # ... (Seu método estático inalterado) ...
-        if not usuario.is_authenticated:
-            return Noticia.objects.all()
-
-        try:
-            perfil = usuario.perfil 
-            if perfil.categorias_de_interesse.exists():
-                return Noticia.objects.filter(categoria__in=perfil.categorias_de_interesse.all()).order_by('-data_publicacao')[:10] 
-        except AttributeError: 
-            pass
-        except PerfilUsuario.DoesNotExist: 
-             pass
-
-        try:
-            historico = usuario.historico_interesse.order_by('-pontuacao')
-            if historico.exists():
-                top_categorias = [h.categoria for h in historico[:3]]
-                return Noticia.objects.filter(categoria__in=top_categorias).order_by('-data_publicacao')[:10]
-        except AttributeError: 
-            pass
-
-        return Noticia.objects.all().order_by('-data_publicacao')[:10] # Retorna as 10 mais recentes
-    
 class InteracaoNoticia(models.Model):  # Modelo de interações (curtir/salvar)
 
     TIPO_INTERACAO_CHOICES = [
@@ -140,6 +107,9 @@ class InteracaoNoticia(models.Model):  # Modelo de interações (curtir/salvar)
         verbose_name = "Interação de Notícia"
         verbose_name_plural = "Interações de Notícias"
         unique_together = ('usuario', 'noticia', 'tipo')  # Evita duplicatas
+        indexes = [
+            models.Index(fields=['usuario', 'tipo', '-data_interacao', '-id'], name='interacao_usuario_tipo_idx'),  # Curtidas/salvas (cursor)
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.get_tipo_display()} - {self.noticia.titulo}"  # Texto representativo
@@ -193,8 +163,57 @@ class HistoricoInteresse(models.Model):  # Histórico de interesse do usuário
         return f"{self.usuario.username} gosta de {self.categoria.nome}: {self.pontuacao} pontos"  # Representação
 
 
+class Recomendacao(models.Model):  # Lista de recomendações pré-calculada por usuário (ver recomendacoes.py)
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recomendacoes", verbose_name="Usuário")
+    noticia = models.ForeignKey(Noticia, on_delete=models.CASCADE, related_name="recomendacoes", verbose_name="Notícia")
+    pontuacao = models.FloatField(verbose_name="Pontuação")  # Afinidade com a categoria + recência + popularidade
+    data_geracao = models.DateTimeField(auto_now_add=True, verbose_name="Data de Geração")
+
+    class Meta:
+        verbose_name = "Recomendação"
+        verbose_name_plural = "Recomendações"
+        unique_together = ('usuario', 'noticia')
+        indexes = [
+            models.Index(fields=['usuario', '-pontuacao'], name='recomendacao_usuario_idx'),  # Leitura do dashboard
+        ]
+
+    def __str__(self):
+        return f"{self.noticia_id} para {self.usuario_id} ({self.pontuacao:.2f})"
+
+
+class NoticiaRelacionada(models.Model):  # Vizinhos mais parecidos de cada notícia (TF-IDF, ver relacionadas.py)
+
+    noticia = models.ForeignKey(Noticia, on_delete=models.CASCADE, related_name="vizinhos", verbose_name="Notícia")
+    relacionada = models.ForeignKey(Noticia, on_delete=models.CASCADE, related_name="+", verbose_name="Notícia Relacionada")
+    similaridade = models.FloatField(verbose_name="Similaridade")  # Cosseno entre os vetores TF-IDF (0 a 1)
+    posicao = models.PositiveSmallIntegerField(verbose_name="Posição")  # 0 = mais parecida
+
+    class Meta:
+        verbose_name = "Notícia Relacionada"
+        verbose_name_plural = "Notícias Relacionadas"
+        unique_together = ('noticia', 'relacionada')
+        indexes = [
+            models.Index(fields=['noticia', 'posicao'], name='relacionada_noticia_idx'),  # Leitura da página de detalhe
+        ]
+
+    def __str__(self):
+        return f"{self.noticia_id} ~ {self.relacionada_id} ({self.similaridade:.2f})"
+
+
 # ===================== CLASSES OLIVEIRA =====================
 
+class NotificacaoQuerySet(models.QuerySet):
+    def delete(self):
+        from . import notificacoes  # Evita import circular (notificacoes importa os modelos)
+
+        # Desconta do sino com um COUNT agrupado por usuário em vez de sinais por linha,
+        # que impediriam o DELETE direto (fast delete) nas exclusões em cascata
+        with transaction.atomic(using=self.db):
+            notificacoes.descontar_nao_lidas(self)
+            return super().delete()
+
+
 class Notificacao(models.Model):  # Notificação enviada ao usuário
 
     usuario = models.ForeignKey(
@@ -237,15 +256,32 @@ class Notificacao(models.Model):  # Notificação enviada ao usuário
         verbose_name = "Notificação"
         verbose_name_plural = "Notificações"
         ordering = ['-data_criacao', 'lida']  # Ordena por data e leitura
+        indexes = [
+            # Não lidas (lista e contagem mais acessadas) e lidas, cada uma no seu índice parcial
+            models.Index(fields=['usuario', '-data_criacao', '-id'], name='notificacao_nao_lida_idx', condition=models.Q(lida=False)),
+            models.Index(fields=['usuario', '-data_criacao', '-id'], name='notificacao_lida_idx', condition=models.Q(lida=True)),
+        ]
+
+    objects = NotificacaoQuerySet.as_manager()
 
     def __str__(self):
         status = "[LIDA]" if self.lida else "[NOVA]"  # Status da notificação
         return f"{status} - Para {self.usuario.username}: {self.manchete}"  # Representação textual
 
     def marcar_como_lida(self):
+        from . import notificacoes  # Evita import circular (notificacoes importa os modelos)
+
         if not self.lida:
-            self.lida = True  # Marca como lida
-            self.save()  # Salva alteração
+            # UPDATE condicional + ajuste do contador do sino, na mesma transação
+            notificacoes.marcar_lidas(self.usuario_id, pk=self.pk)
+            self.lida = True
+
+    def delete(self, *args, **kwargs):
+        from . import notificacoes
+
+        with transaction.atomic():
+            notificacoes.descontar_nao_lidas(Notificacao.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
 
 
 # ===================== CLASSE RAUL =====================
@@ -268,6 +304,18 @@ class PerfilUsuario(models.Model):  # Perfil do usuário
         null=True,
         verbose_name="Foto de Perfil"
     )  # Foto do perfil
+    foto_versoes = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Versões da Foto"
+    )  # Miniaturas AVIF/WebP/JPEG geradas por imagens.py
+    avatar_padrao = models.CharField(
+        max_length=30,
+        blank=True,
+        default='',
+        verbose_name="Avatar Padrão"
+    )  # Nome de um dos avatares de static/avatars (referência, sem cópia para media/)
     data_criacao = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Data de Criação"
@@ -279,6 +327,10 @@ class PerfilUsuario(models.Model):  # Perfil do usuário
         related_name="perfis_interessados", # Nome da relação inversa
         verbose_name="Categorias de Interesse"
     )
+    notificacoes_nao_lidas = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Notificações Não Lidas"
+    )  # Contador do sino no cabeçalho (mantido por notificacoes.py, sem COUNT a cada página)
 
     class Meta:
         verbose_name = "Perfil de Usuário"
@@ -292,4 +344,37 @@ class PerfilUsuario(models.Model):  # Perfil do usuário
 @receiver(post_save, sender=User)  # Cria perfil automaticamente ao criar usuário
 def criar_perfil_automaticamente(sender, instance, created, **kwargs):
     if created:
-        PerfilUsuario.objects.create(usuario=instance)  # Cria perfil
\ No newline at end of file
+        PerfilUsuario.objects.create(usuario=instance)  # Cria perfil
+
+# ===================== FILA DE TAREFAS =====================
+
+class Tarefa(models.Model):  # Trabalho em segundo plano executado pelo comando processar_tarefas
+
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('FALHOU', 'Falhou'),
+    ]
+
+    funcao = models.CharField(max_length=200, verbose_name="Função")  # Caminho pontuado da função (ex.: Echo_app.emails.enviar_codigo_otp)
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")  # Kwargs passados para a função
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE', verbose_name="Status")
+    tentativas = models.PositiveIntegerField(default=0, verbose_name="Tentativas")  # Execuções que falharam até agora
+    max_tentativas = models.PositiveIntegerField(default=5, verbose_name="Máximo de Tentativas")
+    executar_apos = models.DateTimeField(default=timezone.now, verbose_name="Executar Após")  # Usado no backoff das novas tentativas
+    data_criacao = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
+    data_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Início da Execução")
+    data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Fim da Execução")
+    erro = models.TextField(blank=True, verbose_name="Último Erro")
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['executar_apos', 'id']
+        indexes = [
+            models.Index(fields=['status', 'executar_apos'], name='tarefa_fila_idx'),  # Busca da próxima tarefa
+        ]
+
+    def __str__(self):
+        return f"[{self.get_status_display()}] {self.funcao} #{self.pk}"
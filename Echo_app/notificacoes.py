@@ -0,0 +1,188 @@
+"""
+Envio em massa (fan-out) das notificações de uma notícia.
+
+Quando o editor marca ``Noticia.notificacao``, o ``save`` só enfileira uma
+tarefa (ver ``tarefas.py``). O worker busca os usuários interessados em lotes
+(paginação por ``usuario_id``) e grava as notificações com ``bulk_create``,
+tudo numa única transação. Se algo falhar no meio, nada fica pela metade e a
+fila tenta de novo.
+
+Cada perfil guarda quantas notificações não lidas tem
+(``PerfilUsuario.notificacoes_nao_lidas``), o número do sino no cabeçalho. Ele
+é ajustado na mesma transação que cria, lê ou apaga notificações: o fan-out
+soma 1 por lote, ``marcar_lidas`` subtrai quantas linhas o UPDATE realmente
+mudou, um sinal cuida de criações avulsas e o ``delete`` de ``Notificacao`` (da
+instância ou do queryset) desconta as não lidas apagadas. Nas cascatas não há o
+que descontar: apagar o usuário leva o perfil junto e apagar a notícia só zera
+``Notificacao.noticia``. ``reconciliar_nao_lidas`` recalcula tudo a partir da
+tabela (comando ``reconciliar_contadores``).
+
+Cada lote também vai para o push em tempo real (``push.publicar``), que
+atualiza o sino de quem está com o site aberto.
+
+Os contadores de progresso e vazão ficam na memória do processo que executa o
+envio e podem ser lidos com ``estatisticas()`` (o ``processar_tarefas`` os
+imprime periodicamente).
+"""
+
+import logging
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.urls import reverse
+
+from . import push
+from .tarefas import tarefa
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 1000  # Usuários por bulk_create
+
+_lock = threading.Lock()
+_estatisticas = {
+    'envios_concluidos': 0,
+    'envios_com_erro': 0,
+    'notificacoes_criadas': 0,
+    'segundos_gastos': 0.0,
+    'em_andamento': {},  # noticia_id -> notificações criadas até agora
+}
+
+
+def manchete_para(noticia):
+    return f"🚨 NOVIDADE: {noticia.titulo[:250]}"
+
+
+def evento_para(noticia_id, manchete, notificacao_id=None):
+    """Evento do push (ver ``push.py``) de uma notificação nova."""
+    url = reverse('Echo_app:noticia_detalhe', args=[noticia_id])
+    if notificacao_id:
+        url += f'?notif_id={notificacao_id}'
+    return {'tipo': 'notificacao', 'noticia_id': noticia_id, 'manchete': manchete, 'url': url}
+
+
+def _registrar_progresso(noticia_id, criadas):
+    with _lock:
+        _estatisticas['em_andamento'][noticia_id] = criadas
+
+
+@tarefa(max_tentativas=3)
+def enviar_para_interessados(noticia_id):
+    """Cria as notificações da notícia para todos os perfis interessados na categoria."""
+    from .models import Noticia, Notificacao, PerfilUsuario
+
+    inicio = time.perf_counter()
+    criadas = 0
+    try:
+        noticia = Noticia.objects.only('id', 'titulo', 'categoria_id').get(pk=noticia_id)
+        if noticia.categoria_id is None:
+            return 0
+        manchete = manchete_para(noticia)
+        evento = evento_para(noticia_id, manchete)
+        interessados = PerfilUsuario.objects.filter(
+            categorias_de_interesse=noticia.categoria_id
+        ).order_by('usuario_id').values_list('usuario_id', flat=True)
+
+        _registrar_progresso(noticia_id, 0)
+        with transaction.atomic():
+            ultimo_id = 0
+            while True:
+                lote = list(interessados.filter(usuario_id__gt=ultimo_id)[:TAMANHO_LOTE])
+                if not lote:
+                    break
+                Notificacao.objects.bulk_create(
+                    [Notificacao(usuario_id=uid, noticia_id=noticia_id, manchete=manchete, lida=False) for uid in lote],
+                    batch_size=TAMANHO_LOTE,
+                )
+                ajustar_nao_lidas(lote, 1)
+                push.publicar(lote, evento)  # Quem estiver com a página aberta vê o sino mudar (após o commit)
+                criadas += len(lote)
+                ultimo_id = lote[-1]
+                _registrar_progresso(noticia_id, criadas)
+    except Exception:
+        with _lock:
+            _estatisticas['envios_com_erro'] += 1
+        logger.exception("Falha no envio das notificações da notícia %s", noticia_id)
+        raise
+    else:
+        with _lock:
+            _estatisticas['envios_concluidos'] += 1
+            _estatisticas['notificacoes_criadas'] += criadas
+            _estatisticas['segundos_gastos'] += time.perf_counter() - inicio
+        logger.info("Notícia %s: %s notificações criadas em %.2fs",
+                    noticia_id, criadas, time.perf_counter() - inicio)
+        return criadas
+    finally:
+        with _lock:
+            _estatisticas['em_andamento'].pop(noticia_id, None)
+
+
+def agendar_envio(noticia_id):
+    """Enfileira o fan-out (a tarefa só aparece para os workers após o commit)."""
+    return enviar_para_interessados.enfileirar(noticia_id=noticia_id)
+
+
+def estatisticas():
+    """Cópia dos contadores de progresso e vazão (notificações por segundo)."""
+    with _lock:
+        dados = dict(_estatisticas, em_andamento=dict(_estatisticas['em_andamento']))
+    segundos = dados['segundos_gastos']
+    dados['notificacoes_por_segundo'] = round(dados['notificacoes_criadas'] / segundos, 1) if segundos else 0.0
+    return dados
+
+
+# ===================== CONTADOR DE NÃO LIDAS =====================
+
+def ajustar_nao_lidas(usuario_ids, delta):
+    """Soma ``delta`` ao contador de não lidas de cada usuário, nunca abaixo de zero."""
+    from .models import PerfilUsuario
+
+    campo = F('notificacoes_nao_lidas')
+    novo_valor = campo + delta if delta >= 0 else Greatest(campo + delta, Value(0))
+    PerfilUsuario.objects.filter(usuario_id__in=usuario_ids).update(notificacoes_nao_lidas=novo_valor)
+
+
+def descontar_nao_lidas(notificacoes):
+    """Desconta do contador as não lidas do queryset ``notificacoes`` (antes de apagá-las), um UPDATE por quantidade."""
+    por_quantidade = {}
+    for usuario_id, total in notificacoes.filter(lida=False).order_by().values('usuario_id').annotate(
+        total=Count('id')
+    ).values_list('usuario_id', 'total'):
+        por_quantidade.setdefault(total, []).append(usuario_id)
+    for total, usuario_ids in por_quantidade.items():
+        ajustar_nao_lidas(usuario_ids, -total)
+
+
+def marcar_lidas(usuario, **filtros):
+    """
+    Marca como lidas as notificações não lidas do usuário (objeto ou id) que
+    casam com ``filtros`` e desconta do contador. Retorna quantas mudaram.
+    """
+    from .models import Notificacao
+
+    usuario_id = getattr(usuario, 'pk', usuario)
+    with transaction.atomic():
+        # Só conta o que este UPDATE mudou: dois cliques simultâneos não descontam duas vezes
+        marcadas = Notificacao.objects.filter(usuario_id=usuario_id, lida=False, **filtros).update(lida=True)
+        if marcadas:
+            ajustar_nao_lidas([usuario_id], -marcadas)
+
+    # O perfil já carregado nesta requisição (BackendComPerfil) mostra o número novo no sino
+    if marcadas and hasattr(usuario, '_meta') and usuario._meta.model.perfil.is_cached(usuario):
+        usuario.perfil.notificacoes_nao_lidas = max(0, usuario.perfil.notificacoes_nao_lidas - marcadas)
+    return marcadas
+
+
+def reconciliar_nao_lidas(usuario_ids=None):
+    """Recalcula o contador a partir das notificações. Retorna o número de perfis atualizados."""
+    from .models import Notificacao, PerfilUsuario
+
+    contagem = Notificacao.objects.filter(usuario=OuterRef('usuario'), lida=False).order_by().values(
+        'usuario'
+    ).annotate(total=Count('id')).values('total')
+    perfis = PerfilUsuario.objects.all()
+    if usuario_ids is not None:
+        perfis = perfis.filter(usuario_id__in=usuario_ids)
+    return perfis.update(notificacoes_nao_lidas=Coalesce(Subquery(contagem), Value(0)))
@@ -0,0 +1,89 @@
+"""
+Paginação por cursor (keyset) para listas ordenadas da mais nova para a mais antiga.
+
+Em vez de ``OFFSET``, cada página pede as linhas "depois" da última que o
+usuário viu, pela chave (campo de data, id). Com um índice que termina em
+(-data, -id) o banco vai direto ao ponto certo, então a página 500 custa o
+mesmo que a primeira, e não há ``COUNT``. Linhas novas que chegam enquanto o
+usuário rola a lista não empurram itens para a página seguinte (sem repetidos).
+
+O cursor é opaco para o cliente: a chave vai assinada com ``django.core.signing``;
+um cursor adulterado ou de outra lista é ignorado e volta para a primeira página.
+"""
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+SAL = 'Echo_app.paginacao'
+
+
+class Pagina:
+    def __init__(self, itens, proximo_cursor=''):
+        self.itens = itens
+        self.proximo_cursor = proximo_cursor  # Vazio quando é a última página
+
+    @property
+    def tem_proxima(self):
+        return bool(self.proximo_cursor)
+
+
+def codificar(lista, data, pk):
+    return signing.dumps([lista, data.isoformat(), pk], salt=SAL, compress=True)
+
+
+def decodificar(lista, cursor):
+    """(data, pk) do cursor, ou None se ele for vazio, inválido ou de outra lista."""
+    if not cursor:
+        return None
+    try:
+        nome, data, pk = signing.loads(cursor, salt=SAL)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    data = parse_datetime(data) if isinstance(data, str) else None
+    if nome != lista or data is None or not isinstance(pk, int):
+        return None
+    return data, pk
+
+
+def consulta(queryset, campo, cursor='', lista=''):
+    """``queryset`` ordenado por (-``campo``, -id), começando logo depois da posição do ``cursor``."""
+    posicao = decodificar(lista, cursor)
+    if posicao is not None:
+        data, pk = posicao
+        # O "<=" na data deixa o banco usar o índice como intervalo; o OR só desempata a fronteira
+        queryset = queryset.filter(Q(**{f'{campo}__lte': data}) & (Q(**{f'{campo}__lt': data}) | Q(pk__lt=pk)))
+    return queryset.order_by(f'-{campo}', '-pk')
+
+
+def paginar(queryset, campo, cursor='', tamanho=10, lista=''):
+    """
+    Uma página de ``queryset`` ordenado por (-``campo``, -id) a partir de ``cursor``.
+    ``lista`` identifica a lista no cursor, para um cursor não servir em outra.
+    """
+    linhas = list(consulta(queryset, campo, cursor, lista)[:tamanho + 1])  # Uma a mais só para saber se há próxima
+    return _montar(linhas, campo, tamanho, lista)
+
+
+async def apaginar(queryset, campo, cursor='', tamanho=10, lista=''):
+    """``paginar`` com o ORM assíncrono (views async)."""
+    linhas = [linha async for linha in consulta(queryset, campo, cursor, lista)[:tamanho + 1]]
+    return _montar(linhas, campo, tamanho, lista)
+
+
+def _montar(linhas, campo, tamanho, lista):
+    pagina = Pagina(linhas[:tamanho])
+    if len(linhas) > tamanho:
+        ultima = pagina.itens[-1]
+        pagina.proximo_cursor = codificar(lista, getattr(ultima, campo), ultima.pk)
+    return pagina
+
+
+def url_proxima(request, pagina, **parametros):
+    """Query string da próxima página, mantendo os filtros atuais (q, categoria...)."""
+    if not pagina.tem_proxima:
+        return ''
+    consulta = request.GET.copy()
+    for nome, valor in {**parametros, 'cursor': pagina.proximo_cursor}.items():
+        consulta[nome] = valor  # QueryDict.update acrescentaria em vez de substituir
+    return '?' + consulta.urlencode()
@@ -0,0 +1,387 @@
+"""
+Medição por requisição: para onde vai o tempo de cada view.
+
+O ``MedicaoMiddleware`` (primeiro do MIDDLEWARE) abre uma ``Medicao`` por
+requisição, guardada num ContextVar (funciona em views síncronas, assíncronas e
+dentro de ``sync_to_async``). Quem faz o trabalho vai somando nela:
+
+- consultas e tempo de banco: ``execute_wrapper`` instalado em toda conexão nova
+  (sinal ``connection_created``, ligado em ``apps.py``);
+- tempo de template: o backend ``TemplatesMedidos`` (settings.TEMPLATES);
+- acertos/falhas de cache: ``cache_segmentos.registrar`` (segmentos e páginas);
+- chamadas externas: ``with perfilamento.externa('smtp'):`` em volta da chamada.
+
+No fim da requisição os números entram nos histogramas da rota (nome da URL),
+em memória, por processo. A equipe vê o resumo em JSON em
+``/desempenho/status/`` e o Prometheus lê ``/desempenho/metricas/``.
+
+Com ``ECHO_PERFIL_AMOSTRA = N`` uma em cada N requisições roda sob o cProfile
+(ou pyinstrument, se instalado e escolhido) e, se passar de
+``ECHO_PERFIL_LENTA_MS``, o perfil é salvo em ``ECHO_PERFIL_DIR`` para abrir com
+``python -m pstats`` / snakeviz. Em views assíncronas o cProfile vê a thread do
+event loop inteira; prefira o pyinstrument nelas.
+"""
+
+import bisect
+import contextvars
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+
+try:
+    import pyinstrument
+except ImportError:  # Opcional: sem ele a amostragem usa o cProfile
+    pyinstrument = None
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+
+_atual = contextvars.ContextVar('echo_medicao', default=None)
+_lock = threading.Lock()
+_rotas = {}
+
+
+# ===================== MEDIÇÃO DA REQUISIÇÃO =====================
+
+class Medicao:
+    """Números de uma requisição, somados por quem faz o trabalho."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.banco = 0.0  # Segundos
+        self.templates = 0.0
+        self.cache_acertos = 0
+        self.cache_falhas = 0
+        self.externas = defaultdict(lambda: [0, 0.0])  # serviço -> [chamadas, segundos]
+        self.rota = None  # Nome da URL, assim que resolvida (process_view)
+
+
+def medicao_atual():
+    """A ``Medicao`` da requisição em andamento (None fora de uma requisição, ex.: no worker)."""
+    return _atual.get()
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicao = _atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.consultas += 1
+        medicao.banco += time.perf_counter() - inicio
+
+
+def instalar_na_conexao(sender, connection, **kwargs):
+    """Receiver de ``connection_created``: a conexão passa a contar consultas para a requisição atual."""
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+def contar_cache(acertou):
+    medicao = _atual.get()
+    if medicao is not None:
+        if acertou:
+            medicao.cache_acertos += 1
+        else:
+            medicao.cache_falhas += 1
+
+
+@contextmanager
+def externa(servico):
+    """Conta o tempo de uma chamada a serviço externo: ``with externa('smtp'): send_mail(...)``."""
+    medicao = _atual.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if medicao is not None:
+            dados = medicao.externas[servico]
+            dados[0] += 1
+            dados[1] += time.perf_counter() - inicio
+
+
+class _TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicao = _atual.get()
+        if medicao is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            # Só o template de fora é medido: os {% include %} rodam dentro deste render
+            medicao.templates += time.perf_counter() - inicio
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """O backend de templates do Django, somando o tempo de render na medição da requisição."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name).template, self)
+
+
+# ===================== HISTOGRAMAS POR ROTA =====================
+
+class Histograma:
+    """Contagens por faixa (``valor <= limite``), no formato do Prometheus."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # A última é o +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def acumulado(self):
+        """Pares (limite, contagem acumulada), terminando em ('+Inf', total)."""
+        soma = 0
+        for limite, contagem in zip(list(self.limites) + ['+Inf'], self.contagens):
+            soma += contagem
+            yield limite, soma
+
+
+class EstatisticasRota:
+    def __init__(self):
+        self.duracao = Histograma(LIMITES_SEGUNDOS)
+        self.banco = Histograma(LIMITES_SEGUNDOS)
+        self.templates = Histograma(LIMITES_SEGUNDOS)
+        self.consultas = Histograma(LIMITES_CONSULTAS)
+        self.recentes = deque(maxlen=settings.ECHO_PERFIL_JANELA)  # Durações para os percentis "de agora"
+        self.status = Counter()  # '2xx', '3xx', ...
+        self.cache = Counter()
+        self.externas = defaultdict(lambda: [0, 0.0])
+
+    def registrar(self, duracao, status, medicao):
+        self.duracao.observar(duracao)
+        self.banco.observar(medicao.banco)
+        self.templates.observar(medicao.templates)
+        self.consultas.observar(medicao.consultas)
+        self.recentes.append(duracao)
+        self.status[f'{status // 100}xx'] += 1
+        self.cache['acertos'] += medicao.cache_acertos
+        self.cache['falhas'] += medicao.cache_falhas
+        for servico, (chamadas, segundos) in medicao.externas.items():
+            self.externas[servico][0] += chamadas
+            self.externas[servico][1] += segundos
+
+
+def _rota(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'sem_rota'  # 404 antes de achar a URL, redirecionamentos do CommonMiddleware
+    return resolver_match.view_name
+
+
+def registrar(rota, duracao, status, medicao):
+    with _lock:
+        estatisticas = _rotas.get(rota)
+        if estatisticas is None:
+            estatisticas = _rotas[rota] = EstatisticasRota()
+        estatisticas.registrar(duracao, status, medicao)
+
+
+def limpar():
+    with _lock:
+        _rotas.clear()
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return round(valores[min(len(valores) - 1, int(len(valores) * p))] * 1000, 1)
+
+
+def resumo():
+    """Por rota: requisições, percentis recentes (ms) e médias de banco, template, cache e externas."""
+    with _lock:
+        copia = {rota: (e.duracao.total, list(e.recentes), e.banco.soma, e.templates.soma, e.consultas.soma,
+                        dict(e.status), dict(e.cache), {s: list(v) for s, v in e.externas.items()})
+                 for rota, e in _rotas.items()}
+    resultado = {}
+    for rota, (total, recentes, banco, templates, consultas, status, cache_, externas) in sorted(copia.items()):
+        resultado[rota] = {
+            'requisicoes': total,
+            'status': status,
+            'duracao_p50_ms': _percentil(recentes, 0.5),
+            'duracao_p95_ms': _percentil(recentes, 0.95),
+            'duracao_p99_ms': _percentil(recentes, 0.99),
+            'consultas_media': round(consultas / total, 1),
+            'banco_medio_ms': round(banco / total * 1000, 1),
+            'templates_medio_ms': round(templates / total * 1000, 1),
+            'cache': cache_,
+            'externas': {s: {'chamadas': n, 'segundos': round(seg, 3)} for s, (n, seg) in externas.items()},
+        }
+    return resultado
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(**rotulos):
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items()) + '}'
+
+
+def prometheus():
+    """Exposição em texto do Prometheus (versão 0.0.4) dos números deste processo."""
+    histogramas = (
+        ('echo_requisicao_segundos', 'duracao', "Duração das requisições por rota."),
+        ('echo_requisicao_banco_segundos', 'banco', "Tempo de banco por requisição."),
+        ('echo_requisicao_template_segundos', 'templates', "Tempo de render de templates por requisição."),
+        ('echo_requisicao_consultas', 'consultas', "Consultas SQL por requisição."),
+    )
+    linhas = []
+    with _lock:
+        rotas = sorted(_rotas.items())
+        for metrica, atributo, ajuda in histogramas:
+            linhas += [f'# HELP {metrica} {ajuda}', f'# TYPE {metrica} histogram']
+            for rota, estatisticas in rotas:
+                histograma = getattr(estatisticas, atributo)
+                for limite, contagem in histograma.acumulado():
+                    linhas.append(f'{metrica}_bucket{_rotulos(rota=rota, le=limite)} {contagem}')
+                linhas.append(f'{metrica}_sum{_rotulos(rota=rota)} {histograma.soma:.6f}')
+                linhas.append(f'{metrica}_count{_rotulos(rota=rota)} {histograma.total}')
+
+        linhas += ['# HELP echo_respostas_total Respostas por rota e classe de status.', '# TYPE echo_respostas_total counter']
+        for rota, estatisticas in rotas:
+            for status, total in sorted(estatisticas.status.items()):
+                linhas.append(f'echo_respostas_total{_rotulos(rota=rota, status=status)} {total}')
+
+        linhas += ['# HELP echo_cache_total Leituras de cache (segmentos e páginas) por rota.', '# TYPE echo_cache_total counter']
+        for rota, estatisticas in rotas:
+            for resultado in ('acertos', 'falhas'):
+                linhas.append(f'echo_cache_total{_rotulos(rota=rota, resultado=resultado)} {estatisticas.cache[resultado]}')
+
+        linhas += ['# HELP echo_externas_total Chamadas a serviços externos por rota.', '# TYPE echo_externas_total counter',
+                   '# HELP echo_externas_segundos_total Tempo em serviços externos por rota.',
+                   '# TYPE echo_externas_segundos_total counter']
+        for rota, estatisticas in rotas:
+            for servico, (chamadas, segundos) in sorted(estatisticas.externas.items()):
+                linhas.append(f'echo_externas_total{_rotulos(rota=rota, servico=servico)} {chamadas}')
+                linhas.append(f'echo_externas_segundos_total{_rotulos(rota=rota, servico=servico)} {segundos:.6f}')
+    return '\n'.join(linhas) + '\n'
+
+
+# ===================== AMOSTRAGEM DE PERFIS =====================
+
+class _Amostra:
+    """Perfil de uma requisição sorteada; só vai para o disco se ela for lenta."""
+
+    def __init__(self):
+        self.pyinstrument = settings.ECHO_PERFIL_FERRAMENTA == 'pyinstrument' and pyinstrument is not None
+        self.profiler = pyinstrument.Profiler(async_mode='enabled') if self.pyinstrument else cProfile.Profile()
+
+    @classmethod
+    def sortear(cls):
+        if settings.ECHO_PERFIL_AMOSTRA <= 0 or random.randrange(settings.ECHO_PERFIL_AMOSTRA):
+            return None
+        amostra = cls()
+        try:
+            amostra.iniciar()
+        except (RuntimeError, ValueError):  # Já existe um profiler ativo (Python 3.12+ aceita um só)
+            return None
+        return amostra
+
+    def iniciar(self):
+        if self.pyinstrument:
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def parar(self):
+        if self.pyinstrument:
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def salvar(self, rota, duracao):
+        if duracao * 1000 < settings.ECHO_PERFIL_LENTA_MS:
+            return None
+        os.makedirs(settings.ECHO_PERFIL_DIR, exist_ok=True)
+        rota = re.sub(r'[^\w.-]', '_', rota)
+        nome = f"{timezone.now():%Y%m%d-%H%M%S}-{rota}-{duracao * 1000:.0f}ms"
+        caminho = os.path.join(settings.ECHO_PERFIL_DIR, nome + ('.html' if self.pyinstrument else '.prof'))
+        if self.pyinstrument:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(caminho)
+        return caminho
+
+
+# ===================== MIDDLEWARE =====================
+
+class MedicaoMiddleware:
+    """Mede cada requisição e registra nos histogramas da rota (ver docstring do módulo)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        medicao, token, amostra, inicio = self._comecar()
+        try:
+            response = self.get_response(request)
+        finally:
+            duracao = self._terminar(token, amostra, inicio)
+        self._registrar(request, response, medicao, amostra, duracao)
+        return response
+
+    async def __acall__(self, request):
+        medicao, token, amostra, inicio = self._comecar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duracao = self._terminar(token, amostra, inicio)
+        self._registrar(request, response, medicao, amostra, duracao)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicao = _atual.get()
+        if medicao is not None:
+            medicao.rota = _rota(request)  # Para quem registra durante a view (ex.: consultas_lentas)
+
+    def _comecar(self):
+        medicao = Medicao()
+        token = _atual.set(medicao)
+        return medicao, token, _Amostra.sortear(), time.perf_counter()
+
+    def _terminar(self, token, amostra, inicio):
+        duracao = time.perf_counter() - inicio
+        if amostra is not None:
+            amostra.parar()
+        _atual.reset(token)
+        return duracao
+
+    def _registrar(self, request, response, medicao, amostra, duracao):
+        rota = _rota(request)
+        registrar(rota, duracao, response.status_code, medicao)
+        if amostra is not None:
+            amostra.salvar(rota, duracao)
@@ -0,0 +1,212 @@
+"""
+Push em tempo real das notificações (Server-Sent Events no app ASGI).
+
+O navegador logado abre um ``EventSource`` em ``/notificacoes/eventos/`` e a
+conexão fica aberta. Do lado do servidor cada conexão é só uma corrotina
+esperando numa ``asyncio.Queue``: milhares de conexões ociosas custam poucos KB
+cada, sem thread por cliente e sem polling. A cada ``INTERVALO_PING`` segundos
+vai um comentário SSE para proxies não derrubarem a conexão parada.
+
+Quem cria notificações chama ``publicar(usuario_ids, evento)``; a entrega só
+acontece depois do commit. O transporte é escolhido por ``ECHO_PUSH_BACKEND``:
+
+- ``'memoria'`` (padrão): pub/sub dentro do processo. Basta quando o envio
+  roda no mesmo processo do servidor ASGI (desenvolvimento).
+- ``'postgres'``: ``pg_notify`` no canal ``CANAL``. Cada processo do servidor
+  mantém uma conexão dedicada em ``LISTEN`` (numa thread) e repassa o que chega
+  para o pub/sub em memória local, então o worker ``processar_tarefas`` e
+  vários processos do servidor conversam pelo próprio banco, sem Redis.
+
+Só faz sentido servido por ASGI (``gunicorn -k uvicorn.workers.UvicornWorker
+Echoproject.asgi:application``): no WSGI cada conexão aberta prenderia um worker.
+Por isso o ``base.html`` só abre a conexão com ``ECHO_PUSH_SSE`` (ligado pelo
+``asgi.py``) e a view responde 204 a requisições que chegam pelo WSGI.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'echo_notificacoes'
+INTERVALO_PING = 25  # Segundos
+RECONEXAO_MS = 5000  # Espera sugerida ao navegador antes de reconectar
+TAMANHO_FILA = 50  # Eventos guardados por conexão lenta antes de descartar os mais antigos
+IDS_POR_NOTIFY = 500  # O payload do pg_notify é limitado a 8000 bytes
+
+
+# ===================== PUB/SUB EM MEMÓRIA =====================
+
+def _colocar(fila, evento):
+    if fila.full():
+        fila.get_nowait()  # Cliente lento: perde o evento mais antigo (a lista completa continua no banco)
+    fila.put_nowait(evento)
+
+
+class Central:
+    """Conexões abertas por usuário; cada uma com sua fila e o event loop em que ela vive."""
+
+    def __init__(self):
+        self._assinantes = defaultdict(set)  # usuario_id -> {(loop, fila)}
+        self._lock = threading.Lock()
+
+    def assinar(self, usuario_id):
+        assinatura = (asyncio.get_running_loop(), asyncio.Queue(maxsize=TAMANHO_FILA))
+        with self._lock:
+            self._assinantes[usuario_id].add(assinatura)
+        return assinatura
+
+    def cancelar(self, usuario_id, assinatura):
+        with self._lock:
+            conexoes = self._assinantes.get(usuario_id)
+            if conexoes is not None:
+                conexoes.discard(assinatura)
+                if not conexoes:
+                    del self._assinantes[usuario_id]
+
+    def entregar(self, usuario_ids, evento):
+        """Entrega o evento às conexões dos usuários (pode ser chamado de qualquer thread)."""
+        with self._lock:
+            alvos = [assinatura for uid in usuario_ids for assinatura in self._assinantes.get(uid, ())]
+        for loop, fila in alvos:
+            try:
+                loop.call_soon_threadsafe(_colocar, fila, evento)
+            except RuntimeError:  # Loop já encerrado; a conexão será cancelada pelo próprio fluxo
+                pass
+        return len(alvos)
+
+    def conexoes(self):
+        with self._lock:
+            return sum(len(conexoes) for conexoes in self._assinantes.values())
+
+
+central = Central()
+
+
+# ===================== TRANSPORTES =====================
+
+class BackendMemoria:
+    def iniciar(self):
+        pass
+
+    def publicar(self, usuario_ids, evento):
+        central.entregar(usuario_ids, evento)
+
+
+class BackendPostgres:
+    """NOTIFY para publicar; uma thread por processo em LISTEN repassa para a ``central``."""
+
+    def __init__(self):
+        self._ouvinte = None
+        self._lock = threading.Lock()
+
+    def publicar(self, usuario_ids, evento):
+        with connection.cursor() as cursor:
+            for inicio in range(0, len(usuario_ids), IDS_POR_NOTIFY):
+                payload = json.dumps({'u': usuario_ids[inicio:inicio + IDS_POR_NOTIFY], 'e': evento})
+                cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, payload])
+
+    def iniciar(self):
+        if self._ouvinte is not None:
+            return
+        with self._lock:
+            if self._ouvinte is None:
+                self._ouvinte = threading.Thread(target=self._escutar, name='echo-push', daemon=True)
+                self._ouvinte.start()
+
+    def _conectar(self):
+        """Conexão própria em autocommit, só para o LISTEN."""
+        # Direto pelo driver: get_new_connection() pegaria uma conexão do pool
+        # (ECHO_DB_CONEXOES='pool') e a seguraria para sempre, uma a mais a cada reconexão
+        banco = connections['default']
+        conexao = banco.Database.connect(**banco.get_connection_params())
+        conexao.autocommit = True
+        conexao.cursor().execute(f'LISTEN {CANAL}')
+        return conexao
+
+    def _escutar(self):
+        import select
+
+        while True:
+            conexao = None
+            try:
+                conexao = self._conectar()
+                logger.info("Push: escutando o canal %s", CANAL)
+                while True:
+                    if hasattr(conexao, 'poll'):  # psycopg2
+                        if select.select([conexao], [], [], INTERVALO_PING) == ([], [], []):
+                            continue
+                        conexao.poll()
+                        avisos = list(conexao.notifies)
+                        conexao.notifies.clear()
+                    else:  # psycopg 3
+                        avisos = list(conexao.notifies(timeout=INTERVALO_PING))
+                    for aviso in avisos:
+                        dados = json.loads(aviso.payload)
+                        central.entregar(dados['u'], dados['e'])
+            except Exception:
+                logger.exception("Push: conexão de LISTEN caiu; tentando de novo em 5s")
+                if conexao is not None:
+                    try:
+                        conexao.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+
+_BACKENDS = {'memoria': BackendMemoria, 'postgres': BackendPostgres}
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = _BACKENDS[getattr(settings, 'ECHO_PUSH_BACKEND', 'memoria')]()
+    return _backend
+
+
+# ===================== API =====================
+
+def publicar(usuario_ids, evento):
+    """Envia ``evento`` (dict serializável em JSON) aos usuários conectados, após o commit."""
+    usuario_ids = list(usuario_ids)
+    if not usuario_ids:
+        return
+
+    def enviar():
+        try:
+            backend().publicar(usuario_ids, evento)
+        except Exception:  # O push é um bônus: a notificação já está gravada no banco
+            logger.exception("Falha ao publicar evento para %s usuários", len(usuario_ids))
+
+    transaction.on_commit(enviar)
+
+
+def formatar(evento):
+    """Mensagem SSE: o ``tipo`` do evento vira o ``event:`` e o resto vai em JSON no ``data:``."""
+    return f"event: {evento.get('tipo', 'message')}\ndata: {json.dumps(evento)}\n\n"
+
+
+async def fluxo(usuario_id):
+    """Gerador assíncrono da resposta SSE de um usuário; termina quando o cliente desconecta."""
+    backend().iniciar()
+    assinatura = central.assinar(usuario_id)
+    fila = assinatura[1]
+    try:
+        yield f"retry: {RECONEXAO_MS}\n\n"
+        while True:
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=INTERVALO_PING)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield formatar(evento)
+    finally:
+        central.cancelar(usuario_id, assinatura)
@@ -0,0 +1,242 @@
+"""
+Recomendações de notícias pré-calculadas por usuário.
+
+A afinidade do usuário com cada categoria fica em ``HistoricoInteresse.pontuacao``
+e aprende com as interações: cada curtida soma ``PESOS['CURTIDA']`` e cada
+salvamento ``PESOS['SALVAMENTO']`` (desfazer subtrai). As categorias marcadas
+no perfil valem ``PESO_INTERESSE_DECLARADO`` pontos extras.
+
+A lista ranqueada de cada usuário fica na tabela ``Recomendacao`` e o dashboard
+só lê as primeiras linhas pelo índice (usuario, -pontuacao). A pontuação não
+depende da hora em que foi calculada (a recência entra como
+``data_publicacao / ESCALA_TEMPO``), então linhas calculadas em momentos
+diferentes continuam comparáveis. Isso permite:
+
+- ``recalcular(usuario_id)``: refaz a lista de um usuário; é enfileirada quando
+  ele interage com uma notícia ou muda seus interesses;
+- ``incluir_noticia(noticia_id)``: quando uma notícia é publicada, insere só ela
+  na lista de quem tem afinidade com a categoria, sem recalcular nada.
+
+O comando ``recalcular_recomendacoes`` refaz todas as listas (e apara as que
+cresceram com ``incluir_noticia``).
+"""
+
+import math
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from . import cache_segmentos
+from .tarefas import tarefa
+
+PESOS = {'CURTIDA': 1, 'SALVAMENTO': 2}  # Pontos de afinidade por interação
+PESO_INTERESSE_DECLARADO = 5  # Categorias marcadas em "Configurações"
+
+PESO_AFINIDADE = 2.0
+PESO_POPULARIDADE = 0.5
+ESCALA_TEMPO = 12 * 3600  # Uma notícia 12h mais nova ganha 1 ponto
+
+CATEGORIAS_CANDIDATAS = 5  # Categorias de maior afinidade consideradas no recálculo
+NOTICIAS_CANDIDATAS = 200
+TAMANHO_LISTA = 30  # Linhas guardadas por usuário
+TAMANHO_LOTE = 1000
+
+
+def pontuar(afinidade, data_publicacao, curtidas=0, salvamentos=0):
+    return (
+        PESO_AFINIDADE * math.log1p(max(afinidade, 0))
+        + PESO_POPULARIDADE * math.log1p(curtidas + 2 * salvamentos)
+        + data_publicacao.timestamp() / ESCALA_TEMPO
+    )
+
+
+def afinidades(usuario_id):
+    """Pontos de afinidade do usuário por categoria (histórico + interesses declarados)."""
+    from .models import HistoricoInteresse, PerfilUsuario
+
+    pontos = dict(
+        HistoricoInteresse.objects.filter(usuario_id=usuario_id, pontuacao__gt=0).values_list('categoria_id', 'pontuacao')
+    )
+    declaradas = PerfilUsuario.categorias_de_interesse.through.objects.filter(
+        perfilusuario__usuario_id=usuario_id
+    ).values_list('categoria_id', flat=True)
+    for categoria_id in declaradas:
+        pontos[categoria_id] = pontos.get(categoria_id, 0) + PESO_INTERESSE_DECLARADO
+    return pontos
+
+
+# ===================== APRENDIZADO =====================
+
+def registrar_interacao(usuario_id, noticia_id, tipo, sinal=1):
+    """Ajusta a afinidade do usuário com a categoria da notícia (``sinal`` = 1 ao criar, -1 ao desfazer)."""
+    from .models import HistoricoInteresse, Noticia
+
+    categoria_id = Noticia.objects.filter(pk=noticia_id).values_list('categoria_id', flat=True).first()
+    if categoria_id is None:
+        return
+    delta = PESOS.get(tipo, 0) * sinal
+    historico = HistoricoInteresse.objects.filter(usuario_id=usuario_id, categoria_id=categoria_id)
+    if delta >= 0:
+        atualizados = historico.update(pontuacao=F('pontuacao') + delta)
+        if not atualizados:
+            try:
+                with transaction.atomic():
+                    HistoricoInteresse.objects.create(usuario_id=usuario_id, categoria_id=categoria_id, pontuacao=delta)
+            except IntegrityError:  # Outra requisição criou a linha ao mesmo tempo
+                historico.update(pontuacao=F('pontuacao') + delta)
+    else:
+        historico.update(pontuacao=Greatest(F('pontuacao') + delta, Value(0)))
+    agendar_recalculo(usuario_id)
+
+
+def esquecer_noticia(noticia_id, categoria_id):
+    """
+    Antes de apagar uma notícia: tira de cada usuário os pontos das interações
+    com ela (um UPDATE por valor descontado) e agenda um ``recalcular`` por
+    usuário, em vez de um sinal por interação apagada em cascata.
+    """
+    from .models import HistoricoInteresse, InteracaoNoticia
+
+    if categoria_id is None:
+        return 0
+    pontos = {}
+    for usuario_id, tipo, total in InteracaoNoticia.objects.filter(noticia_id=noticia_id).values_list(
+        'usuario_id', 'tipo'
+    ).order_by().annotate(total=Count('id')):
+        pontos[usuario_id] = pontos.get(usuario_id, 0) + PESOS.get(tipo, 0) * total
+
+    por_valor = {}
+    for usuario_id, delta in pontos.items():
+        por_valor.setdefault(delta, []).append(usuario_id)
+    for delta, usuario_ids in por_valor.items():
+        HistoricoInteresse.objects.filter(usuario_id__in=usuario_ids, categoria_id=categoria_id).update(
+            pontuacao=Greatest(F('pontuacao') - delta, Value(0))
+        )
+    recalcular.enfileirar_varias([{'usuario_id': usuario_id} for usuario_id in pontos])
+    return len(pontos)
+
+
+def reaprender():
+    """Reconstrói ``HistoricoInteresse`` a partir de todas as interações. Retorna o número de linhas."""
+    from .models import HistoricoInteresse, InteracaoNoticia
+
+    pontos = {}
+    interacoes = InteracaoNoticia.objects.filter(noticia__categoria__isnull=False).values_list(
+        'usuario_id', 'noticia__categoria_id', 'tipo'
+    ).order_by().annotate(total=Count('id'))
+    for usuario_id, categoria_id, tipo, total in interacoes.iterator(chunk_size=TAMANHO_LOTE):
+        chave = (usuario_id, categoria_id)
+        pontos[chave] = pontos.get(chave, 0) + PESOS.get(tipo, 0) * total
+
+    with transaction.atomic():
+        HistoricoInteresse.objects.all().delete()
+        HistoricoInteresse.objects.bulk_create(
+            [HistoricoInteresse(usuario_id=u, categoria_id=c, pontuacao=p) for (u, c), p in pontos.items()],
+            batch_size=TAMANHO_LOTE,
+        )
+    return len(pontos)
+
+
+def agendar_recalculo(usuario_id):
+    """Enfileira ``recalcular`` para o usuário, a não ser que já haja um pendente."""
+    recalcular.enfileirar_unica(usuario_id=usuario_id)
+
+
+# ===================== LISTAS PRÉ-CALCULADAS =====================
+
+@tarefa(max_tentativas=3)
+def recalcular(usuario_id):
+    """Refaz a lista de recomendações do usuário. Retorna o número de linhas gravadas."""
+    from .models import InteracaoNoticia, Noticia, Recomendacao
+
+    pontos = afinidades(usuario_id)
+    linhas = []
+    if pontos:
+        principais = sorted(pontos, key=pontos.get, reverse=True)[:CATEGORIAS_CANDIDATAS]
+        ja_vistas = InteracaoNoticia.objects.filter(usuario_id=usuario_id).values('noticia_id')
+        candidatas = Noticia.objects.filter(categoria_id__in=principais).exclude(pk__in=ja_vistas).order_by(
+            '-data_publicacao'
+        ).values_list('id', 'categoria_id', 'data_publicacao', 'curtidas_count', 'salvamentos_count')[:NOTICIAS_CANDIDATAS]
+        ranqueadas = sorted(
+            ((pontuar(pontos[categoria_id], data, curtidas, salvamentos), noticia_id)
+             for noticia_id, categoria_id, data, curtidas, salvamentos in candidatas),
+            reverse=True,
+        )[:TAMANHO_LISTA]
+        linhas = [Recomendacao(usuario_id=usuario_id, noticia_id=noticia_id, pontuacao=pontuacao)
+                  for pontuacao, noticia_id in ranqueadas]
+
+    with transaction.atomic():
+        Recomendacao.objects.filter(usuario_id=usuario_id).delete()
+        Recomendacao.objects.bulk_create(linhas)
+    cache_segmentos.invalidar(f'recomendacoes:{usuario_id}')
+    return len(linhas)
+
+
+@tarefa(max_tentativas=3)
+def incluir_noticia(noticia_id):
+    """Insere uma notícia recém-publicada na lista de quem tem afinidade com a categoria dela."""
+    from .models import HistoricoInteresse, Noticia, PerfilUsuario, Recomendacao
+
+    noticia = Noticia.objects.filter(pk=noticia_id).values(
+        'categoria_id', 'data_publicacao', 'curtidas_count', 'salvamentos_count'
+    ).first()
+    if noticia is None or noticia['categoria_id'] is None:
+        return 0
+
+    pontos = dict(
+        HistoricoInteresse.objects.filter(categoria_id=noticia['categoria_id'], pontuacao__gt=0).values_list(
+            'usuario_id', 'pontuacao'
+        ).iterator(chunk_size=TAMANHO_LOTE)
+    )
+    declarados = PerfilUsuario.objects.filter(categorias_de_interesse=noticia['categoria_id']).values_list(
+        'usuario_id', flat=True
+    ).iterator(chunk_size=TAMANHO_LOTE)
+    for usuario_id in declarados:
+        pontos[usuario_id] = pontos.get(usuario_id, 0) + PESO_INTERESSE_DECLARADO
+
+    linhas = [
+        Recomendacao(usuario_id=usuario_id, noticia_id=noticia_id, pontuacao=pontuar(
+            afinidade, noticia['data_publicacao'], noticia['curtidas_count'], noticia['salvamentos_count']
+        ))
+        for usuario_id, afinidade in pontos.items()
+    ]
+    Recomendacao.objects.bulk_create(linhas, batch_size=TAMANHO_LOTE, ignore_conflicts=True)
+    cache_segmentos.invalidar('recomendacoes')
+    return len(linhas)
+
+
+def recalcular_todos():
+    """Recalcula a lista de todo usuário com alguma afinidade. Retorna o número de usuários."""
+    from .models import HistoricoInteresse, PerfilUsuario, Recomendacao
+
+    usuarios = set(HistoricoInteresse.objects.filter(pontuacao__gt=0).values_list('usuario_id', flat=True))
+    usuarios.update(PerfilUsuario.objects.filter(categorias_de_interesse__isnull=False).values_list('usuario_id', flat=True))
+    for usuario_id in sorted(usuarios):
+        recalcular(usuario_id)
+    # Quem perdeu toda a afinidade não precisa mais de lista
+    orfaos = sorted(set(Recomendacao.objects.values_list('usuario_id', flat=True).distinct()) - usuarios)
+    for inicio in range(0, len(orfaos), TAMANHO_LOTE):
+        Recomendacao.objects.filter(usuario_id__in=orfaos[inicio:inicio + TAMANHO_LOTE]).delete()
+    return len(usuarios)
+
+
+def para(usuario, limite=3):
+    """Notícias recomendadas ao usuário, numa única consulta pelo índice da tabela."""
+    from .models import Recomendacao
+
+    linhas = Recomendacao.objects.filter(usuario=usuario).select_related('noticia__categoria').order_by('-pontuacao')
+    return [linha.noticia for linha in linhas[:limite]]
+
+
+async def apara(usuario, limite=3):
+    """``para`` com o ORM assíncrono (views async)."""
+    from .models import Recomendacao
+
+    linhas = Recomendacao.objects.filter(usuario=usuario).select_related('noticia__categoria').order_by('-pontuacao')
+    return [linha.noticia async for linha in linhas[:limite]]
+
+
+def dependencias(usuario_id):
+    """Gerações de cache que invalidam as recomendações do usuário."""
+    return ['recomendacoes', f'recomendacoes:{usuario_id}']
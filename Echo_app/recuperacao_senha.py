@@ -0,0 +1,123 @@
+"""
+Estado da recuperação de senha (OTP) fora da sessão.
+
+O usuário, o código e a marca de "verificado" ficam no cache
+``compartilhado`` (ver settings) sob um token aleatório e somem sozinhos
+``ECHO_OTP_VALIDADE`` segundos depois do envio do código (verificar não
+estende o prazo). O navegador guarda só o token, num cookie assinado com a
+mesma validade. Assim quem esqueceu a senha, um anônimo, não cria linha na
+tabela de sessões, e ``ECHO_OTP_TENTATIVAS`` códigos errados encerram o
+processo (é preciso pedir outro código).
+
+Cada palpite precisa antes ganhar uma "vaga" (``otp:<token>:<n>``, n de 1 a
+``ECHO_OTP_TENTATIVAS``) com ``cache.add``, que só dá certo para um processo
+por chave. Assim POSTs paralelos com o mesmo cookie não passam do limite: ler,
+somar e gravar um contador deixaria todos verem "ainda há tentativas". O
+``add`` é atômico no 'banco' (chave primária), na 'memoria' e no
+memcached/redis; o 'arquivo' não garante isso.
+"""
+
+import math
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signing import BadSignature
+from django.utils.crypto import constant_time_compare
+
+COOKIE = 'echo_otp'
+_SAL = 'Echo_app.recuperacao_senha'
+
+
+def _cache():
+    return caches['compartilhado']
+
+
+def _chave(token):
+    return f'otp:{token}'
+
+
+class Recuperacao:
+    """Uma recuperação em andamento (uma por navegador)."""
+
+    def __init__(self, token, usuario_id, codigo, expira, verificado=False):
+        self.token = token
+        self.usuario_id = usuario_id
+        self.codigo = codigo
+        self.expira = expira  # time.time() do fim da validade
+        self.verificado = verificado
+        self.tentativas = 0  # Palpites já gastos, conhecido depois de verificar()
+
+    def restante(self):
+        return math.ceil(self.expira - time.time())
+
+    def salvar(self):
+        if self.restante() > 0:
+            _cache().set(_chave(self.token), {
+                'usuario_id': self.usuario_id, 'codigo': self.codigo, 'expira': self.expira,
+                'verificado': self.verificado,
+            }, self.restante())
+
+    def _reservar_tentativa(self):
+        """Número do palpite que esta requisição ganhou, ou None se todas as vagas já foram usadas."""
+        for numero in range(1, settings.ECHO_OTP_TENTATIVAS + 1):
+            if _cache().add(f'{_chave(self.token)}:{numero}', 1, max(self.restante(), 1)):
+                return numero
+        return None
+
+    def esgotada(self):
+        return self.tentativas >= settings.ECHO_OTP_TENTATIVAS
+
+
+def iniciar(response, usuario_id, codigo):
+    """Guarda uma recuperação nova e grava o cookie com o token em ``response``."""
+    recuperacao = Recuperacao(secrets.token_urlsafe(32), usuario_id, codigo, time.time() + settings.ECHO_OTP_VALIDADE)
+    recuperacao.salvar()
+    response.set_signed_cookie(
+        COOKIE, recuperacao.token, salt=_SAL, max_age=settings.ECHO_OTP_VALIDADE,
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+    )
+    return recuperacao
+
+
+def atual(request):
+    """A recuperação do navegador, ou None se não houver, tiver expirado ou o cookie for inválido."""
+    try:
+        token = request.get_signed_cookie(COOKIE, salt=_SAL, max_age=settings.ECHO_OTP_VALIDADE)
+    except (KeyError, BadSignature):
+        return None
+    return carregar(token)
+
+
+def carregar(token):
+    """A recuperação de ``token`` (ex.: na tarefa que envia o e-mail), ou None se expirou ou foi encerrada."""
+    dados = _cache().get(_chave(token))
+    if not dados or dados['expira'] <= time.time():  # O cache arredonda a validade para segundos inteiros
+        return None
+    return Recuperacao(token, **dados)
+
+
+def verificar(recuperacao, codigo):
+    """True se ``codigo`` confere (a recuperação passa a valer para trocar a senha); errar demais a encerra."""
+    numero = recuperacao._reservar_tentativa()  # Antes de comparar: sem vaga, nem olha o código
+    if numero is None:
+        recuperacao.tentativas = settings.ECHO_OTP_TENTATIVAS
+        encerrar(recuperacao)
+        return False
+    recuperacao.tentativas = numero
+    if constant_time_compare(str(codigo or ''), recuperacao.codigo):
+        recuperacao.verificado = True
+        recuperacao.salvar()
+        return True
+    if recuperacao.esgotada():
+        encerrar(recuperacao)
+    return False
+
+
+def encerrar(recuperacao, response=None):
+    """Apaga a recuperação (senha trocada ou tentativas esgotadas) e, com ``response``, o cookie."""
+    # As vagas de palpite ficam até expirar: apagá-las devolveria palpites a requisições já em andamento
+    _cache().delete(_chave(recuperacao.token))
+    if response is not None:
+        response.delete_cookie(COOKIE, samesite='Lax')
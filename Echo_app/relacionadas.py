@@ -0,0 +1,332 @@
+"""
+Notícias relacionadas por conteúdo (TF-IDF + similaridade de cosseno).
+
+Cada notícia vira um vetor TF-IDF esparso dos radicais de ``titulo`` (com peso
+``PESO_TITULO``) e ``conteudo``, usando o mesmo ``busca.termos`` da busca
+textual. Os ``VIZINHOS`` mais parecidos de cada notícia ficam gravados em
+``NoticiaRelacionada`` e a página de detalhe só lê as primeiras linhas pelo
+índice (noticia, posicao).
+
+- ``reconstruir()`` (comando ``reconstruir_relacionadas``): vetoriza todas as
+  notícias e calcula a similaridade em blocos de ``TAMANHO_BLOCO`` linhas
+  (matriz esparsa x transposta), sem montar a matriz N x N inteira.
+- ``atualizar(noticia_id)``: tarefa enfileirada ao salvar uma notícia. Refaz o
+  vetor só dela, calcula uma linha de similaridades, grava os vizinhos dela e
+  a insere na lista das notícias mais parecidas; as listas de onde ela saiu
+  (editada, deixou de ser parecida) são recalculadas. O corpus e a matriz TF-IDF
+  ficam em memória no processo do worker (recarregados a cada
+  ``ECHO_RELACIONADAS_RECARGA`` segundos): a matriz é montada uma vez por
+  carga e cada notícia salva depois disso só ganha um vetor à parte, com o IDF
+  mantido em dia pela contagem incremental de documentos por termo. Os pesos
+  das linhas antigas mudam pouco a cada notícia nova, então rodar a
+  reconstrução completa de tempos em tempos basta para corrigir o desvio.
+
+NumPy e SciPy só são importados no cálculo; a leitura (``para``) não depende deles.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import busca
+from .tarefas import tarefa
+
+VIZINHOS = 6  # Linhas guardadas por notícia
+SIMILARIDADE_MINIMA = 0.05
+PESO_TITULO = 2  # O título conta como se aparecesse duas vezes
+TAMANHO_BLOCO = 500  # Linhas da matriz de similaridade calculadas por vez
+VIZINHOS_ATUALIZADOS = 50  # Notícias mais parecidas que recebem a nova notícia na sua lista
+RECARGA_PADRAO = 3600  # Segundos entre recargas completas do corpus em memória
+TAMANHO_LOTE = 1000
+
+# Palavras muito comuns que não ajudam a diferenciar notícias (já normalizadas)
+_PALAVRAS_VAZIAS = frozenset("""
+    a ao aos as com como da das de do dos e ela ele em entre era foi for ha isso
+    ja mais mas mesmo na nas nao no nos o os ou para pela pelas pelo pelos por
+    quando que se sem ser seu sua sao sobre tambem tem um uma uns umas foram
+    esta este isto estao sera pode apos ate ainda
+""".split())
+
+
+def tokens(titulo, conteudo):
+    palavras = busca.termos(titulo) * PESO_TITULO + busca.termos(conteudo)
+    return [p for p in palavras if len(p) > 2 and p not in _PALAVRAS_VAZIAS]
+
+
+def _idf(documentos_por_termo, total_documentos):
+    import numpy as np
+
+    return np.log((1.0 + total_documentos) / (1.0 + documentos_por_termo)) + 1.0
+
+
+class Corpus:
+    """Contagens de termos por notícia, a matriz TF-IDF da última carga e os vetores das notícias salvas depois dela."""
+
+    def __init__(self):
+        self.vocabulario = {}  # termo -> coluna
+        self.linhas = {}  # noticia_id -> (colunas, contagens)
+        self.documentos_por_termo = Counter()  # coluna -> notícias que têm o termo
+        self._base = None  # (ids, {id: linha}, matriz) montada por matriz(), ou None até a primeira comparação
+        self._substituidas = set()  # Linhas da base de notícias editadas ou apagadas depois da montagem
+        self._novas = {}  # noticia_id -> vetor (colunas, pesos) das notícias salvas depois da montagem
+        self._lock = threading.RLock()
+
+    def definir(self, noticia_id, termos):
+        import numpy as np
+
+        with self._lock:
+            self._retirar(noticia_id)
+            colunas = [self.vocabulario.setdefault(termo, len(self.vocabulario)) for termo in termos]
+            unicas, contagens = np.unique(np.asarray(colunas, dtype=np.int64), return_counts=True)
+            self.linhas[noticia_id] = (unicas, contagens)
+            self.documentos_por_termo.update(unicas.tolist())
+            if self._base is not None:
+                self._novas[noticia_id] = self._vetor(unicas, contagens)
+
+    def remover(self, noticia_id):
+        with self._lock:
+            self._retirar(noticia_id)
+
+    def _retirar(self, noticia_id):
+        anterior = self.linhas.pop(noticia_id, None)
+        if anterior is not None:
+            self.documentos_por_termo.subtract(anterior[0].tolist())
+        self._novas.pop(noticia_id, None)
+        if self._base is not None and noticia_id in self._base[1]:
+            self._substituidas.add(self._base[1][noticia_id])
+
+    def _vetor(self, colunas, contagens):
+        """TF-IDF de uma notícia com o IDF atual, com norma 1."""
+        import numpy as np
+
+        documentos = np.fromiter((self.documentos_por_termo[c] for c in colunas.tolist()), dtype=np.float64,
+                                 count=len(colunas))
+        pesos = (1.0 + np.log(contagens)) * _idf(documentos, len(self.linhas))
+        norma = np.sqrt(pesos @ pesos)
+        return colunas, pesos / norma if norma else pesos
+
+    def fixar(self, ids, matriz):
+        """Usa ``matriz`` (de ``matriz()``) como base das próximas comparações."""
+        with self._lock:
+            self._base = (ids, {noticia_id: linha for linha, noticia_id in enumerate(ids)}, matriz)
+            self._substituidas = set()
+            self._novas = {}
+
+    def similares(self, noticia_id):
+        """(ids, similaridades) de ``noticia_id`` com as demais notícias; -1 nela mesma e em linhas que não valem mais."""
+        import numpy as np
+        from scipy import sparse
+
+        with self._lock:
+            if self._base is None:
+                self.fixar(*self.matriz())  # Uma vez por carga; depois só entram vetores novos
+            ids_base, _, base = self._base
+            colunas, pesos = self._novas.get(noticia_id) or self._vetor(*self.linhas[noticia_id])
+            substituidas = list(self._substituidas)
+            novas = list(self._novas.items())
+            total_termos = len(self.vocabulario)
+
+        def como_matriz(vetores, largura):
+            tamanhos = np.fromiter((len(c) for c, _ in vetores), dtype=np.int64, count=len(vetores))
+            indptr = np.concatenate(([0], np.cumsum(tamanhos)))
+            return sparse.csr_matrix(
+                (np.concatenate([p for _, p in vetores]), np.concatenate([c for c, _ in vetores]), indptr),
+                shape=(len(vetores), largura),
+            )
+
+        na_base = colunas < base.shape[1]  # Termos que surgiram depois da montagem não aparecem na base
+        similaridades = (base @ como_matriz([(colunas[na_base], pesos[na_base])], base.shape[1]).T).toarray().ravel()
+        similaridades[substituidas] = -1.0
+        ids = list(ids_base)
+        if novas:
+            extras = como_matriz([vetor for _, vetor in novas], total_termos)
+            similaridades = np.concatenate((
+                similaridades, (extras @ como_matriz([(colunas, pesos)], total_termos).T).toarray().ravel()
+            ))
+            ids.extend(i for i, _ in novas)
+        similaridades[[j for j, i in enumerate(ids) if i == noticia_id]] = -1.0
+        return ids, similaridades
+
+    def matriz(self):
+        """Retorna (ids, matriz CSR com TF-IDF sublinear e linhas de norma 1)."""
+        import numpy as np
+        from scipy import sparse
+
+        with self._lock:
+            ids = list(self.linhas)
+            colunas = [self.linhas[i][0] for i in ids]
+            contagens = [self.linhas[i][1] for i in ids]
+            total_termos = len(self.vocabulario)
+
+        tamanhos = np.fromiter((len(c) for c in colunas), dtype=np.int64, count=len(ids))
+        indptr = np.concatenate(([0], np.cumsum(tamanhos)))
+        indices = np.concatenate(colunas) if ids else np.empty(0, dtype=np.int64)
+        dados = np.concatenate(contagens).astype(np.float64) if ids else np.empty(0)
+        matriz = sparse.csr_matrix((dados, indices, indptr), shape=(len(ids), total_termos))
+
+        matriz.data = 1.0 + np.log(matriz.data)  # TF sublinear
+        matriz.data *= _idf(np.bincount(matriz.indices, minlength=total_termos), len(ids))[matriz.indices]
+        normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=1)).ravel())
+        normas[normas == 0] = 1.0
+        return ids, sparse.diags(1.0 / normas) @ matriz
+
+
+def _melhores(similaridades, ids, excluir, quantidade=VIZINHOS):
+    """[(id, similaridade)] dos maiores valores de um vetor denso, sem ``excluir``."""
+    import numpy as np
+
+    similaridades = similaridades.copy()
+    similaridades[excluir] = -1.0
+    quantidade = min(quantidade, len(similaridades) - 1)
+    if quantidade <= 0:
+        return []
+    topo = np.argpartition(-similaridades, quantidade - 1)[:quantidade]
+    topo = topo[np.argsort(-similaridades[topo])]
+    return [(ids[j], float(similaridades[j])) for j in topo if similaridades[j] >= SIMILARIDADE_MINIMA]
+
+
+def _carregar_corpus():
+    from .models import Noticia
+
+    corpus = Corpus()
+    for noticia_id, titulo, conteudo in Noticia.objects.values_list('id', 'titulo', 'conteudo').iterator(
+        chunk_size=TAMANHO_LOTE
+    ):
+        corpus.definir(noticia_id, tokens(titulo, conteudo))
+    return corpus
+
+
+_corpus = None
+_carregado_em = 0.0
+_lock_carga = threading.Lock()
+
+
+def _obter_corpus():
+    global _corpus, _carregado_em
+    recarga = getattr(settings, 'ECHO_RELACIONADAS_RECARGA', RECARGA_PADRAO)
+    if _corpus is None or time.monotonic() - _carregado_em > recarga:
+        with _lock_carga:
+            if _corpus is None or time.monotonic() - _carregado_em > recarga:
+                _corpus, _carregado_em = _carregar_corpus(), time.monotonic()
+    return _corpus
+
+
+def _linhas(noticia_id, vizinhos):
+    from .models import NoticiaRelacionada
+
+    return [
+        NoticiaRelacionada(noticia_id=noticia_id, relacionada_id=relacionada_id, similaridade=similaridade, posicao=posicao)
+        for posicao, (relacionada_id, similaridade) in enumerate(vizinhos)
+    ]
+
+
+def reconstruir():
+    """Recalcula os vizinhos de todas as notícias. Retorna o número de notícias processadas."""
+    from .models import NoticiaRelacionada
+
+    global _corpus, _carregado_em
+    corpus = _carregar_corpus()
+    ids, matriz = corpus.matriz()
+    transposta = matriz.T.tocsc()
+
+    novas = []
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        bloco = (matriz[inicio:inicio + TAMANHO_BLOCO] @ transposta).toarray()
+        for deslocamento, similaridades in enumerate(bloco):
+            linha = inicio + deslocamento
+            novas.extend(_linhas(ids[linha], _melhores(similaridades, ids, linha)))
+
+    with transaction.atomic():
+        NoticiaRelacionada.objects.all().delete()
+        NoticiaRelacionada.objects.bulk_create(novas, batch_size=TAMANHO_LOTE)
+    corpus.fixar(ids, matriz)
+    with _lock_carga:
+        _corpus, _carregado_em = corpus, time.monotonic()
+    return len(ids)
+
+
+def _mais_parecidas(corpus, noticia_id, quantidade):
+    """[(id, similaridade)] das ``quantidade`` notícias mais parecidas com ``noticia_id`` que ainda existem."""
+    from .models import Noticia
+
+    ids, similaridades = corpus.similares(noticia_id)
+    candidatas = _melhores(similaridades, ids, [], quantidade)
+    # Notícias apagadas em outro processo ainda podem estar no corpus em memória: confere só as candidatas
+    existentes = set(Noticia.objects.filter(pk__in=[i for i, _ in candidatas]).values_list('pk', flat=True))
+    for apagada in {i for i, _ in candidatas} - existentes:
+        corpus.remover(apagada)
+    return [(i, similaridade) for i, similaridade in candidatas if i in existentes]
+
+
+@tarefa(max_tentativas=3)
+def atualizar(noticia_id):
+    """Recalcula os vizinhos de uma notícia e a inclui na lista das notícias mais parecidas com ela."""
+    from .models import Noticia, NoticiaRelacionada
+
+    corpus = _obter_corpus()
+    noticia = Noticia.objects.filter(pk=noticia_id).values_list('titulo', 'conteudo').first()
+    if noticia is None:
+        corpus.remover(noticia_id)
+        return 0
+    corpus.definir(noticia_id, tokens(*noticia))
+    candidatas = _mais_parecidas(corpus, noticia_id, VIZINHOS_ATUALIZADOS)
+    proprios = candidatas[:VIZINHOS]
+
+    # Notícias mais parecidas com a nova: ela entra na lista delas se superar o último vizinho
+    afetadas = dict(candidatas)
+    atuais = {}
+    for origem, relacionada, similaridade in NoticiaRelacionada.objects.filter(noticia_id__in=afetadas).exclude(
+        relacionada_id=noticia_id
+    ).values_list('noticia_id', 'relacionada_id', 'similaridade'):
+        atuais.setdefault(origem, []).append((relacionada, similaridade))
+    alteradas = {}
+    for origem, similaridade in afetadas.items():
+        lista = sorted(atuais.get(origem, []) + [(noticia_id, similaridade)], key=lambda item: -item[1])[:VIZINHOS]
+        if any(relacionada == noticia_id for relacionada, _ in lista):
+            alteradas[origem] = lista
+
+    # Se foi editada, pode ter saído da lista de notícias que a listavam: essas listas são refeitas
+    # inteiras, senão ficariam com uma linha a menos até a próxima reconstrução
+    orfas = set(NoticiaRelacionada.objects.filter(relacionada_id=noticia_id).exclude(
+        noticia_id__in=[noticia_id, *alteradas]
+    ).values_list('noticia_id', flat=True))
+    fora_do_corpus = [origem for origem in orfas if origem not in corpus.linhas]  # Criadas depois da carga
+    textos = Noticia.objects.filter(pk__in=fora_do_corpus).values_list('id', 'titulo', 'conteudo')
+    for origem, titulo, conteudo in textos:
+        corpus.definir(origem, tokens(titulo, conteudo))
+    for origem in orfas:
+        if origem in corpus.linhas:
+            alteradas[origem] = _mais_parecidas(corpus, origem, 2 * VIZINHOS)[:VIZINHOS]
+
+    with transaction.atomic():
+        NoticiaRelacionada.objects.filter(noticia_id=noticia_id).delete()
+        NoticiaRelacionada.objects.filter(relacionada_id=noticia_id).delete()
+        NoticiaRelacionada.objects.filter(noticia_id__in=alteradas).delete()
+        novas = _linhas(noticia_id, proprios)
+        for origem, lista in alteradas.items():
+            novas.extend(_linhas(origem, lista))
+        NoticiaRelacionada.objects.bulk_create(novas, batch_size=TAMANHO_LOTE)
+    return len(proprios)
+
+
+def para(noticia, limite=3):
+    """Notícias mais parecidas com ``noticia``, numa única consulta pelo índice da tabela."""
+    from .models import NoticiaRelacionada
+
+    linhas = NoticiaRelacionada.objects.filter(noticia=noticia).select_related(
+        'relacionada__categoria', 'relacionada__autor__perfil'
+    ).order_by('posicao')[:limite]
+    return [linha.relacionada for linha in linhas]
+
+
+async def apara(noticia, limite=3):
+    """``para`` com o ORM assíncrono (views async)."""
+    from .models import NoticiaRelacionada
+
+    linhas = NoticiaRelacionada.objects.filter(noticia=noticia).select_related(
+        'relacionada__categoria', 'relacionada__autor__perfil'
+    ).order_by('posicao')[:limite]
+    return [linha.relacionada async for linha in linhas]
@@ -0,0 +1,118 @@
+"""
+Leituras nas réplicas, escritas no primário (``DATABASE_ROUTERS``).
+
+Com réplicas configuradas (``DBREPLICAS`` no ambiente, ver settings), o
+``RoteadorReplicas`` manda as leituras feitas durante uma requisição para uma
+réplica sorteada e toda escrita para o 'default'. Para o usuário ler o que
+acabou de escrever (curtida, notificação lida, perfil editado), a leitura volta
+ao primário:
+
+- no resto da própria requisição, assim que ela escreve qualquer coisa;
+- nas requisições seguintes, por ``ECHO_DB_FIXAR_SEGUNDOS``: o
+  ``ReplicasMiddleware`` grava um cookie curto na resposta que escreveu.
+
+O estado da requisição fica num ContextVar (como a medição do
+``perfilamento.py``), então vale também dentro de ``sync_to_async``. Fora de
+requisição (worker da fila, comandos, shell) tudo vai para o primário: uma
+tarefa enfileirada logo após o commit não pode ler uma réplica atrasada.
+Sessões e a fila de tarefas também ficam sempre no primário.
+"""
+
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARIO = 'default'
+COOKIE = 'echo_primario'
+SEMPRE_NO_PRIMARIO = {  # Lidas logo após escritas de outro processo
+    'sessions.session', 'Echo_app.tarefa',
+    'django_cache.cacheentry',  # Tabelas do DatabaseCache (ECHO_CACHE_BACKEND='banco')
+}
+NAO_FIXAM = {'sessions.session', 'django_cache.cacheentry'}  # Escritas que não são do usuário
+
+_estado = contextvars.ContextVar('echo_replicas', default=None)
+
+
+class EstadoRequisicao:
+    def __init__(self, fixado):
+        self.fixado = fixado  # Cookie de uma escrita recente: lê do primário
+        self.escreveu = False
+
+
+def fixar_no_primario():
+    """Faz o resto da requisição (e a janela do cookie) ler do primário, ex.: antes de ler algo gravado por outro meio."""
+    estado = _estado.get()
+    if estado is not None:
+        estado.fixado = estado.escreveu = True
+
+
+def _rotulo(model):
+    # Não usa _meta.label_lower: o "modelo" do DatabaseCache tem um Options mínimo, sem ele
+    return f'{model._meta.app_label}.{model._meta.model_name}'
+
+
+class RoteadorReplicas:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or estado.fixado or not settings.ECHO_DB_REPLICAS:
+            return PRIMARIO
+        if _rotulo(model) in SEMPRE_NO_PRIMARIO:
+            return PRIMARIO
+        return random.choice(settings.ECHO_DB_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if _rotulo(model) not in NAO_FIXAM:  # Salvar a sessão ou o cache não conta como escrita do usuário
+            fixar_no_primario()
+        return PRIMARIO
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário: objetos de qualquer um deles podem se relacionar
+        bancos = {PRIMARIO, *settings.ECHO_DB_REPLICAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARIO  # As réplicas recebem o schema pela replicação
+
+
+class ReplicasMiddleware:
+    """Abre o estado da requisição e, se ela escreveu, fixa o usuário no primário por alguns segundos."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        estado, token = self._comecar(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(estado, response)
+
+    async def __acall__(self, request):
+        estado, token = self._comecar(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._terminar(estado, response)
+
+    def _comecar(self, request):
+        estado = EstadoRequisicao(fixado=COOKIE in request.COOKIES)
+        return estado, _estado.set(estado)
+
+    def _terminar(self, estado, response):
+        if estado.escreveu and settings.ECHO_DB_REPLICAS:
+            response.set_cookie(COOKIE, '1', max_age=settings.ECHO_DB_FIXAR_SEGUNDOS, httponly=True, samesite='Lax')
+        return response
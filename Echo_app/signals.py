@@ -0,0 +1,131 @@
+from django.db.models import QuerySet
+from django.db.models.signals import pre_delete, post_save, post_delete, m2m_changed  # Sinais do ciclo de vida dos modelos
+from django.dispatch import receiver  # Decorador que conecta funções aos sinais
+
+from . import autocompletar, busca, cache_segmentos, imagens, notificacoes, push, recomendacoes, relacionadas
+from .models import Categoria, InteracaoNoticia, Noticia, Notificacao, PerfilUsuario
+
+
+# ===================== ÍNDICE DE BUSCA =====================
+
+@receiver(post_save, sender=Noticia)  # Reindexa a notícia sempre que ela é salva
+def atualizar_indice_busca(sender, instance, **kwargs):
+    busca.indexar(instance)
+
+
+@receiver(post_delete, sender=Noticia)  # Tira a notícia do índice ao excluir
+def remover_do_indice_busca(sender, instance, **kwargs):
+    busca.remover(instance.pk)
+
+
+@receiver(post_save, sender=Noticia)  # Recalcula os vizinhos por conteúdo (na fila, fora da requisição)
+def atualizar_relacionadas(sender, instance, **kwargs):
+    relacionadas.atualizar.enfileirar_unica(noticia_id=instance.pk)
+
+
+# ===================== AUTOCOMPLETAR =====================
+
+@receiver(post_save, sender=Noticia)  # Mantém a trie de sugestões em dia
+def atualizar_sugestoes_noticia(sender, instance, **kwargs):
+    autocompletar.atualizar_noticia(instance)
+
+
+@receiver(post_delete, sender=Noticia)
+def remover_sugestoes_noticia(sender, instance, **kwargs):
+    autocompletar.remover_noticia(instance.pk)
+
+
+@receiver(post_save, sender=Categoria)
+def atualizar_sugestoes_categoria(sender, instance, **kwargs):
+    autocompletar.atualizar_categoria(instance)
+
+
+@receiver(post_delete, sender=Categoria)
+def remover_sugestoes_categoria(sender, instance, **kwargs):
+    autocompletar.remover_categoria(instance.pk)
+
+
+# ===================== CACHE DO DASHBOARD E DAS PÁGINAS =====================
+
+@receiver([post_save, post_delete], sender=Noticia)  # Qualquer mudança em notícia invalida os segmentos e a página dela
+def invalidar_cache_noticias(sender, instance, **kwargs):
+    cache_segmentos.invalidar('noticia', f'noticia:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_cache_categorias(sender, **kwargs):
+    cache_segmentos.invalidar('categoria')
+
+
+@receiver(m2m_changed, sender=PerfilUsuario.categorias_de_interesse.through)  # Usuário mudou seus interesses
+def invalidar_cache_perfil(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, PerfilUsuario):
+        cache_segmentos.invalidar(f'perfil:{instance.usuario_id}')
+
+
+# ===================== RECOMENDAÇÕES =====================
+
+@receiver(post_save, sender=InteracaoNoticia)  # Curtida/salvamento aumenta a afinidade com a categoria
+def aprender_com_interacao(sender, instance, created, **kwargs):
+    if created:
+        recomendacoes.registrar_interacao(instance.usuario_id, instance.noticia_id, instance.tipo, 1)
+
+
+def _em_cascata(sender, origin):
+    # origin: a instância ou o queryset cuja exclusão levou esta linha junto
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin is not None and modelo is not sender
+
+
+@receiver(post_delete, sender=InteracaoNoticia)  # Desfazer a interação devolve os pontos
+def desaprender_interacao(sender, instance, origin=None, **kwargs):
+    # Em cascata não há nada por linha: a notícia apagada já descontou tudo em lote
+    # (esquecer_interacoes_da_noticia) e o usuário apagado leva o próprio histórico junto
+    if not _em_cascata(sender, origin):
+        recomendacoes.registrar_interacao(instance.usuario_id, instance.noticia_id, instance.tipo, -1)
+
+
+@receiver(pre_delete, sender=Noticia)  # Antes da cascata, enquanto as interações ainda existem
+def esquecer_interacoes_da_noticia(sender, instance, **kwargs):
+    recomendacoes.esquecer_noticia(instance.pk, instance.categoria_id)
+
+
+@receiver(post_save, sender=Noticia)  # Notícia nova entra direto na lista de quem se interessa pela categoria
+def recomendar_noticia_nova(sender, instance, created, **kwargs):
+    if created and instance.categoria_id:
+        recomendacoes.incluir_noticia.enfileirar(noticia_id=instance.pk)
+
+
+@receiver(m2m_changed, sender=PerfilUsuario.categorias_de_interesse.through)
+def recalcular_apos_mudar_interesses(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, PerfilUsuario):
+        recomendacoes.agendar_recalculo(instance.usuario_id)
+
+
+# ===================== NOTIFICAÇÕES NÃO LIDAS =====================
+# O fan-out (bulk_create), marcar_lidas (update) e o delete de Notificacao ajustam o contador
+# por conta própria; este sinal cobre notificações criadas ou editadas (ex.: admin) uma a uma.
+# Sem pre_save/post_delete em Notificacao, as exclusões em cascata continuam em DELETE direto.
+
+@receiver(post_save, sender=Notificacao)
+def contar_notificacao_salva(sender, instance, created, **kwargs):
+    if not created:
+        notificacoes.reconciliar_nao_lidas([instance.usuario_id])  # Edição avulsa: reconta só o dono
+    elif not instance.lida:
+        notificacoes.ajustar_nao_lidas([instance.usuario_id], 1)
+        if instance.noticia_id:
+            push.publicar([instance.usuario_id], notificacoes.evento_para(instance.noticia_id, instance.manchete, instance.pk))
+
+
+# ===================== VERSÕES DAS IMAGENS =====================
+
+@receiver(post_save, sender=Noticia)  # Imagem nova (ou removida): gera/apaga as versões na fila, fora da requisição
+def processar_imagem_noticia(sender, instance, **kwargs):
+    if imagens.desatualizada(instance, 'noticia'):
+        imagens.processar.enfileirar_unica(tipo='noticia', pk=instance.pk)
+
+
+@receiver(post_save, sender=PerfilUsuario)
+def processar_foto_perfil(sender, instance, **kwargs):
+    if imagens.desatualizada(instance, 'perfil'):
+        imagens.processar.enfileirar_unica(tipo='perfil', pk=instance.pk)
@@ -0,0 +1,28 @@
+// --- Echo_app/static/Echo_app/js/notificacoes_push.js ---
+// Recebe as notificações novas por Server-Sent Events (ver Echo_app/push.py)
+// e atualiza o número do sino sem recarregar a página.
+
+(function () {
+    const sino = document.querySelector('.nav-icon-bell-link[data-eventos]');
+    if (!sino || !window.EventSource) return;
+
+    const badge = sino.querySelector('.badge-notificacoes');
+
+    function mostrarTotal(total) {
+        badge.dataset.total = total;
+        badge.textContent = total > 99 ? '99+' : total;
+        badge.hidden = total <= 0;
+    }
+
+    // O navegador reconecta sozinho se a conexão cair (o servidor sugere o intervalo com "retry:")
+    const fonte = new EventSource(sino.dataset.eventos);
+
+    fonte.addEventListener('notificacao', (mensagem) => {
+        const dados = JSON.parse(mensagem.data);
+        mostrarTotal((parseInt(badge.dataset.total, 10) || 0) + 1);
+        sino.title = `Notificações — ${dados.manchete}`;
+    });
+
+    // Sem isso o Firefox reclama de conexão interrompida ao trocar de página
+    window.addEventListener('beforeunload', () => fonte.close());
+})();
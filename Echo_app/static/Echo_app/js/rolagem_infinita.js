@@ -0,0 +1,48 @@
+// --- Echo_app/static/Echo_app/js/rolagem_infinita.js ---
+// Rolagem infinita: quando um link "Carregar mais" (a.carregar-mais) chega perto da tela,
+// busca a próxima página (só o HTML dos itens) e coloca no lugar do link.
+// Sem JavaScript o link continua funcionando e abre a página seguinte normalmente.
+
+const observadorRolagem = 'IntersectionObserver' in window
+    ? new IntersectionObserver((entradas) => {
+        entradas.forEach((entrada) => {
+            if (entrada.isIntersecting) {
+                observadorRolagem.unobserve(entrada.target);
+                carregarMais(entrada.target);
+            }
+        });
+    }, { rootMargin: '400px' })
+    : null;
+
+function carregarMais(link) {
+    if (link.dataset.carregando) return;
+    link.dataset.carregando = '1';
+
+    fetch(link.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' }, credentials: 'same-origin' })
+        .then((resposta) => {
+            if (!resposta.ok) throw new Error(resposta.status);
+            return resposta.text();
+        })
+        .then((html) => {
+            const lista = link.parentNode;
+            link.insertAdjacentHTML('beforebegin', html);
+            link.remove();
+            observarLinks(lista); // O novo pedaço pode trazer o link da página seguinte
+        })
+        .catch(() => {
+            delete link.dataset.carregando; // Tenta de novo no próximo clique
+        });
+}
+
+function observarLinks(raiz) {
+    raiz.querySelectorAll('a.carregar-mais:not([data-observado])').forEach((link) => {
+        link.dataset.observado = '1';
+        link.addEventListener('click', (evento) => {
+            evento.preventDefault();
+            carregarMais(link);
+        });
+        if (observadorRolagem) observadorRolagem.observe(link);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => observarLinks(document));
@@ -0,0 +1,228 @@
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco (modelo ``Tarefa``).
+
+Uso:
+
+    @tarefa(max_tentativas=3)
+    def enviar_algo(usuario_id):
+        ...
+
+    enviar_algo.enfileirar(usuario_id=user.pk)
+
+A tarefa é gravada na mesma transação da requisição, então só fica visível
+para os workers se a requisição fizer commit. Os workers são threads do
+comando ``processar_tarefas``; cada uma reserva uma tarefa por vez com um
+UPDATE condicional (``SELECT ... FOR UPDATE SKIP LOCKED`` no Postgres), executa
+e, em caso de erro, reagenda com backoff exponencial até ``max_tentativas``.
+
+Com ``ECHO_TAREFAS_SINCRONAS = True`` (padrão fora de produção) a tarefa ainda
+é gravada, mas roda logo após o commit, dentro do próprio processo web, para o
+desenvolvimento funcionar sem um worker rodando.
+"""
+
+import functools
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Min, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE = 5  # Segundos antes da 1ª nova tentativa (dobra a cada falha)
+BACKOFF_MAXIMO = 3600
+TEMPO_LIMITE_EXECUCAO = timedelta(minutes=30)  # Depois disso uma tarefa EXECUTANDO é tida como abandonada
+
+
+def tarefa(max_tentativas=5):
+    """
+    Marca uma função como tarefa e adiciona ``func.enfileirar(**kwargs)``,
+    ``func.enfileirar_unica(**kwargs)`` e ``func.enfileirar_varias([kwargs, ...])``.
+    """
+    def decorador(func):
+        func.eh_tarefa = True
+        func.max_tentativas = max_tentativas
+        func.enfileirar = functools.partial(enfileirar, func)
+        func.enfileirar_unica = functools.partial(enfileirar_unica, func)
+        func.enfileirar_varias = functools.partial(enfileirar_varias, func)
+        return func
+    return decorador
+
+
+def enfileirar(func, **argumentos):
+    from .models import Tarefa
+
+    item = Tarefa.objects.create(
+        funcao=f'{func.__module__}.{func.__qualname__}',
+        argumentos=argumentos,
+        max_tentativas=func.max_tentativas,
+    )
+    if getattr(settings, 'ECHO_TAREFAS_SINCRONAS', False):
+        transaction.on_commit(lambda: executar_pendente(item.pk))
+    return item
+
+
+def enfileirar_unica(func, **argumentos):
+    """Como ``enfileirar``, mas não duplica uma tarefa idêntica que ainda esteja pendente."""
+    from .models import Tarefa
+
+    pendente = Tarefa.objects.filter(
+        funcao=f'{func.__module__}.{func.__qualname__}', status='PENDENTE', argumentos=argumentos,
+    ).first()
+    return pendente or enfileirar(func, **argumentos)
+
+
+def enfileirar_varias(func, lista_de_argumentos):
+    """``enfileirar_unica`` para várias tarefas de uma vez: um SELECT das pendentes e um INSERT em lote."""
+    from .models import Tarefa
+
+    funcao = f'{func.__module__}.{func.__qualname__}'
+    novas = {}
+    for argumentos in lista_de_argumentos:
+        novas.setdefault(json.dumps(argumentos, sort_keys=True), argumentos)
+    pendentes = Tarefa.objects.filter(funcao=funcao, status='PENDENTE', argumentos__in=list(novas.values()))
+    for argumentos in pendentes.values_list('argumentos', flat=True):
+        novas.pop(json.dumps(argumentos, sort_keys=True), None)
+
+    itens = Tarefa.objects.bulk_create([
+        Tarefa(funcao=funcao, argumentos=argumentos, max_tentativas=func.max_tentativas) for argumentos in novas.values()
+    ])
+    if itens and getattr(settings, 'ECHO_TAREFAS_SINCRONAS', False):
+        transaction.on_commit(lambda: [executar_pendente(item.pk) for item in itens])
+    return itens
+
+
+def _backoff(tentativas):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (tentativas - 1), BACKOFF_MAXIMO))
+
+
+def reservar(tarefa_id=None):
+    """Marca a próxima tarefa pendente (ou a tarefa indicada) como EXECUTANDO e a retorna."""
+    from .models import Tarefa
+
+    agora = timezone.now()
+    prontas = Tarefa.objects.filter(status='PENDENTE', executar_apos__lte=agora)
+    if tarefa_id is not None:
+        prontas = prontas.filter(pk=tarefa_id)
+
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            item = prontas.select_for_update(skip_locked=True).order_by('executar_apos', 'id').first()
+            if item is None:
+                return None
+            item.status, item.data_inicio = 'EXECUTANDO', agora
+            item.save(update_fields=['status', 'data_inicio'])
+            return item
+
+    # Demais bancos: tenta "ganhar" a tarefa com um UPDATE condicional
+    for candidata in prontas.order_by('executar_apos', 'id').values_list('pk', flat=True)[:10]:
+        ganhou = Tarefa.objects.filter(pk=candidata, status='PENDENTE').update(status='EXECUTANDO', data_inicio=agora)
+        if ganhou:
+            return Tarefa.objects.get(pk=candidata)
+    return None
+
+
+def executar(item):
+    """Executa uma tarefa já reservada e registra o resultado."""
+    try:
+        func = import_string(item.funcao)
+        if not getattr(func, 'eh_tarefa', False):
+            raise ValueError(f"{item.funcao} não é uma tarefa registrada.")
+        func(**item.argumentos)
+    except Exception:
+        item.tentativas += 1
+        item.erro = traceback.format_exc()
+        if item.tentativas >= item.max_tentativas:
+            item.status = 'FALHOU'
+            item.data_conclusao = timezone.now()
+            logger.error("Tarefa %s falhou definitivamente após %s tentativas", item, item.tentativas)
+        else:
+            item.status = 'PENDENTE'
+            item.executar_apos = timezone.now() + _backoff(item.tentativas)
+            logger.warning("Tarefa %s falhou (tentativa %s); nova tentativa em %s", item, item.tentativas, item.executar_apos)
+    else:
+        item.status = 'CONCLUIDA'
+        item.data_conclusao = timezone.now()
+        item.erro = ''
+    item.save(update_fields=['status', 'tentativas', 'erro', 'executar_apos', 'data_conclusao'])
+    return item.status == 'CONCLUIDA'
+
+
+def executar_pendente(tarefa_id):
+    item = reservar(tarefa_id)
+    if item is not None:
+        executar(item)
+
+
+def recuperar_abandonadas():
+    """
+    Devolve para a fila tarefas presas em EXECUTANDO (worker que morreu no meio).
+
+    O abandono conta como tentativa: uma tarefa que sempre derruba o worker
+    (falta de memória, segfault numa biblioteca C) chega a FALHOU em vez de
+    voltar para a fila para sempre. Tudo num só UPDATE, que vê os valores antigos da linha.
+    """
+    from .models import Tarefa
+
+    agora = timezone.now()
+    esgotou = Q(tentativas__gte=F('max_tentativas') - 1)  # Esta seria a última tentativa
+    return Tarefa.objects.filter(status='EXECUTANDO', data_inicio__lt=agora - TEMPO_LIMITE_EXECUCAO).update(
+        tentativas=F('tentativas') + 1,
+        status=Case(When(esgotou, then=Value('FALHOU')), default=Value('PENDENTE')),
+        data_conclusao=Case(When(esgotou, then=Value(agora)), default=F('data_conclusao')),
+        executar_apos=agora,
+        erro=f"Execução abandonada: mais de {TEMPO_LIMITE_EXECUCAO.total_seconds() / 60:.0f} min em EXECUTANDO (worker morreu?).",
+    )
+
+
+def limpar_concluidas(dias=7):
+    from .models import Tarefa
+
+    limite = timezone.now() - timedelta(days=dias)
+    apagadas, _ = Tarefa.objects.filter(status='CONCLUIDA', data_conclusao__lt=limite).delete()
+    return apagadas
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def estatisticas(janela=timedelta(hours=1)):
+    """Tamanho da fila por status e latências (espera e execução) das tarefas concluídas na janela."""
+    from .models import Tarefa
+
+    agora = timezone.now()
+    por_status = dict(Tarefa.objects.values_list('status').annotate(total=Count('id')).order_by())
+    mais_antiga = Tarefa.objects.filter(status='PENDENTE', executar_apos__lte=agora).aggregate(m=Min('data_criacao'))['m']
+
+    por_funcao = {}
+    concluidas = Tarefa.objects.filter(status='CONCLUIDA', data_conclusao__gte=agora - janela).values_list(
+        'funcao', 'data_criacao', 'data_inicio', 'data_conclusao'
+    )
+    for funcao, criada, inicio, fim in concluidas:
+        dados = por_funcao.setdefault(funcao, {'espera': [], 'execucao': []})
+        dados['espera'].append((inicio - criada).total_seconds())
+        dados['execucao'].append((fim - inicio).total_seconds())
+
+    return {
+        'fila': {status: por_status.get(status, 0) for status, _ in Tarefa.STATUS_CHOICES},
+        'pendente_mais_antiga_segundos': (agora - mais_antiga).total_seconds() if mais_antiga else 0,
+        'latencia_por_funcao': {
+            funcao: {
+                'concluidas': len(dados['execucao']),
+                'espera_p50': _percentil(dados['espera'], 0.5),
+                'espera_p95': _percentil(dados['espera'], 0.95),
+                'execucao_p50': _percentil(dados['execucao'], 0.5),
+                'execucao_p95': _percentil(dados['execucao'], 0.95),
+            }
+            for funcao, dados in por_funcao.items()
+        },
+    }
@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from .. import imagens
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagem_responsiva(arquivo, versoes, sizes='100vw', alt='', classe='', largura=640, carregamento='lazy'):
+    """
+    ``<picture>`` com AVIF/WebP/JPEG em várias larguras para o navegador escolher pelo ``sizes``.
+    Uso: ``{% imagem_responsiva noticia.imagem noticia.imagem_versoes sizes="(max-width: 768px) 100vw, 33vw" alt=noticia.titulo %}``
+    ``largura`` escolhe a versão do ``src`` de reserva. Sem versões geradas ainda, sai o ``<img>`` do original.
+    """
+    if not arquivo:
+        return ''
+    mapa = versoes or {}
+    src = imagens.url_versao(mapa, largura) if mapa.get('original') == arquivo.name else None
+    if src is None:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">', arquivo.url, alt, classe, carregamento)
+
+    fontes = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (imagens.FORMATOS[formato][1], imagens.srcset(mapa, formato), sizes)
+            for formato in imagens.FORMATOS if formato != imagens.FORMATO_PADRAO and mapa['versoes'].get(formato)
+        ),
+    )
+    # display: contents deixa o <img> se comportar como filho direto do card (o CSS atual continua valendo)
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}" srcset="{}" sizes="{}" '
+        'alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        fontes, src, imagens.srcset(mapa, imagens.FORMATO_PADRAO), sizes, alt, classe, carregamento,
+    )
@@ -1,3 +1,2043 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import runpy
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (autocompletar, avatares, busca, cache_paginas, cache_segmentos, consultas_lentas, contadores, emails,
+               imagens, notificacoes, paginacao, perfilamento, push, recuperacao_senha, relacionadas, replicas, tarefas,
+               uploads)
+from .management.commands import teste_carga
+from .models import (Categoria, InteracaoNoticia, Noticia, NoticiaRelacionada, Notificacao, PerfilUsuario, Recomendacao,
+                     Tarefa)
+
+User = get_user_model()
+
+
+# ===================== BUSCA TEXTUAL =====================
+
+class BuscaTextualTest(TestCase):
+    """Índice de busca (FTS5 no SQLite, tsvector no Postgres) mantido pelos sinais, e o icontains sem índice."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nome='Política')
+        cls.no_titulo = Noticia.objects.create(titulo='Eleições municipais começam hoje', conteudo='urnas abertas',
+                                               categoria=cls.categoria)
+        cls.no_conteudo = Noticia.objects.create(titulo='Agenda da semana', conteudo='debate antes das eleições',
+                                                 categoria=cls.categoria)
+        cls.outra = Noticia.objects.create(titulo='Chuva no litoral', conteudo='temporal', categoria=cls.categoria)
+
+    def pesquisar(self, termo):
+        resposta = self.client.get(reverse('Echo_app:pesquisar_noticias'), {'q': termo},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return [resultado['id'] for resultado in resposta.json()['resultados']]
+
+    def test_indice_sem_acento_com_radical_e_prefixo(self):
+        self.assertTrue(busca.disponivel())
+        esperado = [self.no_titulo.pk, self.no_conteudo.pk]  # Título pesa mais que conteúdo
+        self.assertEqual(busca.buscar_ids('eleicao'), esperado)
+        self.assertEqual(busca.buscar_ids('ELEIÇÕES'), esperado)
+        self.assertEqual(busca.buscar_ids('municip'), [self.no_titulo.pk])  # Último termo como prefixo
+        self.assertEqual(busca.buscar_ids('eleicoes chuva'), [])
+
+    def test_sinais_mantem_o_indice(self):
+        self.outra.titulo = 'Eleições suspensas pela chuva'
+        self.outra.save()
+        self.assertIn(self.outra.pk, busca.buscar_ids('eleicoes'))
+        self.no_titulo.delete()
+        self.assertNotIn(self.no_titulo.pk, busca.buscar_ids('eleicoes'))
+
+    def test_view_usa_o_indice_e_cai_no_icontains_sem_ele(self):
+        self.assertEqual(self.pesquisar('eleicao'), [self.no_titulo.pk, self.no_conteudo.pk])
+        with mock.patch.object(busca, 'disponivel', return_value=False):
+            self.assertIsNone(busca.buscar_ids('eleições'))
+            self.assertEqual(set(self.pesquisar('eleições')), {self.no_titulo.pk, self.no_conteudo.pk})
+            self.assertEqual(self.pesquisar('eleicao'), [])  # O icontains não normaliza nem tira o radical
+
+
+# ===================== AUTOCOMPLETAR =====================
+
+class AutocompletarTest(TestCase):
+    """Trie de sugestões: as melhores por prefixo, remoção que completa as listas e os sinais."""
+
+    def titulos(self, trie, prefixo, limite=autocompletar.MAX_POR_NO):
+        return [texto for _, texto, _, _ in trie.sugerir(prefixo, limite)]
+
+    def test_remover_completa_a_lista_com_a_subarvore(self):
+        trie = autocompletar.Trie()
+        for i in range(15):
+            trie.inserir(f'n:{i}', 'noticia', f'Saúde pública {i}', f'/noticia/{i}/', float(i))
+        self.assertEqual(self.titulos(trie, 'sau', 3), ['Saúde pública 14', 'Saúde pública 13', 'Saúde pública 12'])
+
+        for i in range(14, 4, -1):  # Tira as 10 mais recentes, que eram as únicas guardadas nos nós
+            trie.remover(f'n:{i}')
+        self.assertEqual(self.titulos(trie, 'saude'), [f'Saúde pública {i}' for i in range(4, -1, -1)])
+        self.assertEqual(self.titulos(trie, 'publica 3'), ['Saúde pública 3'])
+
+        for i in range(5):
+            trie.remover(f'n:{i}')
+        self.assertEqual(trie.raiz.filhos, {})  # Sem entradas, os ramos somem
+
+    def test_bate_com_a_busca_ingenua(self):
+        import random
+
+        aleatorio = random.Random(7)
+        palavras = ['casa', 'caso', 'carro', 'cama', 'sal', 'salto', 'saude']
+        trie, vivas = autocompletar.Trie(), {}
+        for passo in range(400):
+            chave = f'n:{aleatorio.randrange(60)}'
+            if chave in vivas and aleatorio.random() < 0.5:
+                trie.remover(chave)
+                del vivas[chave]
+            else:
+                texto = ' '.join(aleatorio.sample(palavras, 2))
+                vivas[chave] = (texto, float(passo))
+                trie.inserir(chave, 'noticia', texto, '/', float(passo))
+            prefixo = aleatorio.choice(['ca', 'cas', 'sal', 's', 'carro c', 'sa'])
+            esperado = sorted(
+                (c for c, (texto, _) in vivas.items() if any(p.startswith(prefixo) for p in autocompletar.Trie._sufixos(texto))),
+                key=lambda c: -vivas[c][1],
+            )[:autocompletar.MAX_POR_NO]
+            self.assertEqual(self.titulos(trie, prefixo), [vivas[c][0] for c in esperado], f'passo {passo}: {prefixo!r}')
+
+    def test_sinais_mantem_a_trie_em_dia(self):
+        categoria = Categoria.objects.create(nome='Economia')
+        noticia = Noticia.objects.create(titulo='Inflação recua em setembro', conteudo='texto', categoria=categoria)
+        autocompletar.carregar()
+        self.addCleanup(setattr, autocompletar, '_trie', None)
+
+        resposta = self.client.get(reverse('Echo_app:autocompletar_pesquisa'), {'q': 'infla'})
+        self.assertEqual(resposta.json()['sugestoes'][0]['texto'], 'Inflação recua em setembro')
+        noticia.titulo = 'Juros sobem'
+        noticia.save()
+        self.assertEqual(autocompletar.sugerir('infla'), [])
+        self.assertEqual(autocompletar.sugerir('juro')[0]['url'], reverse('Echo_app:noticia_detalhe', args=[noticia.pk]))
+        noticia.delete()
+        self.assertEqual(autocompletar.sugerir('juro'), [])
+        self.assertEqual(autocompletar.sugerir('econ')[0]['tipo'], 'categoria')
+
+
+    @override_settings(ECHO_AUTOCOMPLETAR_RECARGA=0)
+    def test_trie_vencida_segue_servindo_durante_a_recarga(self):
+        import threading
+
+        antiga, nova = autocompletar.Trie(), autocompletar.Trie()
+        antiga.inserir('n:1', 'noticia', 'Inflação recua', '/noticia/1/', 1.0)
+        nova.inserir('n:1', 'noticia', 'Inflação sobe', '/noticia/1/', 1.0)
+        liberar, cargas = threading.Event(), []
+
+        def carregar_devagar():
+            cargas.append(1)
+            liberar.wait(5)  # Banco lento
+            autocompletar._trie, autocompletar._carregada_em = nova, time.monotonic()
+
+        for patcher in (mock.patch.object(autocompletar, '_trie', antiga),
+                        mock.patch.object(autocompletar, '_carregada_em', 0.0),
+                        mock.patch.object(autocompletar, 'carregar', carregar_devagar)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        for _ in range(3):  # Nenhuma espera a recarga, e só uma thread recarrega
+            self.assertEqual(autocompletar.sugerir('infla')[0]['texto'], 'Inflação recua')
+        liberar.set()
+        with autocompletar._lock_carga:  # A thread libera a vez quando termina
+            pass
+        self.assertEqual(cargas, [1])
+        self.assertIs(autocompletar._trie, nova)
+        with mock.patch.object(autocompletar, '_carregada_em', time.monotonic() + 60):  # Ainda válida
+            self.assertEqual(autocompletar.sugerir('infla')[0]['texto'], 'Inflação sobe')
+
+# ===================== ENVIO DE NOTIFICAÇÕES =====================
+
+class EnvioNotificacoesTest(TestCase):
+    """Fan-out em lotes, fora da requisição do editor, e tudo ou nada numa transação."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nome='Política')
+        cls.usuarios = [User.objects.create_user(f'leitor{i}', f'leitor{i}@example.com', 'senha') for i in range(7)]
+        cls.interessados = cls.usuarios[:5]
+        for usuario in cls.interessados:
+            usuario.perfil.categorias_de_interesse.add(cls.categoria)
+        cls.noticia = Noticia.objects.create(titulo='Votação hoje', conteudo='texto', categoria=cls.categoria)
+
+    def test_salvar_so_enfileira_e_a_tarefa_cria_em_lotes(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            noticia = Noticia.objects.create(titulo='Urgente', conteudo='texto', categoria=self.categoria, notificacao=True)
+        item = Tarefa.objects.get(funcao='Echo_app.notificacoes.enviar_para_interessados')
+        self.assertEqual((item.argumentos, item.status), ({'noticia_id': noticia.pk}, 'PENDENTE'))
+        self.assertFalse(Notificacao.objects.exists())  # Nada no save do editor
+
+        with mock.patch.object(notificacoes, 'TAMANHO_LOTE', 2), CaptureQueriesContext(connection) as consultas:
+            for callback in callbacks:
+                callback()
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "Echo_app_notificacao"')]
+        self.assertEqual(len(inserts), 3)  # 5 interessados em lotes de 2
+        self.assertEqual(set(Notificacao.objects.values_list('usuario_id', flat=True)), {u.pk for u in self.interessados})
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'CONCLUIDA')
+
+    def test_falha_no_meio_nao_deixa_envio_pela_metade(self):
+        with mock.patch.object(notificacoes, 'TAMANHO_LOTE', 2), \
+                mock.patch.object(notificacoes, 'ajustar_nao_lidas', side_effect=[None, RuntimeError('banco caiu')]):
+            with self.assertRaises(RuntimeError), self.assertLogs('Echo_app.notificacoes', 'ERROR'):
+                notificacoes.enviar_para_interessados(self.noticia.pk)
+        self.assertFalse(Notificacao.objects.exists())
+        self.assertEqual(notificacoes.enviar_para_interessados(self.noticia.pk), 5)  # A nova tentativa faz tudo
+
+
+# ===================== FILA DE TAREFAS =====================
+
+@tarefas.tarefa(max_tentativas=2)
+def tarefa_que_falha(motivo):
+    raise RuntimeError(motivo)
+
+
+class FilaTarefasTest(TestCase):
+    """Reserva, novas tentativas com backoff, tarefas abandonadas e o que fica gravado em ``Tarefa``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+
+    def test_reservas_em_sequencia_nao_repetem(self):
+        primeira = tarefa_que_falha.enfileirar(motivo='a')
+        segunda = tarefa_que_falha.enfileirar(motivo='b')
+        self.assertEqual(tarefas.reservar().pk, primeira.pk)
+        self.assertEqual(tarefas.reservar().pk, segunda.pk)
+        self.assertIsNone(tarefas.reservar())
+        self.assertIsNone(tarefas.reservar(primeira.pk))  # Já está EXECUTANDO
+
+    @skipUnless(connection.vendor == 'sqlite', "No Postgres a reserva usa SELECT ... FOR UPDATE SKIP LOCKED")
+    def test_reserva_perdida_para_outro_worker_passa_para_a_proxima(self):
+        disputada = tarefa_que_falha.enfileirar(motivo='a')
+        livre = tarefa_que_falha.enfileirar(motivo='b')
+        outro_worker = []
+
+        def ganhar_antes(execute, sql, params, many, context):
+            resultado = execute(sql, params, many, context)
+            if not outro_worker and sql.startswith('SELECT') and 'Echo_app_tarefa' in sql:
+                # Entre a leitura das candidatas e o UPDATE condicional, outro worker leva a primeira
+                outro_worker.append(Tarefa.objects.filter(pk=disputada.pk).update(status='EXECUTANDO'))
+            return resultado
+
+        with connection.execute_wrapper(ganhar_antes):
+            item = tarefas.reservar()
+        self.assertEqual(outro_worker, [1])
+        self.assertEqual(item.pk, livre.pk)
+
+    def test_falha_reagenda_com_backoff_ate_o_limite(self):
+        self.assertEqual([tarefas._backoff(n).total_seconds() for n in (1, 2, 3)], [5, 10, 20])
+        self.assertEqual(tarefas._backoff(30).total_seconds(), tarefas.BACKOFF_MAXIMO)
+
+        item = tarefa_que_falha.enfileirar(motivo='sem rede')
+        with self.assertLogs('Echo_app.tarefas', 'WARNING'):
+            self.assertFalse(tarefas.executar(tarefas.reservar()))
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.tentativas), ('PENDENTE', 1))
+        self.assertIn('sem rede', item.erro)
+        self.assertGreater(item.executar_apos, timezone.now() + timedelta(seconds=3))
+        self.assertIsNone(tarefas.reservar())  # Ainda no backoff
+
+        Tarefa.objects.filter(pk=item.pk).update(executar_apos=timezone.now())
+        with self.assertLogs('Echo_app.tarefas', 'ERROR'):
+            tarefas.executar(tarefas.reservar())
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.tentativas), ('FALHOU', 2))
+        self.assertIsNotNone(item.data_conclusao)
+
+    def test_enfileirar_unica_nao_duplica_pendente(self):
+        primeira = tarefa_que_falha.enfileirar_unica(motivo='a')
+        self.assertEqual(tarefa_que_falha.enfileirar_unica(motivo='a').pk, primeira.pk)
+        self.assertNotEqual(tarefa_que_falha.enfileirar_unica(motivo='b').pk, primeira.pk)
+        tarefas.reservar(primeira.pk)
+        self.assertNotEqual(tarefa_que_falha.enfileirar_unica(motivo='a').pk, primeira.pk)  # A outra já está rodando
+
+        novas = tarefa_que_falha.enfileirar_varias([{'motivo': 'a'}, {'motivo': 'c'}, {'motivo': 'c'}])
+        self.assertEqual([item.argumentos for item in novas], [{'motivo': 'c'}])
+
+    def test_codigo_otp_nao_fica_nos_argumentos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('Echo_app:esqueci_senha'), {'email': self.usuario.email})
+        pedido = RequestFactory().get('/')
+        pedido.COOKIES = {nome: cookie.value for nome, cookie in self.client.cookies.items()}
+        codigo = recuperacao_senha.atual(pedido).codigo
+
+        item = Tarefa.objects.get(funcao='Echo_app.emails.enviar_codigo_otp')
+        self.assertEqual(item.status, 'CONCLUIDA')
+        self.assertNotIn(codigo, json.dumps(item.argumentos))  # Só usuário e token
+        self.assertIn(codigo, mail.outbox[0].body)  # Lido na hora do envio
+
+    def test_abandonada_conta_como_tentativa(self):
+        uma_hora_atras = timezone.now() - timedelta(hours=1)
+        quase = Tarefa.objects.create(funcao='x.y', status='EXECUTANDO', data_inicio=uma_hora_atras,
+                                      tentativas=0, max_tentativas=3)
+        ultima = Tarefa.objects.create(funcao='x.y', status='EXECUTANDO', data_inicio=uma_hora_atras,
+                                       tentativas=2, max_tentativas=3)
+        recente = Tarefa.objects.create(funcao='x.y', status='EXECUTANDO', data_inicio=timezone.now())
+
+        self.assertEqual(tarefas.recuperar_abandonadas(), 2)
+        quase.refresh_from_db()
+        ultima.refresh_from_db()
+        recente.refresh_from_db()
+        self.assertEqual((quase.status, quase.tentativas), ('PENDENTE', 1))
+        self.assertEqual((ultima.status, ultima.tentativas), ('FALHOU', 3))  # Derrubou o worker 3 vezes
+        self.assertIsNotNone(ultima.data_conclusao)
+        self.assertIn('abandonada', ultima.erro)
+        self.assertEqual(recente.status, 'EXECUTANDO')  # Ainda dentro do tempo limite
+
+    def test_recuperacao_expirada_nao_envia(self):
+        emails.enviar_codigo_otp(usuario_id=self.usuario.pk, token='nao-existe')
+        self.assertEqual(mail.outbox, [])
+
+
+
+@skipUnless(connection.vendor == 'postgresql', "SELECT ... FOR UPDATE SKIP LOCKED só no Postgres")
+@override_settings(ECHO_TAREFAS_SINCRONAS=False)  # Sem transação no teste, a execução síncrona seria imediata
+class FilaTarefasPostgresTest(TransactionTestCase):
+    """Workers em paralelo, cada um na sua conexão, nunca reservam a mesma tarefa."""
+
+    available_apps = settings.INSTALLED_APPS  # Limpeza com TRUNCATE ... CASCADE (o índice de busca referencia a notícia)
+
+    def test_workers_em_paralelo(self):
+        import threading
+
+        ids = {tarefa_que_falha.enfileirar(motivo=str(i)).pk for i in range(40)}
+        reservadas = []
+        largada = threading.Barrier(4)
+
+        def worker():
+            try:
+                largada.wait()
+                while (item := tarefas.reservar()) is not None:
+                    reservadas.append(item.pk)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(reservadas), sorted(ids))  # Todas, e cada uma uma vez só
+
+# ===================== CONTADORES =====================
+
+class ContadoresInteracaoTest(TestCase):
+    """Curtir/salvar soma ou subtrai 1 no banco (F()), sem recontar as interações nem regravar a notícia."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        cls.noticia = Noticia.objects.create(titulo='Eleição', conteudo='texto', autor=cls.usuario,
+                                             categoria=Categoria.objects.create(nome='Política'))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def curtir(self):
+        return self.client.post(reverse('Echo_app:curtir_noticia', args=[self.noticia.pk]),
+                                headers={'x-requested-with': 'XMLHttpRequest'}).json()
+
+    def test_curtir_e_descurtir(self):
+        self.assertEqual(self.curtir(), {'success': True, 'acao': 'adicionada', 'nova_contagem': 1,
+                                         'status_interacao': True, 'tipo': 'curtida'})
+        self.assertEqual(self.curtir()['nova_contagem'], 0)
+        self.noticia.refresh_from_db()
+        self.assertEqual((self.noticia.curtidas_count, self.noticia.salvamentos_count), (0, 0))
+
+    def test_incremento_atomico_sem_recontar(self):
+        Noticia.objects.filter(pk=self.noticia.pk).update(curtidas_count=41)  # Cliques de outros leitores
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.curtir()['nova_contagem'], 42)
+        sqls = [c['sql'] for c in consultas.captured_queries]
+        self.assertFalse([sql for sql in sqls if 'COUNT(' in sql.upper()])
+        atualizacoes = [sql for sql in sqls if sql.startswith('UPDATE') and 'curtidas_count' in sql]
+        self.assertEqual(len(atualizacoes), 1)
+        self.assertNotIn('titulo', atualizacoes[0])  # Só a coluna do contador, calculada pelo banco
+
+    def test_contador_nao_fica_negativo_e_reconciliar_corrige(self):
+        InteracaoNoticia.objects.create(usuario=self.usuario, noticia=self.noticia, tipo='CURTIDA')  # Sem contar
+        self.assertEqual(self.curtir()['nova_contagem'], 0)  # 0 - 1 fica em 0
+        InteracaoNoticia.objects.create(usuario=self.usuario, noticia=self.noticia, tipo='SALVAMENTO')
+        self.assertEqual(contadores.reconciliar([self.noticia.pk]), 1)
+        self.noticia.refresh_from_db()
+        self.assertEqual((self.noticia.curtidas_count, self.noticia.salvamentos_count), (0, 1))
+
+
+@override_settings(ECHO_CONTADORES_WRITE_BEHIND=True)
+class ContadoresWriteBehindTest(TestCase):
+    """No write-behind os cliques ficam no buffer do processo e descarregar() os grava num UPDATE só."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        categoria = Categoria.objects.create(nome='Política')
+        cls.noticias = [
+            Noticia.objects.create(titulo=f'Notícia {i}', conteudo='texto', autor=cls.usuario, categoria=categoria)
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        for patcher in (mock.patch.object(contadores, '_iniciar_descarregador'),  # Sem a thread: descarrega o teste
+                        mock.patch.dict(contadores._buffer, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def alternar(self, noticia, tipo):
+        with self.captureOnCommitCallbacks(execute=True):  # O delta só entra no buffer depois do commit
+            return contadores.alternar(self.usuario, noticia.pk, tipo)
+
+    def gravado(self, noticia, campo):
+        return Noticia.objects.values_list(campo, flat=True).get(pk=noticia.pk)
+
+    def test_clique_fica_no_buffer_e_valor_o_inclui(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.alternar(self.noticias[0], 'CURTIDA')
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE "Echo_app_noticia"')])
+        self.assertEqual(self.gravado(self.noticias[0], 'curtidas_count'), 0)
+        self.assertEqual(contadores.pendente(self.noticias[0].pk, 'CURTIDA'), 1)
+        self.assertEqual(contadores.valor(self.noticias[0].pk, 'CURTIDA'), 1)
+
+    def test_descarregar_grava_tudo_num_update(self):
+        self.alternar(self.noticias[0], 'CURTIDA')
+        self.alternar(self.noticias[0], 'SALVAMENTO')
+        self.alternar(self.noticias[1], 'CURTIDA')
+        with self.assertNumQueries(1):
+            self.assertEqual(contadores.descarregar(), 2)
+        self.assertEqual(contadores.pendente(self.noticias[0].pk, 'CURTIDA'), 0)
+        self.assertEqual(self.gravado(self.noticias[0], 'curtidas_count'), 1)
+        self.assertEqual(self.gravado(self.noticias[0], 'salvamentos_count'), 1)
+        self.assertEqual(self.gravado(self.noticias[1], 'curtidas_count'), 1)
+        self.assertEqual(self.gravado(self.noticias[1], 'salvamentos_count'), 0)
+        self.assertEqual(contadores.descarregar(), 0)  # Nada pendente: nem consulta
+
+    def test_cliques_que_se_anulam_nao_geram_update(self):
+        self.alternar(self.noticias[0], 'CURTIDA')
+        self.alternar(self.noticias[0], 'CURTIDA')
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.descarregar(), 0)
+
+    def test_transacao_desfeita_nao_entra_no_buffer(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                contadores.alternar(self.usuario, self.noticias[0].pk, 'CURTIDA')
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(contadores.pendente(self.noticias[0].pk, 'CURTIDA'), 0)
+
+    def test_falha_ao_gravar_devolve_os_deltas(self):
+        self.alternar(self.noticias[0], 'CURTIDA')
+        with mock.patch.object(Noticia.objects, 'filter', side_effect=RuntimeError('banco fora')), \
+                self.assertLogs('Echo_app.contadores', 'ERROR'):
+            self.assertEqual(contadores.descarregar(), 0)
+        self.assertEqual(contadores.pendente(self.noticias[0].pk, 'CURTIDA'), 1)
+        self.assertEqual(contadores.descarregar(), 1)
+        self.assertEqual(self.gravado(self.noticias[0], 'curtidas_count'), 1)
+
+
+# ===================== CACHE DE SEGMENTOS =====================
+
+class CacheSegmentosTest(TestCase):
+    """Segmentos do dashboard em cache com chave por geração: mudar a dependência troca a chave."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        cls.categoria = Categoria.objects.create(nome='Política')
+        cls.noticia = Noticia.objects.create(titulo='Eleição', conteudo='texto', autor=cls.usuario,
+                                             categoria=cls.categoria)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.dict(cache_segmentos._metricas, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calcula_uma_vez_ate_a_dependencia_mudar(self):
+        calcular = mock.Mock(side_effect=['primeiro', 'segundo'])
+        self.assertEqual(cache_segmentos.obter('lista', ['noticia'], calcular), 'primeiro')
+        self.assertEqual(cache_segmentos.obter('lista', ['noticia'], calcular), 'primeiro')
+        cache_segmentos.invalidar('categoria')  # Outra dependência: a chave continua a mesma
+        self.assertEqual(cache_segmentos.obter('lista', ['noticia'], calcular), 'primeiro')
+        self.assertEqual(calcular.call_count, 1)
+
+        cache_segmentos.invalidar('noticia')
+        self.assertEqual(cache_segmentos.obter('lista', ['noticia'], calcular), 'segundo')
+        self.assertEqual(cache_segmentos.metricas()['lista'], {'hits': 2, 'misses': 2, 'taxa_acerto': 0.5})
+
+    def test_identificador_separa_as_copias(self):
+        self.assertEqual(cache_segmentos.obter('perfil', ['perfil:1'], lambda: 'um', identificador=1), 'um')
+        self.assertEqual(cache_segmentos.obter('perfil', ['perfil:2'], lambda: 'dois', identificador=2), 'dois')
+        self.assertEqual(cache_segmentos.obter('perfil', ['perfil:1'], lambda: 'outro', identificador=1), 'um')
+
+    async def test_versao_assincrona_usa_as_mesmas_chaves(self):
+        async def calcular():
+            return 'assincrono'
+
+        self.assertEqual(await cache_segmentos.aobter('lista', ['noticia'], calcular), 'assincrono')
+        self.assertEqual(cache_segmentos.obter('lista', ['noticia'], mock.Mock()), 'assincrono')
+
+    def test_sinais_trocam_a_geracao(self):
+        antes = cache_segmentos.geracoes(['noticia', 'categoria', f'perfil:{self.usuario.pk}'])
+        self.noticia.save()
+        self.categoria.save()
+        self.usuario.perfil.categorias_de_interesse.add(self.categoria)
+        depois = cache_segmentos.geracoes(['noticia', 'categoria', f'perfil:{self.usuario.pk}'])
+        self.assertEqual((antes, depois), ('0.0.0', '1.1.1'))
+
+    def test_dashboard_reaproveita_e_mostra_noticia_nova(self):
+        self.client.force_login(self.usuario)  # Logado: sem o cache da página inteira
+        url = reverse('Echo_app:dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(url)
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'FROM "Echo_app_noticia"' in c['sql']])
+
+        nova = Noticia.objects.create(titulo='Apuração', conteudo='texto', autor=self.usuario, categoria=self.categoria)
+        self.assertIn(nova, self.client.get(url).context['ultimas_noticias'])
+
+
+# ===================== CACHE DE PÁGINAS =====================
+
+class CachePaginasTest(TestCase):
+    """Página inteira em cache para anônimos: 304, invalidação ao editar e chave sem parâmetros soltos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = User.objects.create_user('editor', 'editor@example.com', 'senha')
+        cls.noticia = Noticia.objects.create(titulo='Título original', conteudo='texto', autor=cls.autor,
+                                             categoria=Categoria.objects.create(nome='Geral'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_segunda_visita_sai_do_cache_e_responde_304(self):
+        url = reverse('Echo_app:dashboard')
+        primeira = self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.get(url)
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': primeira['ETag']}).status_code, 304)
+
+    def test_editar_noticia_invalida_a_pagina(self):
+        url = reverse('Echo_app:noticia_detalhe', args=[self.noticia.pk])
+        antes = self.client.get(url)
+        self.assertContains(antes, 'Título original')
+        self.noticia.titulo = 'Título corrigido'
+        self.noticia.save()
+        depois = self.client.get(url)
+        self.assertContains(depois, 'Título corrigido')
+        self.assertNotEqual(depois['ETag'], antes['ETag'])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': antes['ETag']}).status_code, 200)
+
+    def test_parametro_desconhecido_nao_usa_o_cache(self):
+        url = reverse('Echo_app:noticia_detalhe', args=[self.noticia.pk])
+        self.client.get(url, {'utm_source': 'email'})
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url, {'utm_source': 'email'})
+        self.assertGreater(len(consultas), 0)  # Gerada de novo: nada foi guardado para essa URL
+        self.assertNotIn('ETag', resposta)
+
+    def test_chave_so_com_parametros_conhecidos_em_ordem_fixa(self):
+        fabrica = RequestFactory()
+        self.assertEqual(cache_paginas._caminho(fabrica.get('/noticias/', {'b': '2', 'a': '1'}), ('a', 'b')),
+                         cache_paginas._caminho(fabrica.get('/noticias/?a=1&b=2'), ('a', 'b')))
+        self.assertEqual(cache_paginas._caminho(fabrica.get('/noticias/'), ()), '/noticias/')
+
+
+# ===================== RECOMENDAÇÕES =====================
+
+class RecomendacoesTest(TestCase):
+    """Listas pré-calculadas por usuário: aprendizado com interações, notícia nova e exclusões em cascata."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leitores = [User.objects.create_user(f'leitor{i}', f'leitor{i}@example.com', 'senha') for i in range(3)]
+        cls.esporte, cls.economia = Categoria.objects.create(nome='Esporte'), Categoria.objects.create(nome='Economia')
+        agora = timezone.now()
+        cls.noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Notícia {i}', conteudo='texto', categoria=cls.esporte if i % 2 else cls.economia,
+                    data_publicacao=agora - timedelta(hours=i))
+            for i in range(8)
+        ])
+
+    def historico(self, usuario, categoria):
+        from .models import HistoricoInteresse
+
+        return HistoricoInteresse.objects.filter(usuario=usuario, categoria=categoria).values_list(
+            'pontuacao', flat=True
+        ).first()
+
+    def recalculos(self):
+        return Tarefa.objects.filter(funcao='Echo_app.recomendacoes.recalcular')
+
+    def test_curtida_puxa_a_categoria_e_tira_a_vista(self):
+        from . import recomendacoes
+
+        leitor = self.leitores[0]
+        curtida = self.noticias[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            InteracaoNoticia.objects.create(usuario=leitor, noticia=curtida, tipo='SALVAMENTO')
+        self.assertEqual(self.historico(leitor, self.esporte), recomendacoes.PESOS['SALVAMENTO'])
+        lista = recomendacoes.para(leitor, limite=10)
+        self.assertEqual({n.categoria_id for n in lista}, {self.esporte.pk})
+        self.assertNotIn(curtida, lista)  # Já vista
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nova = Noticia.objects.create(titulo='Final hoje', conteudo='texto', categoria=self.esporte)
+        self.assertEqual(recomendacoes.para(leitor, limite=1), [nova])  # Entrou na lista sem recalcular
+
+    def test_apagar_noticia_desconta_em_lote(self):
+        noticia = self.noticias[1]
+        for leitor in self.leitores:
+            InteracaoNoticia.objects.create(usuario=leitor, noticia=noticia, tipo='CURTIDA')
+            InteracaoNoticia.objects.create(usuario=leitor, noticia=self.noticias[3], tipo='SALVAMENTO')
+        self.recalculos().delete()
+
+        with CaptureQueriesContext(connection) as consultas:
+            noticia.delete()
+        for leitor in self.leitores:
+            self.assertEqual(self.historico(leitor, self.esporte), 2)  # Sobrou só o salvamento da outra notícia
+        self.assertEqual(sorted(self.recalculos().values_list('argumentos__usuario_id', flat=True)),
+                         [leitor.pk for leitor in self.leitores])
+        afinidade = [c['sql'] for c in consultas.captured_queries if 'Echo_app_historicointeresse' in c['sql']]
+        self.assertEqual(len(afinidade), 1)  # Um UPDATE para os três, nenhum por interação apagada
+
+    def test_apagar_usuario_nao_reaprende(self):
+        leitor = self.leitores[0]
+        InteracaoNoticia.objects.create(usuario=leitor, noticia=self.noticias[1], tipo='CURTIDA')
+        self.recalculos().delete()
+        leitor.delete()
+        self.assertFalse(self.recalculos().exists())
+
+    def test_descurtir_devolve_os_pontos(self):
+        leitor = self.leitores[0]
+        InteracaoNoticia.objects.create(usuario=leitor, noticia=self.noticias[1], tipo='CURTIDA')
+        InteracaoNoticia.objects.filter(usuario=leitor).delete()
+        self.assertEqual(self.historico(leitor, self.esporte), 0)
+
+
+# ===================== NOTÍCIAS RELACIONADAS =====================
+
+class NoticiasRelacionadasTest(TestCase):
+    """Vizinhos TF-IDF: reconstrução completa, atualização incremental ao salvar e o complemento na página."""
+
+    TEXTOS = [
+        ('Seleção vence a final da copa', 'futebol gol campeonato torcida estádio seleção'),
+        ('Seleção empata na copa', 'futebol gol empate torcida estádio copa'),
+        ('Banco central sobe juros', 'inflação juros economia mercado banco central'),
+        ('Inflação desacelera', 'inflação preços economia mercado consumidor'),
+        ('Chuva forte no litoral', 'chuva temporal litoral alagamento defesa civil'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = User.objects.create_user('editor', 'editor@example.com', 'senha')
+        cls.categoria = Categoria.objects.create(nome='Geral')
+        cls.noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=titulo, conteudo=conteudo, categoria=cls.categoria, autor=cls.autor)
+            for titulo, conteudo in cls.TEXTOS
+        ])
+
+    def setUp(self):
+        relacionadas._corpus = None  # O corpus em memória é do processo: não passa de um teste para outro
+        self.addCleanup(setattr, relacionadas, '_corpus', None)
+        relacionadas.reconstruir()
+
+    def vizinhos(self, noticia):
+        return list(NoticiaRelacionada.objects.filter(noticia=noticia).order_by('posicao').values_list(
+            'relacionada_id', flat=True
+        ))
+
+    def test_reconstruir_liga_as_parecidas(self):
+        copa, empate, juros, inflacao, chuva = self.noticias
+        self.assertEqual(self.vizinhos(copa)[0], empate.pk)
+        self.assertEqual(self.vizinhos(juros)[0], inflacao.pk)
+        self.assertEqual(self.vizinhos(chuva), [])  # Nada acima da similaridade mínima
+
+    def test_salvar_atualiza_sem_remontar_a_matriz(self):
+        copa, empate = self.noticias[:2]
+        with mock.patch.object(relacionadas.Corpus, 'matriz', side_effect=AssertionError('matriz remontada')):
+            with self.captureOnCommitCallbacks(execute=True):
+                nova = Noticia.objects.create(
+                    titulo='Seleção vence a copa nos pênaltis', conteudo='futebol gol pênaltis torcida estádio seleção',
+                    categoria=self.categoria, autor=self.autor,
+                )
+        self.assertEqual(Tarefa.objects.get(funcao='Echo_app.relacionadas.atualizar', argumentos={'noticia_id': nova.pk}).status, 'CONCLUIDA')
+        self.assertEqual(set(self.vizinhos(nova)[:2]), {copa.pk, empate.pk})
+        self.assertIn(nova.pk, self.vizinhos(copa))  # Entrou na lista da mais parecida
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nova.titulo, nova.conteudo = 'Chuva no litoral', 'chuva temporal litoral alagamento'
+            nova.save()
+        self.assertNotIn(nova.pk, self.vizinhos(copa))  # Editada, deixou de ser parecida
+        self.assertEqual(self.vizinhos(nova), [self.noticias[4].pk])
+
+    def test_editada_sai_da_lista_sem_deixar_buraco(self):
+        palavras = 'futebol gol torcida estádio seleção copa campeonato técnico goleiro atacante'.split()
+        futebol = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Jogo {i} da copa', conteudo=' '.join(palavras[:6 + i % 5]), categoria=self.categoria,
+                    autor=self.autor)
+            for i in range(relacionadas.VIZINHOS + 3)
+        ])
+        relacionadas.reconstruir()
+        editada = futebol[0]
+        origens = list(NoticiaRelacionada.objects.filter(relacionada=editada).values_list('noticia_id', flat=True))
+        self.assertTrue(origens)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            editada.titulo, editada.conteudo = 'Chuva no litoral', 'chuva temporal litoral alagamento'
+            editada.save()
+        for origem in origens:
+            self.assertNotIn(editada.pk, self.vizinhos(origem))
+            posicoes = NoticiaRelacionada.objects.filter(noticia_id=origem).order_by('posicao').values_list(
+                'posicao', flat=True
+            )
+            self.assertEqual(list(posicoes), list(range(relacionadas.VIZINHOS)))
+
+    def test_apagada_em_outro_processo_sai_dos_vizinhos(self):
+        copa, empate = self.noticias[:2]
+        Noticia.objects.filter(pk=empate.pk)._raw_delete('default')  # Sem sinais: o corpus em memória não sabe
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            copa.save()
+        self.assertNotIn(empate.pk, self.vizinhos(copa))
+        varreduras = [q['sql'] for q in consultas.captured_queries
+                      if q['sql'].startswith(f'SELECT "{Noticia._meta.db_table}"."id" FROM') and 'WHERE' not in q['sql']]
+        self.assertEqual(varreduras, [])  # Só confere as candidatas, sem varrer a tabela
+
+    def test_detalhe_completa_com_outras_categorias(self):
+        sozinha = Noticia.objects.create(titulo='Eleições municipais', conteudo='voto urna candidato', autor=self.autor,
+                                         categoria=Categoria.objects.create(nome='Política'))
+        resposta = self.client.get(reverse('Echo_app:noticia_detalhe', args=[sozinha.pk]))
+        self.assertEqual(len(resposta.context['noticias_relacionadas']), 3)
+        self.assertNotIn(sozinha, resposta.context['noticias_relacionadas'])
+
+
+# ===================== DADOS SINTÉTICOS E CARGA =====================
+
+class GerarDadosTest(TestCase):
+    """gerar_dados cria um banco coerente: perfis, contadores e não lidas batem com as linhas geradas."""
+
+    def gerar(self, **opcoes):
+        call_command('gerar_dados', usuarios=20, noticias=30, interacoes=3, notificacoes=5, stdout=io.StringIO(),
+                     **opcoes)
+
+    def test_dados_coerentes(self):
+        self.gerar()
+        usuarios = User.objects.filter(username__startswith='carga_')
+        self.assertEqual(usuarios.count(), 20)
+        self.assertEqual(PerfilUsuario.objects.filter(usuario__in=usuarios).count(), 20)
+        self.assertTrue(usuarios.first().check_password('carga-echo-123'))
+        self.assertEqual(Noticia.objects.count(), 30)
+        self.assertTrue(InteracaoNoticia.objects.exists())
+
+        for noticia in Noticia.objects.all():
+            self.assertEqual(noticia.curtidas_count, noticia.interacoes.filter(tipo='CURTIDA').count())
+            self.assertEqual(noticia.salvamentos_count, noticia.interacoes.filter(tipo='SALVAMENTO').count())
+        for perfil in PerfilUsuario.objects.all():
+            self.assertEqual(perfil.notificacoes_nao_lidas,
+                             Notificacao.objects.filter(usuario_id=perfil.usuario_id, lida=False).count())
+        self.assertTrue(Recomendacao.objects.exists())  # Índices reconstruídos no final
+        self.assertTrue(NoticiaRelacionada.objects.exists())
+        noticia = Noticia.objects.first()
+        self.assertIn(noticia.pk, busca.buscar_ids(noticia.titulo, limite=100))
+
+    def test_segunda_rodada_acrescenta(self):
+        self.gerar(sem_indices=True)
+        self.gerar(sem_indices=True, semente=7)
+        self.assertEqual(User.objects.filter(username__startswith='carga_').count(), 40)
+        self.assertTrue(User.objects.filter(username='carga_39').exists())
+        self.assertEqual(Categoria.objects.count(), 12)  # As categorias padrão não se repetem
+
+
+class TesteCargaTest(LiveServerTestCase):
+    """teste_carga contra um servidor de verdade: anônimos e logados, sem erros, com percentis por rota."""
+
+    available_apps = settings.INSTALLED_APPS  # Limpeza com TRUNCATE ... CASCADE (o índice de busca referencia a notícia)
+
+    def test_carga_curta(self):
+        call_command('gerar_dados', usuarios=4, noticias=10, interacoes=2, notificacoes=2, sem_indices=True,
+                     stdout=io.StringIO())
+        saida = io.StringIO()
+        comando = teste_carga.Command(stdout=saida, stderr=io.StringIO())
+        decorrido = comando.carregar({'url': self.live_server_url, 'duracao': 1, 'concorrencia': 2, 'logados': 0.5,
+                                      'senha': 'carga-echo-123', 'timeout': 10, 'semente': 1})
+        self.assertIn('2 clientes (1 logados)', saida.getvalue())
+        linhas = comando.estatisticas(decorrido)
+        rota, reqs, erros, por_segundo, p50, p95, p99 = linhas[-1]
+        self.assertEqual(rota, 'TOTAL')
+        self.assertGreater(reqs, 0)
+        self.assertEqual(erros, 0)
+        self.assertLessEqual(p50, p99)
+
+    def test_sem_noticias(self):
+        with self.assertRaises(CommandError):
+            call_command('teste_carga', url=self.live_server_url, duracao=0.1, stdout=io.StringIO())
+
+    def test_percentil(self):
+        self.assertEqual(teste_carga.percentil([], 50), 0.0)
+        self.assertEqual(teste_carga.percentil([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(teste_carga.percentil([1, 2, 3, 4], 100), 4)
+
+
+# ===================== ÍNDICES =====================
+
+class IndicesConsultasTest(TestCase):
+    """
+    Confere, pelo plano de execução (EXPLAIN), que as consultas quentes usam
+    os índices da migração 0011 em vez de varrer a tabela e ordenar depois.
+    No Postgres o seqscan é desligado no teste, já que com poucas linhas ele
+    seria sempre escolhido; o que importa é que exista um índice utilizável.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        cls.categoria = Categoria.objects.create(nome='Política')
+        noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Notícia {i}', conteudo='texto', categoria=cls.categoria, urgente=i % 4 == 0)
+            for i in range(40)
+        ])
+        Notificacao.objects.bulk_create([
+            Notificacao(usuario=cls.usuario, noticia=noticia, manchete=noticia.titulo, lida=i % 2 == 0)
+            for i, noticia in enumerate(noticias)
+        ])
+        InteracaoNoticia.objects.bulk_create([
+            InteracaoNoticia(usuario=cls.usuario, noticia=noticia, tipo=tipo)
+            for noticia in noticias[:20] for tipo in ('CURTIDA', 'SALVAMENTO')
+        ])
+        Recomendacao.objects.bulk_create([
+            Recomendacao(usuario=cls.usuario, noticia=noticia, pontuacao=i) for i, noticia in enumerate(noticias[:10])
+        ])
+
+    def plano(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = self.plano(queryset)
+        self.assertIn(indice, plano)
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plano, f"Ordenação fora do índice:\n{plano}")
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plano)
+            self.assertNotIn('Sort', plano, f"Ordenação fora do índice:\n{plano}")
+
+    def test_dashboard(self):
+        self.assertUsaIndice(
+            Noticia.objects.filter(urgente=True).order_by('-data_publicacao')[:8], 'noticia_urgentes_idx'
+        )
+        self.assertUsaIndice(
+            Noticia.objects.filter(urgente=False).order_by('-data_publicacao')[:5], 'noticia_nao_urgentes_idx'
+        )
+        self.assertUsaIndice(Noticia.objects.order_by('-curtidas_count')[:3], 'noticia_curtidas_idx')
+        self.assertUsaIndice(
+            Recomendacao.objects.filter(usuario=self.usuario).order_by('-pontuacao')[:3], 'recomendacao_usuario_idx'
+        )
+
+    def test_filtro_por_categoria(self):
+        self.assertUsaIndice(
+            Noticia.objects.filter(categoria=self.categoria).order_by('-data_publicacao')[:5],
+            'noticia_categoria_data_idx',
+        )
+
+    def test_lista_de_notificacoes(self):
+        for lida, indice in ((False, 'notificacao_nao_lida_idx'), (True, 'notificacao_lida_idx')):
+            with self.subTest(lida=lida):
+                notificacoes = Notificacao.objects.filter(usuario=self.usuario, lida=lida)
+                self.assertUsaIndice(paginacao.consulta(notificacoes, 'data_criacao')[:6], indice)
+                # Página "profunda": o cursor vira um intervalo no mesmo índice, sem OFFSET
+                meio = notificacoes.order_by('-data_criacao', '-pk')[10]
+                cursor = paginacao.codificar('teste', meio.data_criacao, meio.pk)
+                self.assertUsaIndice(paginacao.consulta(notificacoes, 'data_criacao', cursor, 'teste')[:6], indice)
+
+    def test_curtidas_e_salvas(self):
+        for tipo in ('CURTIDA', 'SALVAMENTO'):
+            with self.subTest(tipo=tipo):
+                interacoes = InteracaoNoticia.objects.filter(usuario=self.usuario, tipo=tipo)
+                meio = interacoes.order_by('-data_interacao', '-pk')[10]
+                cursor = paginacao.codificar('teste', meio.data_interacao, meio.pk)
+                for pagina in ('', cursor):
+                    self.assertUsaIndice(
+                        paginacao.consulta(interacoes, 'data_interacao', pagina, 'teste')[:25], 'interacao_usuario_tipo_idx'
+                    )
+
+
+# ===================== PAGINAÇÃO POR CURSOR =====================
+
+class PaginacaoCursorTest(TestCase):
+    """Percorre as listas pelo cursor: sem itens repetidos ou perdidos e com o mesmo custo em toda página."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        categoria = Categoria.objects.create(nome='Política')
+        noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Notícia {i}', conteudo='texto', categoria=categoria) for i in range(60)
+        ])
+        InteracaoNoticia.objects.bulk_create([
+            InteracaoNoticia(usuario=cls.usuario, noticia=noticia, tipo='CURTIDA') for noticia in noticias
+        ])
+        Notificacao.objects.bulk_create([
+            Notificacao(usuario=cls.usuario, noticia=noticia, manchete=noticia.titulo) for noticia in noticias
+        ])
+        # Todas com a mesma data: o desempate pelo id precisa segurar a ordem sozinho
+        Notificacao.objects.update(data_criacao=timezone.now())
+
+    def percorrer(self, queryset, campo, tamanho):
+        vistos, cursor, consultas_por_pagina = [], '', set()
+        while True:
+            with CaptureQueriesContext(connection) as consultas:
+                pagina = paginacao.paginar(queryset, campo, cursor, tamanho, lista='teste')
+            consultas_por_pagina.add(len(consultas))
+            vistos.extend(item.pk for item in pagina.itens)
+            if not pagina.tem_proxima:
+                return vistos, consultas_por_pagina
+            cursor = pagina.proximo_cursor
+
+    def test_percorre_sem_repetir_nem_perder(self):
+        for modelo, campo in ((Notificacao, 'data_criacao'), (InteracaoNoticia, 'data_interacao')):
+            with self.subTest(modelo=modelo.__name__):
+                queryset = modelo.objects.filter(usuario=self.usuario)
+                vistos, consultas = self.percorrer(queryset, campo, 7)
+                self.assertEqual(vistos, list(queryset.order_by(f'-{campo}', '-pk').values_list('pk', flat=True)))
+                self.assertEqual(consultas, {1})  # Uma consulta por página, sem COUNT, da primeira à última
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        queryset = Notificacao.objects.filter(usuario=self.usuario)
+        primeira = paginacao.paginar(queryset, 'data_criacao', '', 5, lista='teste')
+        outra_lista = paginacao.paginar(queryset, 'data_criacao', primeira.proximo_cursor, 5, lista='outra')
+        adulterado = paginacao.paginar(queryset, 'data_criacao', primeira.proximo_cursor[:-2] + 'xx', 5, lista='teste')
+        for pagina in (outra_lista, adulterado):
+            self.assertEqual([n.pk for n in pagina.itens], [n.pk for n in primeira.itens])
+
+    def test_rolagem_infinita(self):
+        self.client.force_login(self.usuario)
+        url = reverse('Echo_app:noticias_curtidas')
+        resposta = self.client.get(url)
+        self.assertContains(resposta, 'class="carregar-mais')
+        proxima = resposta.context['pagina'].url_proxima
+
+        parcial = self.client.get(url + proxima, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(parcial, 'Echo_app/partials/curtidas_pagina.html')
+        self.assertTemplateNotUsed(parcial, 'Echo_app/base.html')
+        primeira = {n.pk for n in resposta.context['noticias_curtidas']}
+        segunda = {n.pk for n in parcial.context['pagina'].noticias}
+        self.assertTrue(segunda)
+        self.assertFalse(primeira & segunda)
+
+        notificacoes = self.client.get(reverse('Echo_app:lista_notificacoes') + '?secao=lidas',
+                                       HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(notificacoes, 'Echo_app/partials/notificacoes_pagina.html')
+
+
+# ===================== CONTADOR DE NÃO LIDAS =====================
+
+class ContadorNaoLidasTest(TestCase):
+    """O número do sino acompanha criação, leitura e exclusão de notificações sem recontar a tabela."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nome='Política')
+        cls.usuarios = [User.objects.create_user(f'leitor{i}', f'leitor{i}@example.com', 'senha') for i in range(3)]
+        for usuario in cls.usuarios[:2]:
+            usuario.perfil.categorias_de_interesse.add(cls.categoria)
+        cls.noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Notícia {i}', conteudo='texto', categoria=cls.categoria, autor=cls.usuarios[2]) for i in range(3)
+        ])
+
+    def nao_lidas(self, usuario):
+        return PerfilUsuario.objects.get(usuario=usuario).notificacoes_nao_lidas
+
+    def assertContadoresCertos(self):
+        for usuario in self.usuarios:
+            self.assertEqual(
+                self.nao_lidas(usuario), Notificacao.objects.filter(usuario=usuario, lida=False).count(), usuario.username
+            )
+
+    def test_fan_out_leitura_e_exclusao(self):
+        leitor = self.usuarios[0]
+        for noticia in self.noticias:
+            notificacoes.enviar_para_interessados(noticia.pk)
+        self.assertEqual(self.nao_lidas(leitor), 3)
+        self.assertEqual(self.nao_lidas(self.usuarios[2]), 0)  # Sem interesse na categoria
+
+        self.client.force_login(leitor)
+        primeira, segunda, terceira = Notificacao.objects.filter(usuario=leitor).order_by('pk')
+        self.client.get(reverse('Echo_app:noticia_detalhe', args=[primeira.noticia_id]) + f'?notif_id={primeira.pk}')
+        self.client.get(reverse('Echo_app:noticia_detalhe', args=[primeira.noticia_id]) + f'?notif_id={primeira.pk}')
+        self.assertEqual(self.nao_lidas(leitor), 2)  # Ler de novo não desconta outra vez
+
+        self.client.post(reverse('Echo_app:marcar_notificacao_lida', args=[segunda.pk]))
+        self.assertEqual(self.nao_lidas(leitor), 1)
+        terceira.delete()
+        self.assertEqual(self.nao_lidas(leitor), 0)
+
+        Notificacao.objects.create(usuario=leitor, noticia=self.noticias[0], manchete='Avulsa')
+        self.assertEqual(self.nao_lidas(leitor), 1)
+        self.client.post(reverse('Echo_app:marcar_todas_lidas'))
+        self.assertContadoresCertos()
+
+    def test_edicao_avulsa_e_reconciliacao(self):
+        leitor = self.usuarios[1]
+        notificacao = Notificacao.objects.create(usuario=leitor, noticia=self.noticias[0], manchete='Avulsa')
+        notificacao.lida = True
+        notificacao.save()  # Ex.: marcada pelo admin
+        self.assertEqual(self.nao_lidas(leitor), 0)
+        notificacao.lida = False
+        notificacao.save()
+        self.assertEqual(self.nao_lidas(leitor), 1)
+
+        PerfilUsuario.objects.update(notificacoes_nao_lidas=7)  # Desvio qualquer
+        notificacoes.reconciliar_nao_lidas()
+        self.assertContadoresCertos()
+
+    def test_exclusao_em_lote_e_em_cascata(self):
+        for noticia in self.noticias:
+            notificacoes.enviar_para_interessados(noticia.pk)
+        notificacoes.marcar_lidas(self.usuarios[0], noticia=self.noticias[0])
+        with CaptureQueriesContext(connection) as consultas:
+            Notificacao.objects.filter(noticia__in=self.noticias[:2]).delete()
+        self.assertContadoresCertos()
+        self.assertEqual(self.nao_lidas(self.usuarios[0]), 1)
+        ajustes = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE "Echo_app_perfilusuario"')]
+        self.assertEqual(len(ajustes), 2)  # Um UPDATE por quantidade descontada (1 e 2), não um por notificação
+
+        self.noticias[2].delete()  # Notícia apagada: a notificação fica (noticia = NULL) e continua não lida
+        self.assertContadoresCertos()
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.usuarios[1].delete()
+        self.assertFalse(
+            [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('SELECT') and 'Echo_app_notificacao' in c['sql']],
+            "As notificações do usuário apagado deveriam sair num DELETE direto, sem carregar as linhas",
+        )
+        self.assertFalse(Notificacao.objects.filter(usuario_id=self.usuarios[1].pk).exists())
+
+    def test_sino_sem_consulta_extra(self):
+        leitor = self.usuarios[0]
+        notificacoes.enviar_para_interessados(self.noticias[0].pk)
+        self.client.force_login(leitor)
+        url = reverse('Echo_app:perfil')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertContains(resposta, 'class="badge-notificacoes"')
+        self.assertFalse(
+            [c['sql'] for c in consultas.captured_queries if 'Echo_app_notificacao' in c['sql']],
+            "O sino não deveria consultar a tabela de notificações",
+        )
+
+
+# ===================== PUSH (SSE) =====================
+
+@override_settings(ECHO_PUSH_BACKEND='memoria')  # O pg_notify só sai no commit, e o TestCase nunca faz commit
+class PushNotificacoesTest(TestCase):
+    """A conexão SSE aberta recebe a notificação criada pelo fan-out, sem recarregar a página."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        categoria = Categoria.objects.create(nome='Política')
+        cls.usuario.perfil.categorias_de_interesse.add(categoria)
+        cls.noticia = Noticia.objects.create(titulo='Eleição', conteudo='texto', categoria=categoria, autor=cls.usuario)
+
+    def setUp(self):
+        patcher = mock.patch.object(push, '_backend', None)  # backend() guarda o escolhido pela configuração
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enviar(self):
+        with self.captureOnCommitCallbacks(execute=True):  # O push só sai depois do commit
+            notificacoes.enviar_para_interessados(self.noticia.pk)
+
+    async def test_evento_chega_na_conexao_aberta(self):
+        # aforce_login quebra com sessão cached_db no cache 'banco' (o aexists do Django consulta o cache de forma síncrona)
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        resposta = await self.async_client.get(reverse('Echo_app:eventos_notificacoes'))
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        fluxo = aiter(resposta.streaming_content)
+        self.assertTrue((await anext(fluxo)).startswith(b'retry:'))
+        self.assertEqual(push.central.conexoes(), 1)
+
+        await sync_to_async(self.enviar)()
+        mensagem = (await asyncio.wait_for(anext(fluxo), timeout=2)).decode()
+        self.assertTrue(mensagem.startswith('event: notificacao\n'))
+        dados = json.loads(mensagem.split('data: ', 1)[1])
+        self.assertEqual(dados['noticia_id'], self.noticia.pk)
+
+        # Cliente desconectou: o servidor ASGI cancela a tarefa que está esperando o próximo evento
+        proximo = asyncio.ensure_future(anext(fluxo))
+        await asyncio.sleep(0)
+        proximo.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await proximo
+        self.assertEqual(push.central.conexoes(), 0)
+
+    async def test_anonimo_nao_abre_conexao(self):
+        resposta = await self.async_client.get(reverse('Echo_app:eventos_notificacoes'))
+        self.assertEqual(resposta.status_code, 401)
+
+    def test_wsgi_nao_abre_fluxo(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('Echo_app:eventos_notificacoes'))  # Client síncrono = WSGIRequest
+        self.assertEqual(resposta.status_code, 204)
+        self.assertFalse(resposta.streaming)
+
+    def test_pagina_so_abre_eventsource_no_asgi(self):
+        self.client.force_login(self.usuario)
+        with self.settings(ECHO_PUSH_SSE=False):
+            self.assertNotContains(self.client.get(reverse('Echo_app:perfil')), 'data-eventos')
+        with self.settings(ECHO_PUSH_SSE=True):
+            resposta = self.client.get(reverse('Echo_app:perfil'))
+        self.assertContains(resposta, f'data-eventos="{reverse("Echo_app:eventos_notificacoes")}"')
+        self.assertContains(resposta, 'notificacoes_push.js')
+
+
+@skipUnless(connection.vendor == 'postgresql', "LISTEN/NOTIFY só no Postgres")
+class PushPostgresTest(TestCase):
+    """A conexão de LISTEN é aberta à parte: não ocupa o pool, nem a cada reconexão."""
+
+    def test_listen_fora_do_pool(self):
+        pool = connections['default'].pool  # None fora do modo 'pool'
+        antes = pool.get_stats().get('requests_num', 0) if pool else 0
+        ouvintes = [push.BackendPostgres()._conectar() for _ in range(3)]  # Como três reconexões
+        try:
+            for ouvinte in ouvintes:
+                canais = ouvinte.cursor().execute('SELECT pg_listening_channels()').fetchall()
+                self.assertEqual(canais, [(push.CANAL,)])
+            if pool:
+                self.assertEqual(pool.get_stats().get('requests_num', 0), antes)
+        finally:
+            for ouvinte in ouvintes:
+                ouvinte.close()
+
+
+# ===================== VIEWS ASSÍNCRONAS =====================
+
+class ViewsAssincronasTest(TestCase):
+    """As views de leitura rodam no ORM assíncrono (async_client = caminho ASGI)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        cls.categoria = Categoria.objects.create(nome='Política')
+        cls.usuario.perfil.categorias_de_interesse.add(cls.categoria)
+        cls.noticias = Noticia.objects.bulk_create([
+            Noticia(titulo=f'Notícia {i}', conteudo='texto', categoria=cls.categoria, autor=cls.usuario, urgente=i < 4)
+            for i in range(10)
+        ])
+        Recomendacao.objects.create(usuario=cls.usuario, noticia=cls.noticias[0], pontuacao=1)
+        busca.reconstruir()  # O bulk_create não passa pelos sinais que indexam
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_dashboard_logado(self):
+        # aforce_login quebra com sessão cached_db no cache 'banco' (o aexists do Django consulta o cache de forma síncrona)
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        resposta = await self.async_client.get(reverse('Echo_app:dashboard'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['noticias_recomendadas_list'], [self.noticias[0]])
+        self.assertNotIn(self.noticias[0], resposta.context['noticias_urgentes'])  # Recomendada não se repete
+        self.assertEqual(resposta.context['categorias_interesse'], [self.categoria])
+        self.assertEqual(len(resposta.context['ultimas_noticias']), 5)
+
+    async def test_dashboard_anonimo_usa_cache_de_pagina(self):
+        primeira = await self.async_client.get(reverse('Echo_app:dashboard'))
+        self.assertEqual(primeira.status_code, 200)
+        segunda = await self.async_client.get(reverse('Echo_app:dashboard'), headers={'If-None-Match': primeira['ETag']})
+        self.assertEqual(segunda.status_code, 304)
+
+    async def test_detalhe_marca_notificacao_e_interacoes(self):
+        noticia = self.noticias[5]
+        notificacao = await Notificacao.objects.acreate(usuario=self.usuario, noticia=noticia, manchete=noticia.titulo)
+        await InteracaoNoticia.objects.acreate(usuario=self.usuario, noticia=noticia, tipo='CURTIDA')
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        resposta = await self.async_client.get(
+            reverse('Echo_app:noticia_detalhe', args=[noticia.pk]), {'notif_id': notificacao.pk}
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.context['usuario_curtiu'])
+        self.assertFalse(resposta.context['usuario_salvou'])
+        self.assertEqual(len(resposta.context['noticias_relacionadas']), 3)
+        await notificacao.arefresh_from_db()
+        self.assertTrue(notificacao.lida)
+
+    async def test_detalhe_inexistente(self):
+        resposta = await self.async_client.get(reverse('Echo_app:noticia_detalhe', args=[999999]))
+        self.assertEqual(resposta.status_code, 404)
+
+    async def test_notificacoes_pagina_e_rolagem(self):
+        await Notificacao.objects.abulk_create([
+            Notificacao(usuario=self.usuario, noticia=noticia, manchete=noticia.titulo, lida=True) for noticia in self.noticias
+        ])
+        await sync_to_async(self.async_client.force_login)(self.usuario)
+        url = reverse('Echo_app:lista_notificacoes')
+        resposta = await self.async_client.get(url)
+        self.assertEqual(len(resposta.context['notificacoes_lidas'].itens), 5)
+        cursor = resposta.context['notificacoes_lidas'].proximo_cursor
+
+        parcial = await self.async_client.get(
+            url, {'secao': 'lidas', 'cursor': cursor}, headers={'X-Requested-With': 'XMLHttpRequest'}
+        )
+        self.assertTemplateUsed(parcial, 'Echo_app/partials/notificacoes_pagina.html')
+        self.assertTemplateNotUsed(parcial, 'Echo_app/notificacao.html')
+        self.assertEqual(len(parcial.context['pagina'].itens), 5)
+
+    async def test_pesquisa_e_filtro(self):
+        resposta = await self.async_client.get(
+            reverse('Echo_app:pesquisar_noticias'), {'q': 'Notícia'}, headers={'X-Requested-With': 'XMLHttpRequest'}
+        )
+        self.assertEqual(resposta.json()['total'], 10)
+        resposta = await self.async_client.get(reverse('Echo_app:filtrar_noticias'), {'categoria': 'política'})
+        self.assertEqual(len(resposta.context['ultimas_noticias']), 5)
+
+
+# ===================== VERSÕES DAS IMAGENS =====================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='echo-media-'))
+class VersoesImagensTest(TestCase):
+    """Upload gera versões menores em AVIF/WebP/JPEG sem EXIF, e o template passa a usar o srcset."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def png(self, largura=1200, altura=800):
+        conteudo = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Câmera'  # Make
+        Image.new('RGBA', (largura, altura), (200, 30, 30, 128)).save(conteudo, format='PNG', exif=exif)
+        return SimpleUploadedFile('capa.png', conteudo.getvalue(), content_type='image/png')
+
+    def criar_noticia(self):
+        autor = User.objects.create_user('autor', 'autor@example.com', 'senha')
+        with self.captureOnCommitCallbacks(execute=True):  # Tarefas síncronas rodam no on_commit
+            return Noticia.objects.create(titulo='Capa', conteudo='texto', imagem=self.png(), autor=autor)
+
+    def test_upload_gera_versoes(self):
+        noticia = self.criar_noticia()
+        noticia.refresh_from_db()
+        mapa = noticia.imagem_versoes
+        self.assertEqual(mapa['original'], noticia.imagem.name)
+        self.assertEqual((mapa['largura'], mapa['altura']), (1200, 800))
+        for formato in imagens.formatos_disponiveis():
+            self.assertEqual(sorted(mapa['versoes'][formato], key=int), ['320', '640', '1024'])  # Não amplia até 1600
+        with default_storage.open(mapa['versoes']['jpeg']['320']) as arquivo:
+            versao = Image.open(arquivo)
+            self.assertEqual(versao.size, (320, 213))
+            self.assertFalse(versao.getexif())
+
+    def test_troca_de_imagem_apaga_versoes_antigas(self):
+        noticia = self.criar_noticia()
+        noticia.refresh_from_db()
+        antigas = [caminho for por_largura in noticia.imagem_versoes['versoes'].values() for caminho in por_largura.values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            noticia.imagem = self.png(400, 400)
+            noticia.save()
+        noticia.refresh_from_db()
+        self.assertEqual(noticia.imagem_versoes['original'], noticia.imagem.name)
+        self.assertEqual(list(noticia.imagem_versoes['versoes']['jpeg']), ['320'])
+        self.assertFalse(any(default_storage.exists(caminho) for caminho in antigas))
+
+    def test_template_usa_srcset(self):
+        noticia = self.criar_noticia()
+        noticia.refresh_from_db()
+        html = Template('{% load imagens %}{% imagem_responsiva n.imagem n.imagem_versoes sizes="50vw" alt="Capa" %}').render(
+            Context({'n': noticia})
+        )
+        self.assertIn('<picture', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('.640w.jpg 640w', html)
+        self.assertIn('sizes="50vw"', html)
+
+        # Versões de outra imagem (ou ainda não geradas): cai no original
+        noticia.imagem_versoes = {}
+        html = Template('{% load imagens %}{% imagem_responsiva n.imagem n.imagem_versoes %}').render(Context({'n': noticia}))
+        self.assertIn(f'src="{noticia.imagem.url}"', html)
+        self.assertNotIn('<picture', html)
+
+
+# ===================== ARQUIVOS POR CONTEÚDO =====================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='echo-media-'))
+class ArmazenamentoPorConteudoTest(TestCase):
+    """Fotos de perfil iguais viram um arquivo só; avatar pronto é referência; órfãos são apagados."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        self.client.force_login(self.usuario)
+
+    def foto(self, cor=(10, 120, 200)):
+        conteudo = io.BytesIO()
+        Image.new('RGB', (64, 64), cor).save(conteudo, format='PNG')
+        return SimpleUploadedFile('minha foto.png', conteudo.getvalue(), content_type='image/png')
+
+    def editar(self, **dados):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('Echo_app:perfil_editar'), {'email': 'leitor@example.com', **dados})
+        return PerfilUsuario.objects.get(usuario=self.usuario)
+
+    def arquivos_de_fotos(self):
+        pasta = os.path.join(settings.MEDIA_ROOT, 'fotos_perfil')
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nome), settings.MEDIA_ROOT)
+            for raiz, _, nomes in os.walk(pasta) for nome in nomes if '.png.' not in nome  # Sem as versões
+        )
+
+    def test_mesma_foto_reaproveita_o_arquivo(self):
+        primeiro = self.editar(foto_perfil=self.foto()).foto_perfil.name
+        segundo = self.editar(foto_perfil=self.foto()).foto_perfil.name
+        self.assertEqual(primeiro, segundo)
+        self.assertRegex(primeiro, r'^fotos_perfil/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+
+        outro = User.objects.create_user('outro', 'outro@example.com', 'senha')
+        self.client.force_login(outro)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('Echo_app:perfil_editar'), {'email': 'outro@example.com', 'foto_perfil': self.foto()})
+        self.assertEqual(PerfilUsuario.objects.get(usuario=outro).foto_perfil.name, primeiro)
+        self.assertEqual(self.arquivos_de_fotos(), [primeiro])
+
+    def test_avatar_pronto_nao_copia(self):
+        self.editar(foto_perfil=self.foto())
+        perfil = self.editar(avatar_escolhido='avatars3.png')
+        self.assertEqual(perfil.avatar_padrao, 'avatars3.png')
+        self.assertFalse(perfil.foto_perfil)
+        self.assertEqual(len(self.arquivos_de_fotos()), 1)  # Só a foto enviada antes
+        resposta = self.client.get(reverse('Echo_app:perfil'))
+        self.assertContains(resposta, 'avatars/avatars3')
+
+    def test_limpeza_de_orfaos(self):
+        usada = self.editar(foto_perfil=self.foto()).foto_perfil.name
+        orfa = self.editar(foto_perfil=self.foto((0, 0, 0))).foto_perfil.name  # A anterior deixa de ser usada
+        self.editar(foto_perfil=self.foto())
+        # Cópia antiga de um avatar pronto, como as avatars1_MAK5siP.png de media/
+        with open(avatares.caminho_avatar('avatars1.png'), 'rb') as arquivo:
+            copia = default_storage.save('fotos_perfil/avatars1_MAK5siP.png', File(arquivo))
+        outro = User.objects.create_user('outro', 'outro@example.com', 'senha')
+        PerfilUsuario.objects.filter(usuario=outro).update(foto_perfil=copia)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('limpar_arquivos_orfaos', idade_minima=0, stdout=io.StringIO())
+        outro_perfil = PerfilUsuario.objects.get(usuario=outro)
+        self.assertEqual(outro_perfil.avatar_padrao, 'avatars1.png')
+        self.assertFalse(outro_perfil.foto_perfil)
+        self.assertEqual(self.arquivos_de_fotos(), [usada])
+        self.assertFalse(default_storage.exists(orfa))
+        self.assertFalse(default_storage.exists(copia))
+
+
+# ===================== UPLOAD EM STREAMING =====================
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='echo-media-'), ECHO_UPLOAD_TAMANHO_MAXIMO=1024 * 1024)
+class UploadEmStreamingTest(TestCase):
+    """O handler recusa arquivos grandes e bombas de descompressão pelo cabeçalho, sem guardar o arquivo."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def png(self, largura=120, altura=80, sobra=0):
+        conteudo = io.BytesIO()
+        Image.new('RGB', (largura, altura), (30, 90, 160)).save(conteudo, format='PNG')
+        return conteudo.getvalue() + b'\0' * sobra
+
+    def bomba(self):
+        """PNG de poucos KB que declara 50.000 x 50.000 px no IHDR (seguido de lixo para pesar ~900 KB)."""
+        dados = bytearray(self.png())
+        ihdr = struct.pack('>II', 50_000, 50_000) + bytes(dados[24:29])
+        dados[16:29] = ihdr
+        dados[29:33] = struct.pack('>I', zlib.crc32(b'IHDR' + ihdr))
+        return bytes(dados) + b'\0' * 900_000
+
+    def enviar(self, nome, conteudo, tipo='image/png'):
+        """Faz o parsing do multipart só com o UploadDeImagem, como em criar_noticia."""
+        request = RequestFactory().post('/', {'titulo': 'T', 'imagem': SimpleUploadedFile(nome, conteudo, content_type=tipo)})
+        handler = uploads.UploadDeImagem(request)
+        request.upload_handlers = [handler]
+        lidos = []
+        receber = handler.receive_data_chunk
+        handler.receive_data_chunk = lambda dados, inicio: lidos.append(len(dados)) or receber(dados, inicio)
+        return request.FILES, uploads.erros(request), sum(lidos)
+
+    def test_imagem_valida_chega_com_hash_e_dimensoes(self):
+        conteudo = self.png()
+        arquivos, erros, _ = self.enviar('capa.png', conteudo)
+        self.assertEqual(erros, [])
+        self.assertEqual(arquivos['imagem'].dimensoes, (120, 80))
+        self.assertEqual(arquivos['imagem'].sha256, hashlib.sha256(conteudo).hexdigest())
+
+    def test_arquivo_grande_demais_e_recusado(self):
+        arquivos, erros, lidos = self.enviar('grande.png', self.png(sobra=2 * 1024 * 1024))
+        self.assertNotIn('imagem', arquivos)
+        self.assertIn('limite de 1 MB', erros[0])
+        self.assertLessEqual(lidos, 1024 * 1024 + 64 * 1024)  # Parou no primeiro pedaço acima do limite
+
+    def test_bomba_de_descompressao_para_no_cabecalho(self):
+        arquivos, erros, lidos = self.enviar('bomba.png', self.bomba())
+        self.assertNotIn('imagem', arquivos)
+        self.assertIn('megapixels', erros[0])
+        self.assertLessEqual(lidos, 64 * 1024)  # Só o primeiro pedaço (de ~900 KB) passou pelo handler
+
+    def test_arquivo_que_nao_e_imagem(self):
+        arquivos, erros, _ = self.enviar('planilha.png', b'a,b,c\n1,2,3\n')
+        self.assertNotIn('imagem', arquivos)
+        self.assertIn('não é uma imagem válida', erros[0])
+        arquivos, erros, _ = self.enviar('script.js', b'alert(1)', tipo='text/javascript')
+        self.assertIn('envie uma imagem', erros[0])
+
+    def test_webp_e_avif_grandes_sao_aceitos(self):
+        # O Pillow não abre WebP/AVIF pela metade: as dimensões vêm do RIFF e da caixa ispe
+        ruido = Image.frombytes('RGB', (800, 600), os.urandom(800 * 600 * 3))
+        for formato, tipo, opcoes in [('WEBP', 'image/webp', {'quality': 90, 'exif': b'Exif\0\0'}),
+                                      ('WEBP', 'image/webp', {'lossless': True}),
+                                      ('AVIF', 'image/avif', {'quality': 95})]:
+            conteudo = io.BytesIO()
+            ruido.save(conteudo, format=formato, **opcoes)
+            self.assertGreater(len(conteudo.getvalue()), uploads.LIMITE_CABECALHO)
+            with self.settings(ECHO_UPLOAD_TAMANHO_MAXIMO=4 * 1024 * 1024):  # O sem perdas passa de 1 MB
+                arquivos, erros, _ = self.enviar(f'capa.{formato.lower()}', conteudo.getvalue(), tipo=tipo)
+            self.assertEqual(erros, [])
+            self.assertEqual(arquivos['imagem'].dimensoes, (800, 600))
+
+    def test_webp_com_dimensoes_demais(self):
+        with self.settings(ECHO_UPLOAD_PIXELS_MAXIMOS=100_000):
+            conteudo = io.BytesIO()
+            Image.new('RGB', (800, 600)).save(conteudo, format='WEBP')
+            arquivos, erros, _ = self.enviar('capa.webp', conteudo.getvalue() + b'\0' * 900_000, tipo='image/webp')
+        self.assertNotIn('imagem', arquivos)
+        self.assertIn('megapixels', erros[0])
+
+    def test_pedido_grande_demais_recebe_413_sem_parsing(self):
+        self.client.force_login(User.objects.create_user('autor', 'autor@example.com', 'senha'))
+        with self.settings(ECHO_UPLOAD_TAMANHO_MAXIMO=1000, DATA_UPLOAD_MAX_MEMORY_SIZE=1000):
+            resposta = self.client.post(reverse('Echo_app:criar_noticia'), {
+                'titulo': 'Grande', 'conteudo': 'Texto',
+                'imagem': SimpleUploadedFile('capa.png', self.png(sobra=5000), content_type='image/png'),
+            })
+        self.assertEqual(resposta.status_code, 413)
+        self.assertFalse(hasattr(resposta.wsgi_request, '_files'))  # request.FILES nunca foi montado
+        self.assertFalse(Noticia.objects.filter(titulo='Grande').exists())
+
+    def test_criar_noticia_grava_por_conteudo_e_enfileira_versoes(self):
+        autor = User.objects.create_user('autor', 'autor@example.com', 'senha')
+        self.client.force_login(autor)
+        conteudo = self.png(800, 600)
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('Echo_app:criar_noticia'), {
+                'titulo': 'Com capa', 'conteudo': 'Texto',
+                'imagem': SimpleUploadedFile('Capa Nova.PNG', conteudo, content_type='image/png'),
+            })
+        self.assertRedirects(resposta, reverse('Echo_app:dashboard'), fetch_redirect_response=False)
+        noticia = Noticia.objects.get(titulo='Com capa')
+        resumo = hashlib.sha256(conteudo).hexdigest()
+        self.assertEqual(noticia.imagem.name, f'noticias/{resumo[:2]}/{resumo}.png')
+        self.assertEqual(noticia.imagem_versoes['original'], noticia.imagem.name)  # Versões geradas pela tarefa
+
+
+# ===================== MEDIÇÃO POR REQUISIÇÃO =====================
+
+class MedicaoRequisicoesTest(TestCase):
+    """O middleware soma banco, templates e cache por rota e expõe em JSON e no formato do Prometheus."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.equipe = User.objects.create_user('equipe', 'equipe@example.com', 'senha', is_staff=True)
+        categoria = Categoria.objects.create(nome='Economia')
+        Noticia.objects.create(titulo='Juros', conteudo='texto', categoria=categoria, autor=cls.equipe)
+
+    def setUp(self):
+        cache.clear()
+        perfilamento.limpar()
+
+    def test_histogramas_por_rota(self):
+        self.client.get(reverse('Echo_app:dashboard'))
+        self.client.get(reverse('Echo_app:dashboard'))  # Cache de página (anônimo)
+        self.client.get('/nao-existe/')
+        resumo = perfilamento.resumo()
+        dashboard = resumo['Echo_app:dashboard']
+        self.assertEqual(dashboard['requisicoes'], 2)
+        self.assertEqual(dashboard['status'], {'2xx': 2})
+        self.assertGreater(dashboard['consultas_media'], 0)
+        self.assertGreater(dashboard['templates_medio_ms'], 0)
+        self.assertEqual(dashboard['cache']['acertos'], 1)
+        self.assertIsNotNone(dashboard['duracao_p95_ms'])
+        self.assertEqual(resumo['sem_rota']['status'], {'4xx': 1})
+
+    async def test_views_assincronas_tambem_contam(self):
+        await self.async_client.get(reverse('Echo_app:filtrar_noticias'), {'categoria': 'Economia'})
+        filtrar = perfilamento.resumo()['Echo_app:filtrar_noticias']
+        self.assertEqual(filtrar['requisicoes'], 1)
+        self.assertGreater(filtrar['consultas_media'], 0)  # Consultas feitas dentro de sync_to_async
+
+    def test_chamadas_externas(self):
+        def view(request):
+            with perfilamento.externa('smtp'):
+                pass
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve(reverse('Echo_app:esqueci_senha'))
+        perfilamento.MedicaoMiddleware(view)(request)
+        self.assertEqual(perfilamento.resumo()['Echo_app:esqueci_senha']['externas']['smtp']['chamadas'], 1)
+
+    @override_settings(ECHO_METRICAS_TOKEN='segredo')
+    def test_prometheus_so_para_equipe_ou_token(self):
+        self.client.get(reverse('Echo_app:dashboard'))
+        url = reverse('Echo_app:metricas_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        resposta = self.client.get(url, headers={'Authorization': 'Bearer segredo'})
+        self.assertEqual(resposta.status_code, 200)
+        texto = resposta.content.decode()
+        self.assertIn('# TYPE echo_requisicao_segundos histogram', texto)
+        self.assertIn('echo_requisicao_segundos_bucket{rota="Echo_app:dashboard",le="+Inf"} 1', texto)
+        self.assertIn('echo_requisicao_consultas_count{rota="Echo_app:dashboard"} 1', texto)
+
+        self.client.force_login(self.equipe)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertIn('Echo_app:dashboard', self.client.get(reverse('Echo_app:status_desempenho')).json())
+
+    def test_amostra_de_requisicao_lenta_vai_para_o_disco(self):
+        pasta = tempfile.mkdtemp(prefix='echo-perfis-')
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        with self.settings(ECHO_PERFIL_AMOSTRA=1, ECHO_PERFIL_LENTA_MS=0, ECHO_PERFIL_DIR=pasta):
+            self.client.get(reverse('Echo_app:dashboard'))
+        arquivos = os.listdir(pasta)
+        self.assertEqual(len(arquivos), 1)
+        self.assertRegex(arquivos[0], r'Echo_app_dashboard-\d+ms\.prof$')
+
+
+# ===================== CONSULTAS LENTAS =====================
+
+class ConsultasLentasTest(TestCase):
+    """Consultas acima do limite vão para o JSONL com impressão do SQL e a linha do app que as disparou."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+        cls.noticia = Noticia.objects.create(titulo='Chuva', conteudo='texto', autor=cls.usuario)
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp(prefix='echo-consultas-')
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        self.arquivo = os.path.join(pasta, 'consultas.jsonl')
+        configuracao = self.settings(ECHO_CONSULTAS_LENTAS_MS=0, ECHO_CONSULTAS_LENTAS_ARQUIVO=self.arquivo)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        if consultas_lentas._registrar_se_lenta not in connection.execute_wrappers:
+            # Registro desligado neste ambiente (padrão em produção): liga só durante o teste
+            connection.execute_wrappers.append(consultas_lentas._registrar_se_lenta)
+            self.addCleanup(connection.execute_wrappers.remove, consultas_lentas._registrar_se_lenta)
+
+    def test_normalizacao(self):
+        a = consultas_lentas.normalizar('SELECT * FROM "t" WHERE "id" IN (%s, %s, %s) AND  "x" = \'a\'')
+        b = consultas_lentas.normalizar('SELECT * FROM "t" WHERE "id" IN (7) AND "x" = \'b\'')
+        self.assertEqual(a, 'SELECT * FROM "t" WHERE "id" IN (...) AND "x" = ?')
+        self.assertEqual(consultas_lentas.impressao(a), consultas_lentas.impressao(b))
+        self.assertEqual(consultas_lentas.normalizar('INSERT INTO "t" VALUES (%s, %s), (%s, %s)'), 'INSERT INTO "t" VALUES (...)')
+
+    def test_registra_origem_e_agrega(self):
+        self.client.force_login(self.usuario)
+        open(self.arquivo, 'w').close()  # Só as consultas das requisições abaixo
+        self.client.get(reverse('Echo_app:noticia_detalhe', args=[self.noticia.pk]))
+        self.client.get(reverse('Echo_app:noticia_detalhe', args=[self.noticia.pk]))
+        registros = list(consultas_lentas.ler(self.arquivo))
+        self.assertTrue(registros)
+        # View assíncrona: o ORM roda em outra thread, a rota vem da medição da requisição
+        self.assertTrue(all(r['rota'] == 'Echo_app:noticia_detalhe' for r in registros))
+        self.client.post(reverse('Echo_app:curtir_noticia', args=[self.noticia.pk]))
+        registros = list(consultas_lentas.ler(self.arquivo))
+        self.assertTrue(any((r['view'] or '').startswith('Echo_app/views.py:') for r in registros))  # View síncrona
+        grupos = consultas_lentas.agregar(registros)
+        self.assertTrue(any(g['contagem'] >= 2 for g in grupos))  # A mesma consulta nas duas visitas
+
+        saida = io.StringIO()
+        call_command('consultas_lentas', top=3, stdout=saida)
+        self.assertIn('#1 [', saida.getvalue())
+        self.assertIn('rotas: Echo_app:noticia_detalhe', saida.getvalue())
+
+
+# ===================== CONEXÕES COM O BANCO =====================
+
+class ConexoesBancoTest(TestCase):
+    """ECHO_DB_CONEXOES monta o DATABASES do Postgres: pool, conexão persistente ou uma por requisição."""
+
+    def carregar_settings(self, **ambiente):
+        ambiente = {'TARGET_ENV': 'dev', 'DBNAME': 'echo', 'DBUSER': 'echo', **ambiente}
+        with mock.patch.dict(os.environ, ambiente, clear=True), mock.patch('dotenv.load_dotenv'):
+            return runpy.run_path(settings.BASE_DIR / 'Echoproject' / 'settings.py')['DATABASES']['default']
+
+    def test_pool_e_o_padrao(self):
+        banco = self.carregar_settings()
+        self.assertEqual(banco['OPTIONS']['pool'], {'min_size': 2, 'max_size': 10, 'timeout': 10.0,
+                                                    'max_lifetime': 1800.0, 'max_idle': 300.0})
+        self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('CONN_MAX_AGE', banco)  # O Django não aceita pool com conexão persistente
+
+        banco = self.carregar_settings(ECHO_DB_POOL_MAX='4', ECHO_DB_POOL_TIMEOUT='2.5')
+        self.assertEqual((banco['OPTIONS']['pool']['max_size'], banco['OPTIONS']['pool']['timeout']), (4, 2.5))
+
+    def test_persistente(self):
+        banco = self.carregar_settings(ECHO_DB_CONEXOES='persistente')
+        self.assertNotIn('pool', banco['OPTIONS'])
+        self.assertEqual(banco['CONN_MAX_AGE'], 600)
+        self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+        banco = self.carregar_settings(ECHO_DB_CONEXOES='persistente', ECHO_DB_CONN_MAX_AGE='60')
+        self.assertEqual(banco['CONN_MAX_AGE'], 60)
+
+    def test_nova(self):
+        banco = self.carregar_settings(ECHO_DB_CONEXOES='nova')
+        self.assertNotIn('pool', banco['OPTIONS'])
+        self.assertNotIn('CONN_MAX_AGE', banco)  # O padrão do Django: fecha no fim da requisição
+
+    def test_sqlite_nao_muda(self):
+        banco = self.carregar_settings(DBNAME='')
+        self.assertEqual(banco['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertNotIn('OPTIONS', banco)
+        self.assertNotIn('CONN_HEALTH_CHECKS', banco)
+
+
+# ===================== RÉPLICAS DE LEITURA =====================
+
+@override_settings(ECHO_DB_REPLICAS=['replica1', 'replica2'], ECHO_DB_FIXAR_SEGUNDOS=10)
+class ReplicasLeituraTest(TestCase):
+    """Leituras da requisição vão para uma réplica; depois de uma escrita, o usuário lê do primário."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'senha')
+
+    def requisitar(self, escrever=False, cookies=None):
+        """Passa pelo ReplicasMiddleware; devolve (bancos de leitura antes/depois da escrita, resposta)."""
+        bancos = []
+
+        def view(request):
+            bancos.append(router.db_for_read(Noticia))
+            if escrever:
+                Noticia.objects.create(titulo='Nova', conteudo='texto', autor=self.usuario)
+                bancos.append(router.db_for_read(Noticia))
+            bancos.append(router.db_for_read(Tarefa))
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return bancos, replicas.ReplicasMiddleware(view)(request)
+
+    def test_leitura_vai_para_replica(self):
+        (leitura, tarefa), resposta = self.requisitar()
+        self.assertIn(leitura, ['replica1', 'replica2'])
+        self.assertEqual(tarefa, 'default')  # A fila de tarefas fica no primário
+        self.assertNotIn(replicas.COOKIE, resposta.cookies)
+
+    def test_escrita_fixa_no_primario(self):
+        (antes, depois, _), resposta = self.requisitar(escrever=True)
+        self.assertIn(antes, ['replica1', 'replica2'])
+        self.assertEqual(depois, 'default')  # Lê o que acabou de escrever
+        self.assertEqual(resposta.cookies[replicas.COOKIE]['max-age'], 10)
+
+        (leitura, _), _ = self.requisitar(cookies={replicas.COOKIE: '1'})  # Próxima requisição, dentro da janela
+        self.assertEqual(leitura, 'default')
+
+    def test_fora_de_requisicao_le_do_primario(self):
+        self.assertEqual(router.db_for_read(Noticia), 'default')  # Worker, comandos, shell
+        self.assertEqual(router.db_for_write(Noticia), 'default')
+
+    def test_cache_no_banco_fica_no_primario(self):
+        cache_no_banco = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'echo_cache_teste'}
+        with self.settings(CACHES={'default': cache_no_banco}):
+            call_command('createcachetable', verbosity=0)
+
+            def view(request):
+                caches['default'].set('chave', 'valor')  # Roteado como o "modelo" CacheEntry do DatabaseCache
+                return HttpResponse(caches['default'].get('chave'))
+
+            resposta = replicas.ReplicasMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(resposta.content, b'valor')
+        self.assertNotIn(replicas.COOKIE, resposta.cookies)  # Gravar no cache não fixa o usuário
+
+    def test_sem_replicas_nao_grava_cookie(self):
+        with self.settings(ECHO_DB_REPLICAS=[]):
+            (antes, _, _), resposta = self.requisitar(escrever=True)
+        self.assertEqual(antes, 'default')
+        self.assertNotIn(replicas.COOKIE, resposta.cookies)
+
+    def test_curtir_fixa_o_usuario_no_primario(self):
+        noticia = Noticia.objects.create(titulo='Chuva', conteudo='texto', autor=self.usuario)
+        self.client.force_login(self.usuario)
+        with self.settings(ECHO_DB_REPLICAS=['default']):  # Requisição de verdade: a "réplica" precisa existir
+            resposta = self.client.post(reverse('Echo_app:curtir_noticia', args=[noticia.pk]))
+            self.assertIn(replicas.COOKIE, resposta.cookies)
+            self.assertNotIn(replicas.COOKIE, self.client.get(reverse('Echo_app:dashboard')).cookies)  # Só leitura
+
+
+# ===================== SESSÕES =====================
+
+class SessoesTest(TestCase):
+    """Anônimos não criam sessão no banco (nem recuperando a senha) e a sessão logada é lida do cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('leitor', 'leitor@example.com', 'Senha-antiga-1')
+        cls.noticia = Noticia.objects.create(titulo='Chuva forte', conteudo='texto', autor=cls.usuario)
+
+    def recuperacao(self):
+        """A recuperação que o navegador do teste tem em andamento (ou None)."""
+        pedido = RequestFactory().get('/')
+        pedido.COOKIES = {nome: cookie.value for nome, cookie in self.client.cookies.items()}
+        return recuperacao_senha.atual(pedido)
+
+    def pedir_codigo(self):
+        resposta = self.client.post(reverse('Echo_app:esqueci_senha'), {'email': self.usuario.email})
+        self.assertRedirects(resposta, reverse('Echo_app:verificar_codigo'), fetch_redirect_response=False)
+        return self.recuperacao()
+
+    def test_anonimo_nao_cria_sessao(self):
+        self.client.get(reverse('Echo_app:dashboard'))
+        self.client.get(reverse('Echo_app:noticia_detalhe', args=[self.noticia.pk]))
+        self.client.get(reverse('Echo_app:pesquisar_noticias'), {'q': 'chuva'})
+
+        codigo = self.pedir_codigo().codigo
+        self.client.post(reverse('Echo_app:verificar_codigo'), {'codigo': codigo})
+        resposta = self.client.post(reverse('Echo_app:redefinir_senha_final'),
+                                    {'new_password1': 'Senha-nova-123', 'new_password2': 'Senha-nova-123'})
+
+        self.assertRedirects(resposta, reverse('Echo_app:senha_concluida'), fetch_redirect_response=False)
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.check_password('Senha-nova-123'))
+        self.assertIsNone(self.recuperacao())  # O código não serve para outra troca
+        self.assertEqual(resposta.cookies[recuperacao_senha.COOKIE]['max-age'], 0)
+
+    def test_codigo_errado_demais_encerra_a_recuperacao(self):
+        self.pedir_codigo()
+        with self.settings(ECHO_OTP_TENTATIVAS=3):
+            for _ in range(2):
+                resposta = self.client.post(reverse('Echo_app:verificar_codigo'), {'codigo': 'errado'})
+                self.assertEqual(resposta.status_code, 200)
+            resposta = self.client.post(reverse('Echo_app:verificar_codigo'), {'codigo': 'errado'})
+        self.assertRedirects(resposta, reverse('Echo_app:esqueci_senha'), fetch_redirect_response=False)
+        self.assertIsNone(self.recuperacao())
+
+    def test_palpites_em_paralelo_nao_passam_do_limite(self):
+        codigo = self.pedir_codigo().codigo
+        with self.settings(ECHO_OTP_TENTATIVAS=3):
+            paralelas = [self.recuperacao() for _ in range(4)]  # Todas leram o estado antes de qualquer palpite
+            resultados = [recuperacao_senha.verificar(r, 'errado') for r in paralelas[:3]]
+            self.assertEqual(resultados, [False] * 3)
+            self.assertFalse(recuperacao_senha.verificar(paralelas[3], codigo))  # Sem vaga: nem compara
+            self.assertEqual(paralelas[3].tentativas, 3)
+        self.assertIsNone(self.recuperacao())
+
+    def test_sem_verificar_nao_troca_a_senha(self):
+        self.pedir_codigo()
+        resposta = self.client.post(reverse('Echo_app:redefinir_senha_final'),
+                                    {'new_password1': 'Senha-nova-123', 'new_password2': 'Senha-nova-123'})
+        self.assertRedirects(resposta, reverse('Echo_app:esqueci_senha'), fetch_redirect_response=False)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.check_password('Senha-antiga-1'))
+
+    def test_codigo_expira(self):
+        with self.settings(ECHO_OTP_VALIDADE=1):
+            codigo = self.pedir_codigo().codigo
+            time.sleep(1.1)
+            self.assertIsNone(self.recuperacao())
+            resposta = self.client.post(reverse('Echo_app:verificar_codigo'), {'codigo': codigo})
+        self.assertRedirects(resposta, reverse('Echo_app:esqueci_senha'), fetch_redirect_response=False)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_sessao_logada_lida_do_cache(self):
+        self.client.post(reverse('Echo_app:entrar'), {'username': 'leitor', 'password': 'Senha-antiga-1'})
+        self.assertEqual(Session.objects.count(), 1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('Echo_app:dashboard'))
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'django_session' in c['sql']])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_sessao_assinada_nao_consulta_e_troca_de_senha_invalida(self):
+        self.client.post(reverse('Echo_app:entrar'), {'username': 'leitor', 'password': 'Senha-antiga-1'})
+        self.assertEqual(Session.objects.count(), 0)
+        tabela_do_cache = settings.CACHES['compartilhado']['LOCATION']
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('Echo_app:lista_notificacoes'))
+        self.assertEqual(resposta.status_code, 200)  # Logado: a view exige login
+        self.assertFalse([c['sql'] for c in consultas.captured_queries
+                          if 'django_session' in c['sql'] or tabela_do_cache in c['sql']])
+
+        self.usuario.set_password('Senha-nova-123')
+        self.usuario.save()
+        resposta = self.client.get(reverse('Echo_app:lista_notificacoes'))
+        self.assertEqual(resposta.status_code, 302)  # O cookie antigo deixou de valer
+
+    def test_padroes_em_producao(self):
+        ambiente = {'TARGET_ENV': 'prod', 'SECRET_KEY': 'k', 'ALLOWED_HOSTS': 'localhost',
+                    'CSRF_TRUSTED_ORIGINS': 'https://localhost', 'DBNAME': 'echo'}
+        with mock.patch.dict(os.environ, ambiente, clear=True), mock.patch('dotenv.load_dotenv'):
+            producao = runpy.run_path(settings.BASE_DIR / 'Echoproject' / 'settings.py')
+        self.assertEqual(producao['SESSION_ENGINE'], 'django.contrib.sessions.backends.signed_cookies')
+        # Os códigos de recuperação precisam do add() atômico do DatabaseCache
+        self.assertEqual(producao['CACHES']['compartilhado']['BACKEND'], 'django.core.cache.backends.db.DatabaseCache')
+
+    def test_comando_medir_sessoes(self):
+        saida = io.StringIO()
+        call_command('medir_sessoes', leituras=1, stdout=saida)
+        self.assertIn('cache_banco: 0 linha(s) de sessão criadas por anônimos.', saida.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='medir_sessoes').count(), 0)  # Tudo desfeito
+
+
+# ===================== ORÇAMENTO DE CONSULTAS =====================
+
+class OrcamentoConsultasTest(TestCase):
+    """
+    Roda as rotas de ``urls.py`` (anônimo e logado, menos as de ``SEM_ORCAMENTO``)
+    sobre uma base com milhares de notícias, usuários e interações, com o cache
+    vazio, e falha se alguma passar do número máximo de consultas ou do tempo
+    máximo. Um N+1 novo aparece aqui como consultas que crescem com o tamanho
+    das listas. Rota nova sem orçamento também falha. No fim imprime as rotas
+    mais caras.
+    """
+
+    NOTICIAS = 3000
+    USUARIOS = 300
+    INTERACOES = 6000
+
+    TEMPO_MAXIMO = 1.0  # Segundos por requisição (folgado para máquinas de CI)
+
+    # Rota -> (consultas anônimo, consultas logado). Anônimo em rota com login é só o redirect.
+    ORCAMENTO = {
+        'dashboard': (5, 7),
+        'registrar': (1, 2),
+        'entrar': (0, 2),
+        'sair': (0, 2),
+        'excluir_conta': (0, 2),
+        'configuracoes_conta': (0, 2),
+        'perfil': (0, 3),
+        'perfil_editar': (0, 5),
+        'criar_noticia': (0, 9),
+        'noticia_detalhe': (3, 5),
+        'filtrar_noticias': (1, 1),
+        'pesquisar_noticias': (2, 4),
+        'autocompletar_pesquisa': (2, 2),
+        'curtir_noticia': (0, 17),  # Inclui SAVEPOINTs, afinidade (recomendações) e a tarefa de recálculo
+        'salvar_noticia': (0, 17),
+        'noticias_curtidas': (0, 4),
+        'noticias_salvas': (0, 4),
+        'lista_notificacoes': (0, 5),
+        'marcar_notificacao_lida': (0, 7),  # UPDATE condicional + contador do sino, num SAVEPOINT
+        'marcar_todas_lidas': (0, 6),
+        'esqueci_senha': (0, 2),
+        'verificar_codigo': (0, 2),
+        'redefinir_senha_final': (0, 2),
+        'reenviar_codigo': (0, 2),
+        'senha_concluida': (0, 2),
+        'status_tarefas': (0, 2),
+        'status_cache': (0, 2),
+        'status_desempenho': (0, 2),
+        'metricas_prometheus': (0, 2),
+        'jogo_da_velha': (0, 2),
+        'jogo_da_memoria': (0, 2),
+        'jogo_da_forca': (0, 2),
+        'games': (0, 2),
+    }
+
+    # Rotas que não cabem numa requisição medida, com o motivo (e onde são testadas)
+    SEM_ORCAMENTO = {
+        'eventos_notificacoes': "fluxo SSE que não termina no ASGI (e 204 no WSGI); ver PushNotificacoesTest",
+    }
+
+    resultados = []
+
+    @classmethod
+    def setUpTestData(cls):
+        import random
+
+        from django.contrib.auth.hashers import make_password
+
+        from . import busca, recomendacoes
+        from .models import HistoricoInteresse, NoticiaRelacionada, PerfilUsuario
+
+        aleatorio = random.Random(42)
+        senha = make_password('senha-de-teste')
+        categorias = Categoria.objects.bulk_create([Categoria(nome=f'Categoria {i}') for i in range(12)])
+        User.objects.bulk_create([
+            User(username=f'usuario{i}', email=f'usuario{i}@example.com', password=senha) for i in range(cls.USUARIOS)
+        ])
+        usuarios = list(User.objects.order_by('pk'))
+        perfis = PerfilUsuario.objects.bulk_create([PerfilUsuario(usuario=u) for u in usuarios])
+        PerfilUsuario.categorias_de_interesse.through.objects.bulk_create([
+            PerfilUsuario.categorias_de_interesse.through(perfilusuario_id=perfil.pk, categoria_id=categoria.pk)
+            for perfil in perfis for categoria in aleatorio.sample(categorias, 3)
+        ])
+
+        palavras = 'eleição governo futebol campeonato inflação juros saúde vacina chuva trânsito escola show'.split()
+        noticias = Noticia.objects.bulk_create([
+            Noticia(
+                titulo=' '.join(aleatorio.sample(palavras, 4)).capitalize(),
+                conteudo=' '.join(aleatorio.choices(palavras, k=120)),
+                autor=aleatorio.choice(usuarios[:20]),
+                categoria=aleatorio.choice(categorias),
+                urgente=aleatorio.random() < 0.1,
+                curtidas_count=aleatorio.randint(0, 50),
+            )
+            for _ in range(cls.NOTICIAS)
+        ])
+        pares = {(aleatorio.choice(usuarios).pk, aleatorio.choice(noticias).pk, aleatorio.choice(['CURTIDA', 'SALVAMENTO']))
+                 for _ in range(cls.INTERACOES)}
+        InteracaoNoticia.objects.bulk_create([InteracaoNoticia(usuario_id=u, noticia_id=n, tipo=t) for u, n, t in pares])
+
+        cls.leitor = usuarios[-1]
+        cls.noticia = noticias[0]
+        InteracaoNoticia.objects.bulk_create([
+            InteracaoNoticia(usuario=cls.leitor, noticia=noticia, tipo=tipo)
+            for noticia in noticias[1:151] for tipo in ('CURTIDA', 'SALVAMENTO')
+        ], ignore_conflicts=True)
+        notificacoes = Notificacao.objects.bulk_create([
+            Notificacao(usuario=cls.leitor, noticia=noticia, manchete=noticia.titulo, lida=i % 2 == 0)
+            for i, noticia in enumerate(noticias[:300])
+        ])
+        cls.notificacao = next(n for n in notificacoes if not n.lida)
+        HistoricoInteresse.objects.bulk_create([
+            HistoricoInteresse(usuario=cls.leitor, categoria=categoria, pontuacao=10 - i)
+            for i, categoria in enumerate(categorias[:3])
+        ])
+        recomendacoes.recalcular(cls.leitor.pk)
+        NoticiaRelacionada.objects.bulk_create([
+            NoticiaRelacionada(noticia=cls.noticia, relacionada=relacionada, similaridade=0.5, posicao=i)
+            for i, relacionada in enumerate(noticias[1:7])
+        ])
+        busca.reconstruir()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if not cls.resultados:
+            return
+        piores = sorted(cls.resultados, key=lambda r: (r['consultas'], r['segundos']), reverse=True)[:10]
+        linhas = [f"\n{'rota':<28}{'usuário':<10}{'status':>7}{'consultas':>11}{'ms':>9}"]
+        for r in piores:
+            linhas.append(f"{r['rota']:<28}{r['usuario']:<10}{r['status']:>7}{r['consultas']:>11}{r['segundos'] * 1000:>9.1f}")
+        print('\nRotas mais caras (cache vazio):' + '\n'.join(linhas))
+
+    def rotas(self):
+        # (nome da URL, kwargs da URL, método, dados)
+        return [
+            ('dashboard', {}, 'get', {}),
+            ('registrar', {}, 'get', {}),
+            ('entrar', {}, 'get', {}),
+            ('sair', {}, 'get', {}),
+            ('excluir_conta', {}, 'get', {}),
+            ('configuracoes_conta', {}, 'get', {}),
+            ('perfil', {}, 'get', {}),
+            ('perfil_editar', {}, 'get', {}),
+            ('criar_noticia', {}, 'post', {'titulo': 'Nova', 'conteudo': 'Texto', 'categoria': self.noticia.categoria_id}),
+            ('noticia_detalhe', {'pk': self.noticia.pk}, 'get', {}),
+            ('filtrar_noticias', {}, 'get', {'categoria': 'Categoria 1'}),
+            ('pesquisar_noticias', {}, 'get', {'q': 'eleição'}),
+            ('autocompletar_pesquisa', {}, 'get', {'q': 'ele'}),
+            ('curtir_noticia', {'noticia_id': self.noticia.pk}, 'post', {}),
+            ('salvar_noticia', {'noticia_id': self.noticia.pk}, 'post', {}),
+            ('noticias_curtidas', {}, 'get', {}),
+            ('noticias_salvas', {}, 'get', {}),
+            ('lista_notificacoes', {}, 'get', {}),
+            ('marcar_notificacao_lida', {'notificacao_id': self.notificacao.pk}, 'post', {}),
+            ('marcar_todas_lidas', {}, 'post', {}),
+            ('esqueci_senha', {}, 'get', {}),
+            ('verificar_codigo', {}, 'get', {}),
+            ('redefinir_senha_final', {}, 'get', {}),
+            ('reenviar_codigo', {}, 'get', {}),
+            ('senha_concluida', {}, 'get', {}),
+            ('status_tarefas', {}, 'get', {}),
+            ('status_cache', {}, 'get', {}),
+            ('status_desempenho', {}, 'get', {}),
+            ('metricas_prometheus', {}, 'get', {}),
+            ('jogo_da_velha', {}, 'get', {}),
+            ('jogo_da_memoria', {}, 'get', {}),
+            ('jogo_da_forca', {}, 'get', {}),
+            ('games', {}, 'get', {}),
+        ]
+
+    def medir(self, logado):
+        import time
+
+        from django.core.cache import cache
+        from django.test import Client
+
+        for nome, kwargs, metodo, dados in self.rotas():
+            with self.subTest(rota=nome, logado=logado):
+                cliente = Client()
+                if logado:
+                    cliente.force_login(self.leitor)
+                cache.clear()
+                url = reverse(f'Echo_app:{nome}', kwargs=kwargs)
+                inicio = time.perf_counter()
+                with CaptureQueriesContext(connection) as consultas:
+                    resposta = getattr(cliente, metodo)(url, dados)
+                segundos = time.perf_counter() - inicio
+
+                self.resultados.append({
+                    'rota': nome, 'usuario': 'logado' if logado else 'anônimo', 'status': resposta.status_code,
+                    'consultas': len(consultas), 'segundos': segundos,
+                })
+                self.assertLess(resposta.status_code, 500)
+                maximo = self.ORCAMENTO[nome][1 if logado else 0]
+                self.assertLessEqual(
+                    len(consultas), maximo,
+                    f"{nome}: {len(consultas)} consultas (máximo {maximo}):\n"
+                    + '\n'.join(c['sql'][:200] for c in consultas.captured_queries),
+                )
+                self.assertLess(segundos, self.TEMPO_MAXIMO, f"{nome}: {segundos:.3f}s")
+
+    def test_todas_as_rotas_tem_orcamento(self):
+        from .urls import urlpatterns
+
+        medidas = [nome for nome, *_ in self.rotas()]
+        self.assertEqual(set(medidas), set(self.ORCAMENTO))
+        self.assertFalse(set(medidas) & set(self.SEM_ORCAMENTO))
+        self.assertEqual({rota.name for rota in urlpatterns}, set(medidas) | set(self.SEM_ORCAMENTO))
+
+    def test_rotas_anonimo(self):
+        self.medir(logado=False)
+
+    def test_rotas_logado(self):
+        self.medir(logado=True)
@@ -0,0 +1,239 @@
+"""
+Upload de imagens em streaming, validado enquanto os bytes chegam (``criar_noticia``).
+
+O ``UploadDeImagem`` substitui os handlers padrão do Django na requisição:
+
+- grava cada pedaço num arquivo temporário (memória constante, qualquer tamanho);
+- calcula o SHA-256 no caminho, para o nome por conteúdo (``armazenamento.py``)
+  sair sem reler o arquivo;
+- recusa cedo: pelo ``Content-Length`` do pedido (a view responde 413 sem ler
+  o corpo), pelo tipo declarado e, assim que o cabeçalho da imagem chega
+  (primeiros KB), pelo formato real e pelas dimensões. Uma "bomba de
+  descompressão" (PNG de poucos KB com 50.000 x 50.000 px) é descartada sem
+  ser decodificada; o resto do arquivo é só consumido e jogado fora.
+
+O Pillow não abre WebP nem AVIF pela metade, então as dimensões deles saem
+daqui mesmo: do bloco VP8/VP8L/VP8X do RIFF e das caixas ``ispe`` do ISOBMFF.
+Um AVIF com a caixa ``meta`` depois dos pixels (raro) só é conferido no fim,
+pelo arquivo temporário.
+
+Gerar as versões (decodificar, redimensionar, codificar) fica para a fila de
+tarefas (``imagens.processar``), fora da requisição.
+
+Como o handler precisa ser trocado antes de ``request.POST`` ser lido, a view
+usa ``csrf_exempt`` por fora e ``csrf_protect`` por dentro (receita da
+documentação do Django para upload handlers).
+"""
+
+import hashlib
+import io
+import struct
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, StopFutureHandlers, TemporaryFileUploadHandler
+from PIL import Image
+
+LIMITE_CABECALHO = 256 * 1024  # Bytes lidos à procura das dimensões (EXIF grande no JPEG vem antes delas)
+
+TIPOS_ACEITOS = {'image/jpeg', 'image/png', 'image/webp', 'image/avif', 'image/gif'}
+FORMATOS_ACEITOS = {'JPEG', 'PNG', 'WEBP', 'AVIF', 'GIF'}
+MARCAS_AVIF = {b'avif', b'avis'}
+
+
+def tamanho_maximo_do_pedido():
+    """Maior corpo aceito em criar_noticia: uma imagem no limite mais os campos de texto."""
+    return settings.ECHO_UPLOAD_TAMANHO_MAXIMO + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+
+
+def _dimensoes_webp(dados):
+    """(largura, altura) do primeiro bloco do RIFF; None enquanto ele não chegou inteiro."""
+    if len(dados) < 30:
+        return None
+    bloco = dados[12:16]
+    if bloco == b'VP8X':  # Estendido: tamanho da tela em 24 bits, menos 1
+        return int.from_bytes(dados[24:27], 'little') + 1, int.from_bytes(dados[27:30], 'little') + 1
+    if bloco == b'VP8L' and dados[20] == 0x2F:  # Sem perdas: 14 bits cada, menos 1
+        bits = int.from_bytes(dados[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if bloco == b'VP8 ' and dados[23:26] == b'\x9d\x01\x2a':  # Com perdas: depois do código de início do quadro
+        return int.from_bytes(dados[26:28], 'little') & 0x3FFF, int.from_bytes(dados[28:30], 'little') & 0x3FFF
+    raise ValueError('WebP sem bloco de imagem')
+
+
+def _caixas(dados, inicio, fim):
+    """(tipo, início do conteúdo, fim) de cada caixa ISOBMFF em dados[inicio:fim]; o fim da última pode passar do que chegou."""
+    while inicio + 8 <= min(fim, len(dados)):
+        tamanho, tipo = struct.unpack('>I4s', dados[inicio:inicio + 8])
+        cabecalho = 8
+        if tamanho == 1:  # Tamanho de 64 bits logo depois do tipo
+            if inicio + 16 > len(dados):
+                return
+            tamanho, cabecalho = struct.unpack('>Q', dados[inicio + 8:inicio + 16])[0], 16
+        elif tamanho == 0:  # Vai até o fim do arquivo
+            tamanho = fim - inicio
+        if tamanho < cabecalho:
+            raise ValueError('caixa ISOBMFF inválida')
+        yield tipo, inicio + cabecalho, inicio + tamanho
+        inicio += tamanho
+
+
+def _filhas(dados, tipo, inicio, fim):
+    return [(c, f) for t, c, f in _caixas(dados, inicio, fim) if t == tipo]
+
+
+def _dimensoes_avif(dados):
+    """Maior ``ispe`` (meta > iprp > ipco) de um AVIF; None enquanto a caixa meta não chegou inteira."""
+    for tipo, conteudo, fim in _caixas(dados, 0, float('inf')):
+        if tipo == b'ftyp':
+            marcas = {dados[i:i + 4] for i in range(conteudo, min(fim, len(dados)), 4)}  # Principal, versão, compatíveis
+            if not marcas & MARCAS_AVIF:
+                raise ValueError('ISOBMFF que não é AVIF')
+        elif tipo == b'meta':
+            if fim > len(dados):
+                return None
+            tamanhos = [
+                struct.unpack('>II', dados[c + 4:c + 12])  # Depois de versão e flags
+                for c1, f1 in _filhas(dados, b'iprp', conteudo + 4, fim)  # meta também tem versão e flags
+                for c2, f2 in _filhas(dados, b'ipco', c1, f1)
+                for c, f in _filhas(dados, b'ispe', c2, f2) if f - c >= 12
+            ]
+            if not tamanhos:
+                raise ValueError('AVIF sem ispe')
+            return max(tamanhos, key=lambda t: t[0] * t[1])  # Grade, miniatura, alfa: vale a maior
+        if fim > len(dados):  # Ex.: mdat antes do meta; não dá para pular o que não chegou
+            return None
+    return None
+
+
+def ler_cabecalho(dados):
+    """(formato, (largura, altura)) pelos primeiros bytes; None enquanto faltam bytes; ValueError se não é imagem."""
+    if len(dados) < 32:
+        return None
+    if dados[:4] == b'RIFF' and dados[8:12] == b'WEBP':
+        dimensoes = _dimensoes_webp(dados)
+        return dimensoes and ('WEBP', dimensoes)
+    if dados[4:8] == b'ftyp':
+        dimensoes = _dimensoes_avif(dados)
+        return dimensoes and ('AVIF', dimensoes)
+    try:
+        # Image.open só lê o cabeçalho (formato e tamanho); os pixels não são decodificados
+        with Image.open(io.BytesIO(dados)) as imagem:
+            return imagem.format, imagem.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:  # Cabeçalho ainda incompleto (ou não é imagem): decide no LIMITE_CABECALHO
+        return None
+
+
+class UploadDeImagem(TemporaryFileUploadHandler):
+    """Upload handler que valida imagem a imagem; os arquivos recusados não entram em ``request.FILES``."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.erros = []  # Mensagens para a view mostrar
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Pedido inteiro grande demais até para imagem + campos de texto (criar_noticia já responde 413 antes)
+        self.pedido_grande_demais = content_length > tamanho_maximo_do_pedido()
+
+    def _recusar(self, mensagem):
+        self.erros.append(mensagem)
+        raise SkipFile()  # O parser consome o resto deste arquivo sem guardar nada
+
+    def _grande_demais(self):
+        self._recusar(f"{self.file_name}: a imagem passa do limite de {settings.ECHO_UPLOAD_TAMANHO_MAXIMO / 1024 / 1024:.0f} MB.")
+
+    def _mensagem_dimensoes(self):
+        return f"{self.file_name}: as dimensões passam do limite de {settings.ECHO_UPLOAD_PIXELS_MAXIMOS / 1e6:.0f} megapixels."
+
+    def _dimensoes_demais(self):
+        self._recusar(self._mensagem_dimensoes())
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.file_name = file_name
+        # content_length do próprio arquivo raramente vem do navegador, mas se vier já decide
+        if getattr(self, 'pedido_grande_demais', False) or (content_length or 0) > settings.ECHO_UPLOAD_TAMANHO_MAXIMO:
+            self._grande_demais()
+        if content_type not in TIPOS_ACEITOS:
+            self._recusar(f"{file_name}: envie uma imagem JPEG, PNG, WebP, AVIF ou GIF.")
+
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.resumo = hashlib.sha256()
+        self.cabecalho = b''
+        self.dimensoes = None
+        self.adiado = False  # AVIF com o meta depois dos pixels: confere em file_complete
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.ECHO_UPLOAD_TAMANHO_MAXIMO:
+            self._grande_demais()  # Para no primeiro pedaço que passa do limite
+        if self.dimensoes is None and not self.adiado:
+            self._verificar_cabecalho(raw_data)
+        self.resumo.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)  # Grava no arquivo temporário (retorna None)
+
+    def _problema(self, formato, largura, altura):
+        """Mensagem de recusa para o formato e as dimensões lidos, ou None."""
+        if formato not in FORMATOS_ACEITOS:
+            return f"{self.file_name}: formato {formato} não aceito."
+        if largura * altura > settings.ECHO_UPLOAD_PIXELS_MAXIMOS:
+            return self._mensagem_dimensoes()
+        return None
+
+    def _verificar_cabecalho(self, raw_data):
+        self.cabecalho += raw_data
+        try:
+            lido = ler_cabecalho(self.cabecalho)
+        except Image.DecompressionBombError:
+            self._dimensoes_demais()  # Muito além até do limite do próprio Pillow
+        except (ValueError, struct.error):
+            self._recusar(f"{self.file_name}: o arquivo não é uma imagem válida.")
+        if lido is None:
+            if len(self.cabecalho) >= LIMITE_CABECALHO:
+                if self.cabecalho[4:8] == b'ftyp':  # AVIF com o meta no fim
+                    self.adiado = True
+                    self.cabecalho = b''
+                    return
+                self._recusar(f"{self.file_name}: o arquivo não é uma imagem válida.")
+            return
+        self.cabecalho = b''
+        formato, (largura, altura) = lido
+        problema = self._problema(formato, largura, altura)
+        if problema:
+            self._recusar(problema)
+        self.dimensoes = (largura, altura)
+
+    def _verificar_arquivo_inteiro(self):
+        """Para os adiados: o Pillow lê o cabeçalho do arquivo temporário já completo."""
+        self.file.seek(0)
+        try:
+            with Image.open(self.file) as imagem:
+                formato, (largura, altura) = imagem.format, imagem.size
+        except Image.DecompressionBombError:
+            return self._mensagem_dimensoes()
+        except Exception:
+            return f"{self.file_name}: o arquivo não é uma imagem válida."
+        self.dimensoes = (largura, altura)
+        return self._problema(formato, largura, altura)
+
+    def file_complete(self, file_size):
+        problema = None
+        if self.adiado:
+            problema = self._verificar_arquivo_inteiro()
+        elif self.dimensoes is None:  # Arquivo pequeno que terminou sem um cabeçalho de imagem reconhecível
+            problema = f"{self.file_name}: o arquivo não é uma imagem válida."
+        if problema:
+            self.erros.append(problema)
+            self.upload_interrupted()  # Apaga o temporário; sem retorno, o arquivo não entra em FILES
+            del self.file
+            return None
+        arquivo = super().file_complete(file_size)
+        del self.file  # Senão o parser fecha (e apaga) este arquivo se um próximo for recusado
+        arquivo.sha256 = self.resumo.hexdigest()
+        arquivo.dimensoes = self.dimensoes
+        return arquivo
+
+
+def erros(request):
+    """Mensagens dos arquivos recusados pelo ``UploadDeImagem`` nesta requisição."""
+    return [erro for handler in request.upload_handlers if isinstance(handler, UploadDeImagem) for erro in handler.erros]
@@ -21,6 +21,7 @@ urlpatterns = [
     path('noticia/<int:pk>/', views.NoticiaDetalheView.as_view(), name='noticia_detalhe'),
     path('filtrar-noticias/', views.filtrar_noticias, name='filtrar_noticias'),
     path('pesquisar/', views.pesquisar_noticias, name='pesquisar_noticias'),
+    path('pesquisar/sugestoes/', views.autocompletar_pesquisa, name='autocompletar_pesquisa'),
     
     # --- Interações (Curtir/Salvar) ---
     path('noticia/<int:noticia_id>/curtir/', views.curtir_noticia, name='curtir_noticia'),
@@ -32,6 +33,7 @@ urlpatterns = [
     path('notificacoes/', views.lista_notificacoes, name='lista_notificacoes'),
     path('notificacoes/ler/<int:notificacao_id>/', views.marcar_notificacao_lida, name='marcar_notificacao_lida'),
     path('notificacoes/ler-todas/', views.marcar_todas_lidas, name='marcar_todas_lidas'),
+    path('notificacoes/eventos/', views.eventos_notificacoes, name='eventos_notificacoes'),  # Push (SSE, ASGI)
 
     # 🔑 --- RECUPERAÇÃO DE SENHA (AGORA COMPLETO) --- 🔑
     path('esqueci-senha/', views.iniciar_redefinicao_otp, name='esqueci_senha'),
@@ -40,6 +42,12 @@ urlpatterns = [
     path('reenviar-codigo/', views.reenviar_codigo, name='reenviar_codigo'),
     path('senha-concluida/', views.senha_concluida, name='senha_concluida'), # Adição da nova URL
 
+    # --- Status interno (equipe) ---
+    path('tarefas/status/', views.status_tarefas, name='status_tarefas'),
+    path('cache/status/', views.status_cache, name='status_cache'),
+    path('desempenho/status/', views.status_desempenho, name='status_desempenho'),
+    path('desempenho/metricas/', views.metricas_prometheus, name='metricas_prometheus'),  # Prometheus
+
     # --- Jogos ---
     path('games/jogo-da-velha/', views.jogo_da_velha_view, name='jogo_da_velha'),
     path('games/memoria/', views.jogo_da_memoria, name='jogo_da_memoria'),
@@ -1,27 +1,32 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.views.generic import DetailView
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, Http404, StreamingHttpResponse
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Max, Q
 from django.contrib import messages
 from django.contrib.auth.forms import SetPasswordForm, PasswordChangeForm
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.crypto import constant_time_compare
+from asgiref.sync import sync_to_async
+
+import asyncio
 
-# --- IMPORTS PARA AVATARES E RECUPERAÇÃO DE SENHA ---
-import os
+# --- IMPORTS PARA RECUPERAÇÃO DE SENHA ---
 import random  # Para gerar o código OTP
-from django.conf import settings
-from django.core.files import File
-from django.core.mail import send_mail 
-from django.template.loader import render_to_string # NOVO: Para renderizar o template de email
-from django.utils.html import strip_tags # NOVO: Para criar a versão texto do email
 # ----------------------------------------------------
 
 from .models import (Noticia, InteracaoNoticia, Notificacao, PerfilUsuario, Categoria)
+from . import (armazenamento, autocompletar, avatares, busca, cache_paginas, cache_segmentos, contadores, emails, imagens,
+               notificacoes, paginacao, perfilamento, push, recomendacoes, recuperacao_senha, relacionadas, tarefas,
+               uploads)
 
 User = get_user_model()
 
@@ -169,38 +174,19 @@ def iniciar_redefinicao_otp(request):
             # Gera um código de 6 dígitos
             otp = random.randint(100000, 999999)
             
-            # Salva na sessão: ID do usuário e o código OTP
-            request.session['reset_user_id'] = user.pk
-            request.session['otp_code'] = str(otp) 
-            
             # --- DEBUG: Mostra o código no terminal ---
             print(f"\n[DEBUG] CÓDIGO DE RECUPERAÇÃO PARA {email}: {otp}\n")
             # ------------------------------------------
             
-            # NOVO: Renderiza o template de email
-            email_context = {
-                'otp': otp,
-                'user': user,
-                'email_titulo': 'Código de Recuperação de Senha'
-            }
-            html_message = render_to_string('Echo_app/otp_email_body.html', email_context)
-            plain_message = strip_tags(html_message)
-            
-            try:
-                send_mail(
-                    'Seu Código de Recuperação de Senha - Echo',
-                    plain_message, # Corpo do e-mail em texto
-                    None, # Usa DEFAULT_FROM_EMAIL
-                    [email],
-                    html_message=html_message, # Corpo do e-mail em HTML
-                    fail_silently=False,
-                )
-                messages.success(request, f"Código de verificação enviado para {email}.")
-            except Exception as e:
-                messages.error(request, f"Erro ao enviar e-mail. Verifique a configuração SMTP. [DEBUG: {e}]")
-            
             # Redireciona para a página de inserção do código (verificar_codigo)
-            return redirect('Echo_app:verificar_codigo')
+            response = redirect('Echo_app:verificar_codigo')
+            # Guarda ID do usuário e código OTP no cache, com validade (não na sessão)
+            recuperacao = recuperacao_senha.iniciar(response, user.pk, str(otp))
+            
+            # Envio do e-mail vai para a fila de tarefas (não espera o SMTP); a tarefa leva só o token
+            emails.enviar_codigo_otp.enfileirar(usuario_id=user.pk, token=recuperacao.token)
+            messages.success(request, f"Código de verificação enviado para {email}.")
+            return response
             
         except User.DoesNotExist:
             messages.error(request, "Este e-mail não está cadastrado.")
@@ -215,23 +201,24 @@ def iniciar_redefinicao_otp(request):
 # ----------------------------------------------------------------------
 
 def verificar_codigo(request):
-    # Garante que há um usuário na sessão para evitar erros
-    user_pk = request.session.get('reset_user_id')
-    if not user_pk:
+    # Garante que há uma recuperação em andamento (e dentro da validade) para evitar erros
+    recuperacao = recuperacao_senha.atual(request)
+    if recuperacao is None:
         messages.error(request, "Sessão de redefinição expirada ou inválida. Reinicie o processo.")
-        return redirect('Echo_app:iniciar_redefinicao_otp')
+        return redirect('Echo_app:esqueci_senha')
         
     if request.method == 'POST':
         otp_digitado = request.POST.get('codigo')
-        otp_sessao = request.session.get('otp_code')
         
-        if otp_sessao and str(otp_digitado) == str(otp_sessao):
-            # Adiciona flag de verificação para a próxima etapa (segurança)
-            request.session['otp_verified'] = True
+        # Se confere, marca a recuperação como verificada para a próxima etapa (segurança)
+        if recuperacao_senha.verificar(recuperacao, otp_digitado):
             messages.success(request, "Código verificado com sucesso! Por favor, defina sua nova senha.")
             
             # Redireciona para a tela final de nova senha
             return redirect('Echo_app:redefinir_senha_final')
+        elif recuperacao.esgotada():
+            messages.error(request, "Muitas tentativas com código errado. Peça um novo código.")
+            return redirect('Echo_app:esqueci_senha')
         else:
             messages.error(request, "Código inválido ou expirado.")
             
@@ -250,18 +237,18 @@ def redefinir_senha_final(request):
     Permite ao usuário definir uma nova senha após a verificação bem-sucedida do código OTP.
     """
     
-    user_pk = request.session.get('reset_user_id')
-    otp_verified = request.session.get('otp_verified', False) # Verifica se o OTP foi checado
+    recuperacao = recuperacao_senha.atual(request)
     
-    if not user_pk or not otp_verified:
+    # Verifica se o OTP foi checado
+    if recuperacao is None or not recuperacao.verificado:
         messages.error(request, "Acesso negado. Por favor, complete a verificação do código.")
-        return redirect('Echo_app:iniciar_redefinicao_otp')
+        return redirect('Echo_app:esqueci_senha')
         
     try:
-        user = User.objects.get(pk=user_pk)
+        user = User.objects.get(pk=recuperacao.usuario_id)
     except User.DoesNotExist:
         messages.error(request, "Erro ao encontrar usuário. Reinicie o processo.")
-        return redirect('Echo_app:iniciar_redefinicao_otp')
+        return redirect('Echo_app:esqueci_senha')
         
     if request.method == 'POST':
         # Usa o formulário nativo do Django (SetPasswordForm)
@@ -269,17 +256,14 @@ def redefinir_senha_final(request):
         
         if form.is_valid():
             form.save()
-            
-            # Limpa TODAS as chaves de sessão relacionadas
-            del request.session['reset_user_id']
-            if 'otp_code' in request.session:
-                del request.session['otp_code']
-            if 'otp_verified' in request.session:
-                del request.session['otp_verified']
 
             # NOVO: Redireciona para a tela de conclusão (senha_concluida.html)
             messages.success(request, "Sua senha foi redefinida com sucesso!")
-            return redirect('Echo_app:senha_concluida') 
+            response = redirect('Echo_app:senha_concluida')
+            
+            # Apaga a recuperação (o código não serve mais) e o cookie dela
+            recuperacao_senha.encerrar(recuperacao, response)
+            return response
         
         messages.error(request, "Erro ao redefinir a senha. Verifique se as senhas são fortes e coincidem.")
         
@@ -309,39 +293,20 @@ def senha_concluida(request):
 
 def reenviar_codigo(request):
     """
-    Reenvia o código OTP usando o ID de usuário e OTP já armazenados na sessão.
+    Reenvia o código OTP usando o ID de usuário e OTP já armazenados na recuperação em andamento.
     """
-    user_pk = request.session.get('reset_user_id')
-    otp = request.session.get('otp_code')
+    recuperacao = recuperacao_senha.atual(request)
     
-    if not user_pk or not otp:
+    if recuperacao is None:
         messages.error(request, "Sessão expirada. Por favor, reinicie a redefinição de senha.")
-        return redirect('Echo_app:iniciar_redefinicao_otp')
+        return redirect('Echo_app:esqueci_senha')
 
     try:
-        user = User.objects.get(pk=user_pk)
+        user = User.objects.get(pk=recuperacao.usuario_id)
         
-        # Reenvia o e-mail com o mesmo código OTP, usando o template HTML
-        email_context = {
-            'otp': otp,
-            'user': user,
-            'email_titulo': 'Reenvio de Código de Recuperação de Senha'
-        }
-        html_message = render_to_string('Echo_app/otp_email_body.html', email_context)
-        plain_message = strip_tags(html_message)
-
-        try:
-            send_mail(
-                'Reenvio do Seu Código de Recuperação de Senha - Echo',
-                plain_message,
-                None,
-                [user.email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-            messages.success(request, f"Um novo código foi reenviado para {user.email}.")
-        except Exception:
-            messages.error(request, "Erro ao tentar reenviar o e-mail. Verifique a configuração SMTP.")
+        # Reenvia o e-mail com o mesmo código OTP (pela fila de tarefas); a validade não muda
+        emails.enviar_codigo_otp.enfileirar(usuario_id=user.pk, token=recuperacao.token, reenvio=True)
+        messages.success(request, f"Um novo código foi reenviado para {user.email}.")
             
     except User.DoesNotExist:
         messages.error(request, "Erro: Usuário não encontrado na sessão.")
@@ -354,39 +319,88 @@ def reenviar_codigo(request):
 # DASHBOARD E OUTROS (Não alterados)
 # ===============================================
 
-def dashboard(request):
-    user = request.user
-    categorias_interesse = []
-    noticias_recomendadas_list = []
-
-    if user.is_authenticated:
-        try:
-            perfil = user.perfil 
-            categorias_interesse = perfil.categorias_de_interesse.all()
-        except PerfilUsuario.DoesNotExist:
-            perfil, created = PerfilUsuario.objects.get_or_create(usuario=user)
-        noticias_recomendadas_list = Noticia.recomendar_para(user)[:3]
-    else:
-        noticias_recomendadas_list = Noticia.objects.order_by('-curtidas_count')[:3]
-    
+# Views de leitura assíncronas (ORM async): sob ASGI uma requisição esperando o
+# banco ou o cache não prende um worker, e consultas independentes saem juntas.
+
+async def _ausuario(request):
+    # Resolve o usuário da sessão sem bloquear o loop e deixa em request.user para os templates
+    usuario = await request.auser()
+    request.user = usuario
+    return usuario
+
+async def _aperfil(usuario):
+    # O BackendComPerfil já traz o perfil junto com o usuário; só sessões antigas pagam a consulta
+    if User.perfil.related.is_cached(usuario):
+        perfil = User.perfil.related.get_cached_value(usuario)
+        if perfil is not None:
+            return perfil
+    perfil, created = await PerfilUsuario.objects.aget_or_create(usuario=usuario)
+    return perfil
+
+async def _alista(queryset):
+    return [item async for item in queryset]
+
+async def _ou_none(corrotina):
+    # Um bloco que falhar some da página em vez de derrubar o dashboard inteiro
     try:
-        urgentes_qs = Noticia.objects.filter(urgente=True).order_by('-data_publicacao')
-        if noticias_recomendadas_list:
-            ids_excluidos = [n.id for n in noticias_recomendadas_list]
-            urgentes_qs = urgentes_qs.exclude(id__in=ids_excluidos)
-        noticias_urgentes = urgentes_qs[:5] 
+        return await corrotina
     except Exception:
-        noticias_urgentes = None
+        return None
+
+async def _arender(request, template_name, context):
+    # Templates e context processors são síncronos: renderiza fora do event loop
+    return await sync_to_async(render)(request, template_name, context)
+
+async def _ultima_alteracao_noticias(request, **kwargs):
+    return (await Noticia.objects.aaggregate(ultima=Max('data_atualizacao')))['ultima']
+
+@cache_paginas.cache_anonimo('dashboard', lambda request, **kwargs: ['noticia', 'categoria'], _ultima_alteracao_noticias)
+async def dashboard(request):
+    user = await _ausuario(request)
+
+    async def interesse():
+        if not user.is_authenticated:
+            return []
+        perfil = await _aperfil(user)
+        return await cache_segmentos.aobter(
+            'categorias_interesse', ['categoria', f'perfil:{user.pk}'],
+            lambda: _alista(perfil.categorias_de_interesse.all()), identificador=user.pk,
+        )
 
-    try:
-        ultimas_noticias = Noticia.objects.filter(urgente=False).order_by('-data_publicacao')[:5]
-    except Exception:
-        ultimas_noticias = None
-        
-    try:
-        categorias_para_filtro = Categoria.objects.all()
-    except Exception:
-        categorias_para_filtro = None
+    async def recomendadas():
+        lista = []
+        if user.is_authenticated:
+            # Lista pré-calculada em recomendacoes.py (uma consulta pelo índice)
+            lista = await cache_segmentos.aobter(
+                'recomendadas', ['noticia', 'categoria'] + recomendacoes.dependencias(user.pk),
+                lambda: recomendacoes.apara(user, limite=3), identificador=user.pk,
+            )
+        if not lista:  # Anônimo ou usuário ainda sem afinidades: as mais curtidas
+            lista = await cache_segmentos.aobter(
+                'recomendadas_anonimo', ['noticia', 'categoria'],
+                lambda: _alista(Noticia.objects.select_related('categoria').order_by('-curtidas_count')[:3]),
+            )
+        return lista
+
+    # Cada bloco vem do cache de segmentos; os que faltarem são buscados ao mesmo tempo
+    categorias_interesse, noticias_recomendadas_list, urgentes, ultimas_noticias, categorias_para_filtro = await asyncio.gather(
+        interesse(),
+        recomendadas(),
+        # Busca algumas urgentes a mais para ainda sobrarem 5 depois de tirar as recomendadas
+        _ou_none(cache_segmentos.aobter(
+            'urgentes', ['noticia', 'categoria'],
+            lambda: _alista(Noticia.objects.filter(urgente=True).select_related('categoria').order_by('-data_publicacao')[:8]),
+        )),
+        _ou_none(cache_segmentos.aobter(
+            'ultimas', ['noticia', 'categoria'],
+            lambda: _alista(Noticia.objects.filter(urgente=False).select_related('categoria').order_by('-data_publicacao')[:5]),
+        )),
+        _ou_none(cache_segmentos.aobter('categorias', ['categoria'], lambda: _alista(Categoria.objects.all()))),
+    )
+    noticias_urgentes = None
+    if urgentes is not None:
+        ids_excluidos = {n.id for n in noticias_recomendadas_list}
+        noticias_urgentes = [n for n in urgentes if n.id not in ids_excluidos][:5]
 
     context = {
         "nome": user.first_name or user.username if user.is_authenticated else "Visitante",
@@ -399,38 +413,67 @@ def dashboard(request):
         "usuario_autenticado": user.is_authenticated,
     }
     template_name = "Echo_app/dashboard.html" if user.is_authenticated else "Echo_app/dashboard_off.html"
-    return render(request, template_name, context)
+    return await _arender(request, template_name, context)
+
+
+@staff_member_required
+def status_cache(request):
+    # Acertos e falhas do cache de segmentos neste processo (só para a equipe)
+    return JsonResponse(cache_segmentos.metricas())
+
+
+@staff_member_required
+def status_desempenho(request):
+    # Histogramas por rota deste processo: percentis, consultas, banco, templates, cache (só para a equipe)
+    return JsonResponse(perfilamento.resumo())
+
+
+def metricas_prometheus(request):
+    # Mesmos números em texto do Prometheus; equipe logada ou token do settings (scraper)
+    token = settings.ECHO_METRICAS_TOKEN
+    autorizado = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not autorizado and not (request.user.is_active and request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(perfilamento.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
-def filtrar_noticias(request):
+async def filtrar_noticias(request):
     categoria_nome = request.GET.get('categoria')
     if not categoria_nome:
         return HttpResponseBadRequest("Categoria não fornecida.")
     try:
         if categoria_nome == 'Tendências':
-            noticias_filtradas = Noticia.objects.filter(urgente=False).order_by('-data_publicacao')[:5]
+            noticias_filtradas = Noticia.objects.filter(urgente=False)
         else:
             noticias_filtradas = Noticia.objects.filter(
                 categoria__nome__iexact=categoria_nome,
                 urgente=False 
-            ).order_by('-data_publicacao')[:5]
+            )
+        noticias_filtradas = await _alista(noticias_filtradas.select_related('categoria').order_by('-data_publicacao')[:5])
     except Exception as e:
         noticias_filtradas = None
     context = { 'ultimas_noticias': noticias_filtradas }
-    return render(request, 'Echo_app/partials/lista_noticias.html', context)
+    return await _arender(request, 'Echo_app/partials/lista_noticias.html', context)
 
 
-def pesquisar_noticias(request):
+async def pesquisar_noticias(request):
     termo_pesquisa = request.GET.get('q', '').strip()
     if not termo_pesquisa:
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({'success': False, 'error': 'Termo não fornecido'}, status=400)
         return redirect('Echo_app:dashboard')
+    await _ausuario(request)
     try:
-        noticias_encontradas = Noticia.objects.filter(
-            Q(titulo__icontains=termo_pesquisa) | 
-            Q(conteudo__icontains=termo_pesquisa)
-        ).order_by('-data_publicacao')[:20]
+        # Índice textual (tsvector/FTS5) ordenado por relevância; sem índice, volta ao icontains
+        ids_encontrados = await sync_to_async(busca.buscar_ids)(termo_pesquisa, limite=20)  # SQL cru: cursor síncrono
+        if ids_encontrados is None:
+            noticias_encontradas = await _alista(Noticia.objects.filter(
+                Q(titulo__icontains=termo_pesquisa) | 
+                Q(conteudo__icontains=termo_pesquisa)
+            ).select_related('categoria').order_by('-data_publicacao')[:20])
+        else:
+            por_id = await Noticia.objects.select_related('categoria').ain_bulk(ids_encontrados)
+            noticias_encontradas = [por_id[pk] for pk in ids_encontrados if pk in por_id]
         
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             resultados = []
@@ -441,7 +484,7 @@ def pesquisar_noticias(request):
                     'conteudo': noticia.conteudo[:150] + '...' if len(noticia.conteudo) > 150 else noticia.conteudo,
                     'categoria': noticia.categoria.nome if noticia.categoria else 'Geral',
                     'data_publicacao': noticia.data_publicacao.strftime('%d/%m/%Y'),
-                    'imagem_url': noticia.imagem.url if noticia.imagem else None,
+                    'imagem_url': imagens.url_para(noticia.imagem, noticia.imagem_versoes, 320),  # Miniatura, não o original
                     'url': f"/noticia/{noticia.id}/"
                 })
             return JsonResponse({'success': True, 'resultados': resultados, 'total': len(resultados)})
@@ -449,109 +492,103 @@ def pesquisar_noticias(request):
         context = {
             'termo_pesquisa': termo_pesquisa,
             'noticias': noticias_encontradas,
-            'total_resultados': noticias_encontradas.count()
+            'total_resultados': len(noticias_encontradas)
         }
-        return render(request, 'Echo_app/resultados_pesquisa.html', context)
+        return await _arender(request, 'Echo_app/resultados_pesquisa.html', context)
     except Exception as e:
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({'success': False, 'error': 'Erro ao pesquisar'}, status=500)
         return redirect('Echo_app:dashboard')
 
+def autocompletar_pesquisa(request):
+    # Sugestões leves para a caixa de busca do topo (trie em memória, sem consultar o banco)
+    prefixo = request.GET.get('q', '').strip()
+    if len(prefixo) < 2:
+        return JsonResponse({'sugestoes': []})
+    return JsonResponse({'sugestoes': autocompletar.sugerir(prefixo)})
+
+async def _ultima_alteracao_noticia(request, pk, **kwargs):
+    datas = await Noticia.objects.filter(pk=pk).values_list('data_publicacao', 'data_atualizacao').afirst()
+    return max(datas) if datas else None
+
+@method_decorator(
+    cache_paginas.cache_anonimo('noticia', lambda request, pk, **kwargs: [f'noticia:{pk}', 'categoria'], _ultima_alteracao_noticia),
+    name='get',
+)
 class NoticiaDetalheView(DetailView):
     model = Noticia
     template_name = 'Echo_app/noticia_detalhe.html'
     context_object_name = 'noticia'
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        noticia_atual = self.object
-        user = self.request.user
+    queryset = Noticia.objects.select_related('categoria', 'autor__perfil')
+
+    async def aget_object(self):
+        try:
+            return await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except Noticia.DoesNotExist:
+            raise Http404("Notícia não encontrada.")
+
+    async def get(self, request, *args, **kwargs):
+        # GET assíncrono: a view inteira passa a ser async (o DetailView só monta o contexto básico)
+        user = await _ausuario(request)
+        self.object = noticia_atual = await self.aget_object()
+        context = self.get_context_data(object=noticia_atual)
 
         # 1. 🚨 LÓGICA DE MARCAR NOTIFICAÇÃO COMO LIDA (NOVO) 🚨
         if user.is_authenticated:
             # Pega o notif_id da query string (ex: /noticia/123?notif_id=456)
-            notificacao_id = self.request.GET.get('notif_id')
+            notificacao_id = request.GET.get('notif_id')
             
-            if notificacao_id:
-                try:
-                    # Busca a Notificacao específica que pertence ao usuário e está não lida
-                    notificacao = Notificacao.objects.get(
-                        pk=notificacao_id, 
-                        usuario=user,
-                        lida=False 
-                    )
-                    
-                    # Marca como lida
-                    notificacao.lida = True
-                    notificacao.save()
-                    
-                except Notificacao.DoesNotExist:
-                    # Se não encontrou (ID inválido, ou já estava lida), ignora.
-                    pass
+            if notificacao_id and notificacao_id.isdigit():
+                # Marca como lida (se era do usuário e ainda não lida) e desconta do sino
+                await sync_to_async(notificacoes.marcar_lidas)(user, pk=notificacao_id)
         # 2. --------------------------------------------------------
 
-        # Lógica de Notícias Relacionadas (Mantida)
-        qs_base = Noticia.objects.none()
-        if user.is_authenticated:
-            try:
-                perfil = getattr(user, 'perfil', None)
-                if perfil and perfil.categorias_de_interesse.exists():
-                    qs_base = Noticia.objects.filter(categoria__in=perfil.categorias_de_interesse.all())
-            except Exception:
-                pass
-        if not qs_base.exists():
-            qs_base = Noticia.objects.filter(categoria=noticia_atual.categoria)
-        
-        noticias_relacionadas = qs_base.exclude(id=noticia_atual.id).order_by('-data_publicacao')[:3]
+        async def interacoes():
+            # Curtida e salvamento numa consulta só
+            if not user.is_authenticated:
+                return set()
+            return set(await _alista(InteracaoNoticia.objects.filter(
+                usuario=user, noticia=noticia_atual
+            ).values_list('tipo', flat=True)))
+
+        # Notícias relacionadas por conteúdo (vizinhos TF-IDF pré-calculados em relacionadas.py)
+        # e as interações do usuário saem ao mesmo tempo
+        noticias_relacionadas, tipos = await asyncio.gather(relacionadas.apara(noticia_atual, limite=3), interacoes())
         if len(noticias_relacionadas) < 3:
-            ids_excluidos = [noticia_atual.id] + [n.id for n in noticias_relacionadas]
-            quantidade_faltante = 3 - len(noticias_relacionadas)
-            mais_recentes = Noticia.objects.exclude(id__in=ids_excluidos).order_by('-data_publicacao')[:quantidade_faltante]
-            noticias_relacionadas = list(noticias_relacionadas) + list(mais_recentes)
+            # Notícia ainda não indexada (ou sem vizinhos parecidos): completa com as mais recentes da categoria
+            # e, se a categoria não bastar, com as mais recentes do site
+            noticias_relacionadas = list(noticias_relacionadas)
+            for filtro in ({'categoria': noticia_atual.categoria_id}, {}):
+                ids_excluidos = [noticia_atual.id] + [n.id for n in noticias_relacionadas]
+                noticias_relacionadas += await _alista(Noticia.objects.filter(**filtro).exclude(
+                    id__in=ids_excluidos
+                ).select_related('autor__perfil').order_by('-data_publicacao')[:3 - len(noticias_relacionadas)])
+                if len(noticias_relacionadas) >= 3:
+                    break
         
         context['noticias_relacionadas'] = noticias_relacionadas
         
         # Lógica de Interação (Mantida)
-        context['usuario_curtiu'] = False
-        context['usuario_salvou'] = False
-        if self.request.user.is_authenticated:
-            context['usuario_curtiu'] = InteracaoNoticia.objects.filter(
-                usuario=user, noticia=noticia_atual, tipo='CURTIDA'
-            ).exists()
-            context['usuario_salvou'] = InteracaoNoticia.objects.filter(
-                usuario=user, noticia=noticia_atual, tipo='SALVAMENTO'
-            ).exists()
-            
-        return context
+        context['usuario_curtiu'] = 'CURTIDA' in tipos
+        context['usuario_salvou'] = 'SALVAMENTO' in tipos
+        return self.render_to_response(context)  # O handler (ou o cache_anonimo) renderiza fora do loop
 
 @require_POST
 def toggle_interacao(request, noticia_id, tipo_interacao):
     if not request.user.is_authenticated:
         return JsonResponse({'success': False, 'error': 'Usuário não autenticado'}, status=401)
-    if tipo_interacao not in ['CURTIDA', 'SALVAMENTO']:
+    if tipo_interacao not in contadores.CAMPOS:
         return HttpResponseBadRequest("Tipo de interação inválido.")
-    noticia = get_object_or_404(Noticia, id=noticia_id)
-    usuario = request.user
-    interacao, created = InteracaoNoticia.objects.get_or_create(
-        usuario=usuario, noticia=noticia, tipo=tipo_interacao
-    )
-    if not created:
-        interacao.delete()
-        acao_realizada = 'removida'
-        status_interacao = False
-    else:
-        acao_realizada = 'adicionada'
-        status_interacao = True
-    if tipo_interacao == 'CURTIDA':
-        noticia.curtidas_count = noticia.interacoes.filter(tipo='CURTIDA').count()
-    elif tipo_interacao == 'SALVAMENTO':
-        noticia.salvamentos_count = noticia.interacoes.filter(tipo='SALVAMENTO').count()
-    noticia.save()
+    if not Noticia.objects.filter(id=noticia_id).exists():
+        raise Http404("Notícia não encontrada.")
+    # Liga/desliga a interação e ajusta o contador com incremento atômico (sem COUNT nem save da notícia)
+    status_interacao = contadores.alternar(request.user, noticia_id, tipo_interacao)
+    acao_realizada = 'adicionada' if status_interacao else 'removida'
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
             'acao': acao_realizada,
-            'nova_contagem': getattr(noticia, f'{tipo_interacao.lower()}s_count'),
+            'nova_contagem': contadores.valor(noticia_id, tipo_interacao),
             'status_interacao': status_interacao,
             'tipo': tipo_interacao.lower()
         })
@@ -568,84 +605,91 @@ def salvar_noticia(request, noticia_id):
     return toggle_interacao(request, noticia_id, 'SALVAMENTO')
 
 ITEMS_PER_PAGE = 5
+NOTICIAS_POR_PAGINA = 24  # Curtidas e salvos (grade)
+
+def _eh_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
 @login_required
-def lista_notificacoes(request):
-    usuario = request.user
-    categorias_preferidas = Categoria.objects.none()
-    
-    # Parâmetros de página para cada seção
-    page_reco = request.GET.get('page_reco', 1) 
-    page_lidas = request.GET.get('page_lidas', 1) 
-    
-    # 1. Obter Categorias de Interesse do Usuário
-    try:
-        perfil = usuario.perfil 
-        categorias_preferidas = perfil.categorias_de_interesse.all()
-    except PerfilUsuario.DoesNotExist:
-        PerfilUsuario.objects.get_or_create(usuario=usuario) 
-        pass
-    
+async def lista_notificacoes(request):
+    usuario = await _ausuario(request)
+    # Ids das categorias numa consulta só; o filtro vira "categoria_id IN (...)" sem subconsulta
+    categorias_preferidas = await _alista(PerfilUsuario.categorias_de_interesse.through.objects.filter(
+        perfilusuario__usuario=usuario
+    ).values_list('categoria_id', flat=True))
+
     # --- SEÇÃO 1: RECOMENDADAS (Notificacoes NÃO Lidas) ---
-    
-    # Busca Notificações não lidas E que estão vinculadas a uma Notícia
-    todas_notificacoes_nao_lidas = Notificacao.objects.filter(
-        usuario=usuario, 
+    recomendadas = Notificacao.objects.filter(
+        usuario=usuario,
         lida=False,
         noticia__isnull=False # Garante que só notif. de notícias sejam incluídas
-    )
+    ).select_related('noticia__categoria')
+    if categorias_preferidas:
+        # Filtra pelas categorias de interesse; sem categorias, mostra todas as não lidas
+        recomendadas = recomendadas.filter(noticia__categoria_id__in=categorias_preferidas)
+
+    # --- SEÇÃO 2: NOTIFICAÇÕES LIDAS ---
+    lidas = Notificacao.objects.filter(
+        usuario=usuario,
+        lida=True,
+        noticia__isnull=False
+    ).select_related('noticia__categoria')
 
-    if categorias_preferidas.exists():
-        # Filtra as Notificações não lidas por categorias de interesse
-        recomendadas_base_qs = todas_notificacoes_nao_lidas.filter(
-            noticia__categoria__in=categorias_preferidas
-        ).order_by('-data_criacao')
-    else:
-        # Se não houver categorias, mostra todas as Notificações não lidas
-        recomendadas_base_qs = todas_notificacoes_nao_lidas.order_by('-data_criacao')
+    # Paginação por cursor: cada seção avança sozinha (?secao=reco|lidas&cursor=...)
+    secoes = {'reco': recomendadas, 'lidas': lidas}
+    secao_pedida = request.GET.get('secao')
+
+    async def pagina_da(secao):
+        cursor = request.GET.get('cursor', '') if secao == secao_pedida else ''
+        pagina = await paginacao.apaginar(secoes[secao], 'data_criacao', cursor, ITEMS_PER_PAGE, lista=f'notificacoes:{secao}')
+        pagina.url_proxima = paginacao.url_proxima(request, pagina, secao=secao)
+        return pagina
+
+    if secao_pedida in secoes and _eh_ajax(request):
+        # Rolagem infinita: só os próximos itens da seção pedida (e o link da página seguinte)
+        pagina = await pagina_da(secao_pedida)
+        return await _arender(request, 'Echo_app/partials/notificacoes_pagina.html', {'pagina': pagina, 'secao': secao_pedida})
+
+    # As duas seções são independentes: as consultas saem juntas
+    paginas = dict(zip(secoes, await asyncio.gather(*map(pagina_da, secoes))))
 
-    # Aplicando a paginação às RECOMENDADAS (modelo Notificacao)
-    paginator_reco = Paginator(recomendadas_base_qs, ITEMS_PER_PAGE)
-    notificacoes_recomendadas = paginator_reco.get_page(page_reco)
-    
-    
-    # --- SEÇÃO 2: NOTIFICAÇÕES LIDAS (Modelo Notificacao) ---
-    
-    # Busca TODAS as notificações do usuário que estão lidas E que estão vinculadas a uma Notícia.
-    lidas_base_qs = Notificacao.objects.filter(
-        usuario=usuario, 
-        lida=True,
-        noticia__isnull=False # Garante que só notif. de notícias sejam incluídas
-    ).order_by('-data_criacao')
-    
-    # Aplicando a paginação às LIDAS (modelo Notificacao)
-    paginator_lidas = Paginator(lidas_base_qs, ITEMS_PER_PAGE)
-    notificacoes_lidas = paginator_lidas.get_page(page_lidas)
-    
-    
-    # --- CONTAGEM DE NÃO LIDAS ---
-    nao_lidas_count = todas_notificacoes_nao_lidas.count()
-    
     context = {
-        'notificacoes_recomendadas': notificacoes_recomendadas, # Objeto Page (Notificacao)
-        'notificacoes_lidas': notificacoes_lidas,               # Objeto Page (Notificacao Lida)
-        'nao_lidas_count': nao_lidas_count
+        'notificacoes_recomendadas': paginas['reco'],
+        'notificacoes_lidas': paginas['lidas'],
     }
-    return render(request, 'Echo_app/notificacao.html', context)
+    return await _arender(request, 'Echo_app/notificacao.html', context)
+
+async def eventos_notificacoes(request):
+    # SSE (view assíncrona): a conexão fica aberta e recebe as notificações novas do usuário
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return HttpResponse(status=401)  # Sem redirect: o EventSource não segue para a tela de login
+    if not isinstance(request, ASGIRequest):
+        # WSGI: o fluxo infinito prenderia o worker; com 204 o EventSource desiste e não reconecta
+        return HttpResponse(status=204)
+    resposta = StreamingHttpResponse(push.fluxo(usuario.pk), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'  # nginx não segura os eventos no buffer
+    return resposta
 
 @login_required
 @require_POST 
 def marcar_notificacao_lida(request, notificacao_id):   
     notificacao = get_object_or_404(Notificacao, id=notificacao_id, usuario=request.user)
-    notificacao.marcar_como_lida()
+    notificacoes.marcar_lidas(request.user, pk=notificacao.pk)
     return redirect('Echo_app:lista_notificacoes')
 
 @login_required
 @require_POST
 def marcar_todas_lidas(request):
-    Notificacao.objects.filter(usuario=request.user, lida=False).update(lida=True)
+    notificacoes.marcar_lidas(request.user)
     return redirect('Echo_app:lista_notificacoes')
 
+@staff_member_required
+def status_tarefas(request):
+    # Tamanho da fila e latência por tipo de tarefa (só para a equipe)
+    return JsonResponse(tarefas.estatisticas())
+
 @login_required
 def perfil_detalhe(request):
     perfil, created = PerfilUsuario.objects.get_or_create(usuario=request.user)
@@ -663,7 +707,7 @@ def perfil_editar(request):
     perfil, _ = PerfilUsuario.objects.get_or_create(usuario=usuario)
 
     # Lista de nomes (avatars1.png ... avatars16.png)
-    lista_avatars = [f'avatars{i}.png' for i in range(1, 17)]
+    lista_avatars = avatares.LISTA_AVATARES
 
     try:
         todas_categorias = Categoria.objects.all()
@@ -691,6 +735,7 @@ def perfil_editar(request):
                 "perfil": perfil,
                 "todas_categorias": todas_categorias,
                 "lista_avatars": lista_avatars,
+                "categorias_selecionadas": set(perfil.categorias_de_interesse.all()),
                 "erros": erros,
                 "dados_preenchidos": {
                     "first_name": first_name,
@@ -713,13 +758,12 @@ def perfil_editar(request):
 
         # Salvar Imagem
         if foto_upload:
-            perfil.foto_perfil = foto_upload
-        elif avatar_escolhido:
-            # CORREÇÃO: Buscamos em 'static/avatars' (pasta na raiz)
-            avatar_path = os.path.join(settings.BASE_DIR, 'static/avatars', avatar_escolhido)
-            if os.path.exists(avatar_path):
-                with open(avatar_path, 'rb') as f:
-                    perfil.foto_perfil.save(avatar_escolhido, File(f), save=True)
+            # Nome = hash do conteúdo: a mesma foto enviada de novo reaproveita o arquivo que já existe
+            perfil.foto_perfil = armazenamento.salvar(perfil.foto_perfil, foto_upload)
+            perfil.avatar_padrao = ''
+        elif avatar_escolhido and avatares.caminho_avatar(avatar_escolhido):
+            # Avatar pronto: só a referência ao arquivo de static/avatars, nada é copiado
+            avatares.escolher(perfil, avatar_escolhido)
 
         perfil.biografia = biografia
         perfil.save()
@@ -731,18 +775,32 @@ def perfil_editar(request):
         "perfil": perfil,
         "todas_categorias": todas_categorias,
         "lista_avatars": lista_avatars,
+        "categorias_selecionadas": set(perfil.categorias_de_interesse.all()),  # Uma consulta, em vez de uma por categoria no template
     }
     return render(request, "Echo_app/perfil_editar.html", context)
 
 
+@csrf_exempt  # O CSRF é checado em _criar_noticia, depois de trocar o upload handler
 @login_required
 def criar_noticia(request):
+    if request.method == "POST":
+        # Corpo declarado grande demais: responde sem ler nem fazer o parsing de nada
+        if int(request.META.get('CONTENT_LENGTH') or 0) > uploads.tamanho_maximo_do_pedido():
+            limite = settings.ECHO_UPLOAD_TAMANHO_MAXIMO / 1024 / 1024
+            return HttpResponse(f"A imagem passa do limite de {limite:.0f} MB.", status=413)
+        # Precisa vir antes de qualquer leitura de request.POST/FILES (inclusive a do CSRF)
+        request.upload_handlers = [uploads.UploadDeImagem(request)]
+    return _criar_noticia(request)
+
+
+@csrf_protect
+def _criar_noticia(request):
     if request.method == "POST":
         titulo = request.POST.get("titulo", "").strip()
         conteudo = request.POST.get("conteudo", "").strip()
         categoria_id = request.POST.get("categoria")
-        imagem = request.FILES.get("imagem")
-        erros = []
+        imagem = request.FILES.get("imagem")  # Já validada e com sha256 (uploads.UploadDeImagem)
+        erros = uploads.erros(request)
         if not titulo:
             erros.append("O título é obrigatório.")
         if not conteudo:
@@ -759,15 +817,20 @@ def criar_noticia(request):
                 "categorias": Categoria.objects.all(), "categoria_selecionada": categoria_id,
             }
             return render(request, "Echo_app/criar_noticia.html", context)
-        Noticia.objects.create(
+        noticia = Noticia(
             titulo=titulo, conteudo=conteudo, categoria=categoria,
-            autor=request.user, imagem=imagem,
+            autor=request.user,
             urgente=request.POST.get('urgente') == 'on'
         )
+        if imagem:
+            # Nome pelo hash calculado durante o upload; as versões saem na fila (imagens.processar)
+            noticia.imagem = armazenamento.salvar(noticia.imagem, imagem, resumo_hex=imagem.sha256)
+        noticia.save()
         return redirect("Echo_app:dashboard")
     context = { "categorias": Categoria.objects.all() }
     return render(request, "Echo_app/criar_noticia.html", context)
 
+
 @login_required
 def configuracoes_conta(request):
     if request.method == 'POST':
@@ -784,86 +847,58 @@ def configuracoes_conta(request):
     context = { 'form': form }
     return render(request, 'Echo_app/configuracoes.html', context)
 
-@login_required
-def noticias_curtidas(request):
-    usuario = request.user
-    
-    # Parâmetros URL
+def _pagina_interacoes(request, tipo):
+    """Página (por cursor) das notícias que o usuário curtiu ou salvou, com os filtros da URL."""
     termo_pesquisa = request.GET.get('q', '').strip()
     categoria_nome = request.GET.get('categoria', '').strip()
-    
-    # Busca Base
-    interacoes_qs = InteracaoNoticia.objects.filter(
-        usuario=usuario, 
-        tipo='CURTIDA'
-    ).select_related('noticia', 'noticia__categoria').order_by('-data_interacao')
-    
-    # Filtro Categoria (Por NOME)
+
+    # unique_together (usuario, noticia, tipo) já garante uma linha por notícia: não há o que deduplicar
+    interacoes = InteracaoNoticia.objects.filter(usuario=request.user, tipo=tipo).select_related('noticia__categoria')
     if categoria_nome:
-        interacoes_qs = interacoes_qs.filter(
-            noticia__categoria__nome__iexact=categoria_nome
-        )
-        
-    # Filtro Pesquisa
+        interacoes = interacoes.filter(noticia__categoria__nome__iexact=categoria_nome)
     if termo_pesquisa:
-        interacoes_qs = interacoes_qs.filter(
-            Q(noticia__titulo__icontains=termo_pesquisa) | 
+        interacoes = interacoes.filter(
+            Q(noticia__titulo__icontains=termo_pesquisa) |
             Q(noticia__conteudo__icontains=termo_pesquisa)
         )
-        
-    # Remove Duplicatas
-    seen_ids = set()
-    noticias_curtidas = []
-    for item in interacoes_qs:
-        noticia = item.noticia
-        if noticia.id not in seen_ids:
-            noticias_curtidas.append(noticia)
-            seen_ids.add(noticia.id)
+
+    pagina = paginacao.paginar(
+        interacoes, 'data_interacao', request.GET.get('cursor', ''), NOTICIAS_POR_PAGINA, lista=f'interacoes:{tipo}'
+    )
+    pagina.noticias = [interacao.noticia for interacao in pagina.itens]
+    pagina.url_proxima = paginacao.url_proxima(request, pagina)
+    return pagina, categoria_nome
+
+@login_required
+def noticias_curtidas(request):
+    pagina, categoria_nome = _pagina_interacoes(request, 'CURTIDA')
+    if _eh_ajax(request):
+        return render(request, 'Echo_app/partials/curtidas_pagina.html', {'pagina': pagina})
 
     # Categorias para o menu
     categorias_disponiveis = Categoria.objects.all().order_by('nome')
 
     context = {
-        'noticias_curtidas': noticias_curtidas,
-        'categorias_disponiveis': categorias_disponiveis, 
-        'total_curtidas': len(noticias_curtidas),
-        'categoria_ativa': categoria_nome 
+        'pagina': pagina,
+        'noticias_curtidas': pagina.noticias,
+        'categorias_disponiveis': categorias_disponiveis,
+        'categoria_ativa': categoria_nome
     }
-    
+
     return render(request, 'Echo_app/noticias_curtidas.html', context)
 
 @login_required
 def noticias_salvas_view(request):
-    usuario = request.user
-    termo_pesquisa = request.GET.get('q', '').strip()
-    categoria_nome = request.GET.get('categoria', '').strip()
-
-    interacoes = InteracaoNoticia.objects.filter(
-        usuario=usuario, tipo='SALVAMENTO'
-    ).select_related('noticia', 'noticia__categoria').order_by('-data_interacao')
-
-    if categoria_nome:
-        interacoes = interacoes.filter(noticia__categoria__nome__iexact=categoria_nome)
-
-    if termo_pesquisa:
-        interacoes = interacoes.filter(
-            Q(noticia__titulo__icontains=termo_pesquisa) |
-            Q(noticia__conteudo__icontains=termo_pesquisa)
-        )
-
-    seen_ids = set()
-    noticias = []
-    for item in interacoes:
-        if item.noticia.id not in seen_ids:
-            noticias.append(item.noticia)
-            seen_ids.add(item.noticia.id)
+    pagina, categoria_nome = _pagina_interacoes(request, 'SALVAMENTO')
+    if _eh_ajax(request):
+        return render(request, 'Echo_app/partials/salvos_pagina.html', {'pagina': pagina})
 
     categorias_disponiveis = Categoria.objects.all().order_by('nome')
 
     context = {
-        'noticias_salvas': noticias,
+        'pagina': pagina,
+        'noticias_salvas': pagina.noticias,
         'categorias_disponiveis': categorias_disponiveis,
-        'total_salvos': len(noticias),
         'categoria_ativa': categoria_nome
     }
     return render(request, 'Echo_app/noticias_salvas.html', context)
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Echoproject.settings')
+os.environ['ECHO_SERVIDOR_ASGI'] = '1'  # Liga o push (SSE) das notificações, ver ECHO_PUSH_SSE
 
 application = get_asgi_application()
@@ -1,4 +1,5 @@
 from pathlib import Path
+import copy
 import os
 from dotenv import load_dotenv
 
@@ -25,6 +26,19 @@ if NOT_PROD:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    if os.getenv('DBNAME'):
+        # Postgres local (ex.: para o comparar_conexoes); sem TLS por padrão
+        DATABASES = {
+            'default': {
+                'ENGINE': 'django.db.backends.postgresql',
+                'NAME': os.environ.get('DBNAME'),
+                'HOST': os.environ.get('DBHOST', 'localhost'),
+                'PORT': os.environ.get('DBPORT', ''),
+                'USER': os.environ.get('DBUSER'),
+                'PASSWORD': os.environ.get('DBPASS'),
+                'OPTIONS': {'sslmode': os.getenv('DBSSLMODE', 'prefer')},
+            }
+        }
 else:
     SECRET_KEY = os.getenv('SECRET_KEY')
     DEBUG = os.getenv('DEBUG', '0').lower() in ['true', 't', '1']
@@ -42,12 +56,66 @@ else:
             'ENGINE': 'django.db.backends.postgresql',
             'NAME': os.environ.get('DBNAME'),
             'HOST': os.environ.get('DBHOST'),
+            'PORT': os.environ.get('DBPORT', ''),
             'USER': os.environ.get('DBUSER'),
             'PASSWORD': os.environ.get('DBPASS'),
-            'OPTIONS': {'sslmode': 'require'},
+            'OPTIONS': {'sslmode': os.getenv('DBSSLMODE', 'require')},
         }
     }
     
+# ==============================================================
+# 🔌 CONEXÕES COM O POSTGRES 🔌
+# ==============================================================
+
+# Sem isto cada requisição abria uma conexão nova (handshake TLS + autenticação)
+# e a fechava no fim. ECHO_DB_CONEXOES escolhe:
+# 'pool' (padrão): pool do psycopg 3 (psycopg_pool, nativo no Django 5.1+) por
+#     processo; a requisição pega uma conexão aberta e devolve no fim. Funciona
+#     também no ASGI, onde as conexões persistentes por thread não são reaproveitadas.
+# 'persistente': uma conexão por thread, reaproveitada por ECHO_DB_CONN_MAX_AGE segundos.
+# 'nova': uma conexão por requisição (o comportamento antigo, para comparação).
+# Nos três modos a conexão é testada antes do uso (CONN_HEALTH_CHECKS) e
+# ECHO_DB_POOL_MAX_LIFETIME / ECHO_DB_CONN_MAX_AGE limitam quanto tempo ela vive.
+# A conexão de LISTEN do push (push.py) é aberta à parte e não ocupa o pool.
+ECHO_DB_CONEXOES = os.getenv('ECHO_DB_CONEXOES', 'pool')
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    if ECHO_DB_CONEXOES == 'pool':
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('ECHO_DB_POOL_MIN', 2)),  # Abertas e prontas em cada processo
+            'max_size': int(os.getenv('ECHO_DB_POOL_MAX', 10)),  # Acima de workers x threads não adianta
+            'timeout': float(os.getenv('ECHO_DB_POOL_TIMEOUT', 10)),  # Espera por uma conexão livre (s)
+            'max_lifetime': float(os.getenv('ECHO_DB_POOL_MAX_LIFETIME', 1800)),  # Reciclada depois disso (s)
+            'max_idle': float(os.getenv('ECHO_DB_POOL_MAX_IDLE', 300)),  # Sobras ociosas fecham (s)
+        }
+    elif ECHO_DB_CONEXOES == 'persistente':
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('ECHO_DB_CONN_MAX_AGE', 600))
+
+# ==============================================================
+# 📚 RÉPLICAS DE LEITURA (Echo_app/replicas.py) 📚
+# ==============================================================
+
+# DBREPLICAS: réplicas separadas por espaço. Com Postgres cada uma é
+# "host[:porta][/banco]" (usuário, senha, TLS e pool vêm do primário); com o
+# SQLite do desenvolvimento, o caminho de outro arquivo (copie o db.sqlite3
+# para ele: entre arquivos não há replicação, dá para ver a leitura "atrasada").
+# As leituras das requisições vão para uma réplica sorteada; depois de uma
+# escrita o usuário lê do primário por ECHO_DB_FIXAR_SEGUNDOS (atraso da replicação).
+ECHO_DB_REPLICAS = []
+for _numero, _replica in enumerate(os.getenv('DBREPLICAS', '').split(), 1):
+    _banco = copy.deepcopy(DATABASES['default'])
+    if _banco['ENGINE'] == 'django.db.backends.sqlite3':
+        _banco['NAME'] = BASE_DIR / _replica
+    else:
+        _endereco, _, _nome = _replica.partition('/')
+        _host, _, _porta = _endereco.partition(':')
+        _banco.update(HOST=_host, PORT=_porta, NAME=_nome or _banco['NAME'])
+    _banco['TEST'] = {'MIRROR': 'default'}  # Nos testes a réplica é o próprio banco de teste
+    DATABASES[f'replica{_numero}'] = _banco
+    ECHO_DB_REPLICAS.append(f'replica{_numero}')
+DATABASE_ROUTERS = ['Echo_app.replicas.RoteadorReplicas']
+ECHO_DB_FIXAR_SEGUNDOS = int(os.getenv('ECHO_DB_FIXAR_SEGUNDOS', 10))
+
 # Application definition
 
 # --- APPS INSTALADOS ---
@@ -69,6 +137,8 @@ INSTALLED_APPS = [
 
 # --- MIDDLEWARE ---
 MIDDLEWARE = [
+    'Echo_app.perfilamento.MedicaoMiddleware',  # Primeiro: mede a requisição inteira (ver perfilamento.py)
+    'Echo_app.replicas.ReplicasMiddleware',  # Leituras nas réplicas, exceto logo após uma escrita
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,7 +154,7 @@ MIDDLEWARE = [
 # --- TEMPLATE CONFIG ---
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'Echo_app.perfilamento.TemplatesMedidos',  # DjangoTemplates + tempo de render por requisição
         'DIRS': [],  # caso queira usar templates globais, adicione aqui
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,6 +163,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Echo_app.context_processors.notificacoes',  # Contador do sino (ver notificacoes.py)
             ],
         },
     },
@@ -117,6 +188,13 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # --- LOGIN CONFIG ---
 LOGIN_URL = 'Echo_app:entrar'  # redireciona para a página de login se usuário não autenticado
 
+# O primeiro já traz user.perfil junto com o usuário da sessão; o ModelBackend
+# continua na lista para as sessões abertas antes dessa troca.
+AUTHENTICATION_BACKENDS = [
+    'Echo_app.autenticacao.BackendComPerfil',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # ==============================================================
 # 📧 EMAIL SETTINGS (NECESSÁRIO PARA REDEFINIÇÃO DE SENHA) 📧
 # ==============================================================
@@ -147,6 +225,169 @@ else:
 PASSWORD_RESET_COMPLETE_REDIRECT_URL = 'Echo_app:entrar'
 
 
+# ==============================================================
+# 🗄️ CACHE (Echo_app/cache_segmentos.py) 🗄️
+# ==============================================================
+
+# ECHO_CACHE_BACKEND: 'memoria' (padrão, um cache por processo), 'arquivo'
+# (compartilhado entre workers da mesma máquina) ou 'banco' (tabela
+# echo_cache; rode `python manage.py createcachetable` antes).
+ECHO_CACHE_BACKEND = os.getenv('ECHO_CACHE_BACKEND', 'memoria')
+_BACKENDS_DE_CACHE = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'echo',
+    },
+    'arquivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('ECHO_CACHE_DIR', str(BASE_DIR / '.cache')),
+    },
+    'banco': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'echo_cache',
+    },
+}
+CACHES = {'default': _BACKENDS_DE_CACHE[ECHO_CACHE_BACKEND]}
+
+# Validade máxima (segundos) dos segmentos do dashboard
+ECHO_CACHE_SEGMENTOS_TIMEOUT = int(os.getenv('ECHO_CACHE_SEGMENTOS_TIMEOUT', 300))
+
+# Validade máxima (segundos) das páginas inteiras servidas a anônimos (dashboard e detalhe)
+ECHO_CACHE_PAGINAS_TIMEOUT = int(os.getenv('ECHO_CACHE_PAGINAS_TIMEOUT', 120))
+
+# Cache 'compartilhado': códigos de recuperação de senha (e as sessões no modo
+# 'cache_banco'), que precisam ser os mesmos em todos os workers. 'memoria' é
+# de cada processo; 'arquivo' é visto por todos os workers da máquina, mas o
+# add() dele não é atômico e palpites paralelos no código passariam do limite
+# (ver recuperacao_senha.py). Em produção o padrão é 'banco', tabela
+# echo_cache_compartilhado: rode `python manage.py createcachetable` no deploy.
+# Fica separado do 'default' para a limpeza por excesso de entradas das páginas
+# e segmentos não derrubar recuperações em andamento.
+ECHO_CACHE_COMPARTILHADO = os.getenv('ECHO_CACHE_COMPARTILHADO', ECHO_CACHE_BACKEND if NOT_PROD else 'banco')
+_compartilhado = copy.deepcopy(_BACKENDS_DE_CACHE[ECHO_CACHE_COMPARTILHADO])
+if ECHO_CACHE_COMPARTILHADO == 'memoria':
+    _compartilhado['LOCATION'] = 'echo-compartilhado'
+elif ECHO_CACHE_COMPARTILHADO == 'arquivo':
+    _compartilhado['LOCATION'] = os.path.join(_compartilhado['LOCATION'], 'compartilhado')
+else:
+    _compartilhado['LOCATION'] = 'echo_cache_compartilhado'  # A limpeza do DatabaseCache vale para a tabela toda
+_compartilhado['KEY_PREFIX'] = 'compartilhado'
+_compartilhado['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('ECHO_CACHE_COMPARTILHADO_ENTRADAS', 20000))}
+CACHES['compartilhado'] = _compartilhado
+
+
+# ==============================================================
+# 🍪 SESSÕES E RECUPERAÇÃO DE SENHA (Echo_app/recuperacao_senha.py) 🍪
+# ==============================================================
+
+# ECHO_SESSOES:
+# 'assinada' (padrão em produção) guarda a sessão num cookie assinado com a
+#     SECRET_KEY: a requisição logada não faz consulta nenhuma para ler a sessão.
+#     O navegador lê o conteúdo (só ids, nada secreto) e sair não invalida uma
+#     cópia roubada do cookie; trocar a senha invalida, pelo hash da senha que o
+#     Django guarda na sessão.
+# 'cache_banco' (padrão fora de produção) lê a sessão do cache 'compartilhado'
+#     e só vai ao banco quando ela não está lá; quem muda a sessão (login, troca
+#     de senha) grava no banco e no cache. Com o 'compartilhado' no banco a
+#     leitura vira um SELECT na tabela do cache: não economiza consultas.
+# 'banco' é o padrão do Django (um SELECT por requisição logada).
+# Com 'cache_banco' e 'banco', rode `python manage.py clearsessions` de tempos
+# em tempos; `python manage.py medir_sessoes` compara os três modos.
+ECHO_SESSOES = os.getenv('ECHO_SESSOES', 'cache_banco' if NOT_PROD else 'assinada')
+SESSION_ENGINE = {
+    'cache_banco': 'django.contrib.sessions.backends.cached_db',
+    'assinada': 'django.contrib.sessions.backends.signed_cookies',
+    'banco': 'django.contrib.sessions.backends.db',
+}[ECHO_SESSOES]
+SESSION_CACHE_ALIAS = 'compartilhado'
+SESSION_SAVE_EVERY_REQUEST = False  # Só grava a sessão que mudou
+
+# Mensagens (messages.success etc.) sempre em cookie: o armazenamento padrão
+# passa para a sessão quando o cookie enche, criando sessão para anônimos.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Código de recuperação de senha: válido por ECHO_OTP_VALIDADE segundos a partir
+# do envio e descartado depois de ECHO_OTP_TENTATIVAS códigos errados.
+ECHO_OTP_VALIDADE = int(os.getenv('ECHO_OTP_VALIDADE', 600))
+ECHO_OTP_TENTATIVAS = int(os.getenv('ECHO_OTP_TENTATIVAS', 5))
+
+
+# ==============================================================
+# ⚙️ FILA DE TAREFAS (Echo_app/tarefas.py) ⚙️
+# ==============================================================
+
+# Em produção as tarefas rodam no comando `python manage.py processar_tarefas`.
+# Fora de produção (ou com ECHO_TAREFAS_SINCRONAS=1) rodam logo após o commit,
+# no próprio processo web, para não precisar de um worker no desenvolvimento.
+ECHO_TAREFAS_SINCRONAS = os.getenv('ECHO_TAREFAS_SINCRONAS', '1' if NOT_PROD else '0').lower() in ['true', 't', '1']
+
+
+# ==============================================================
+# ❤️ CONTADORES DE CURTIDAS/SALVAMENTOS (Echo_app/contadores.py) ❤️
+# ==============================================================
+
+# Write-behind: acumula os cliques em memória e grava tudo num UPDATE a cada
+# ECHO_CONTADORES_INTERVALO segundos (útil em notícias virais).
+ECHO_CONTADORES_WRITE_BEHIND = os.getenv('ECHO_CONTADORES_WRITE_BEHIND', '0').lower() in ['true', 't', '1']
+ECHO_CONTADORES_INTERVALO = int(os.getenv('ECHO_CONTADORES_INTERVALO', 5))
+
+
+# ==============================================================
+# 🔔 PUSH DE NOTIFICAÇÕES (Echo_app/push.py) 🔔
+# ==============================================================
+
+# SSE em /notificacoes/eventos/ (sirva por ASGI: Echoproject.asgi:application).
+# 'memoria': pub/sub no próprio processo (desenvolvimento, tarefas síncronas).
+# 'postgres': NOTIFY/LISTEN, para o worker processar_tarefas alcançar os processos web.
+ECHO_PUSH_BACKEND = os.getenv('ECHO_PUSH_BACKEND', 'memoria' if NOT_PROD else 'postgres')
+
+# O base.html só abre o EventSource quando o processo foi carregado por
+# Echoproject.asgi (que define ECHO_SERVIDOR_ASGI): no WSGI (gunicorn padrão,
+# runserver) cada aba aberta prenderia um worker para sempre.
+ECHO_PUSH_SSE = os.getenv('ECHO_SERVIDOR_ASGI', '0').lower() in ['true', 't', '1']
+
+
+# ==============================================================
+# 📤 UPLOAD DE IMAGENS (Echo_app/uploads.py) 📤
+# ==============================================================
+
+# Limites checados enquanto o arquivo chega (criar_noticia): o upload é
+# recusado no primeiro pedaço que passa do tamanho ou assim que o cabeçalho
+# da imagem declara mais pixels que o permitido, sem ler/decodificar o resto.
+ECHO_UPLOAD_TAMANHO_MAXIMO = int(os.getenv('ECHO_UPLOAD_TAMANHO_MAXIMO', 10 * 1024 * 1024))  # bytes
+ECHO_UPLOAD_PIXELS_MAXIMOS = int(os.getenv('ECHO_UPLOAD_PIXELS_MAXIMOS', 40_000_000))
+
+# ==============================================================
+# ⏱️ MEDIÇÃO POR REQUISIÇÃO (Echo_app/perfilamento.py) ⏱️
+# ==============================================================
+
+# Histogramas por rota em /desempenho/status/ (JSON) e /desempenho/metricas/
+# (Prometheus). Além da equipe logada, o Prometheus pode ler as métricas com
+# o cabeçalho "Authorization: Bearer <ECHO_METRICAS_TOKEN>".
+ECHO_METRICAS_TOKEN = os.getenv('ECHO_METRICAS_TOKEN', '')
+ECHO_PERFIL_JANELA = int(os.getenv('ECHO_PERFIL_JANELA', 500))  # Últimas requisições por rota para p50/p95/p99
+
+# Amostragem: 1 em cada ECHO_PERFIL_AMOSTRA requisições roda sob o profiler
+# (0 desliga) e o perfil é salvo em ECHO_PERFIL_DIR se passar de ECHO_PERFIL_LENTA_MS.
+# ECHO_PERFIL_FERRAMENTA: 'cprofile' (.prof) ou 'pyinstrument' (.html, se instalado).
+ECHO_PERFIL_AMOSTRA = int(os.getenv('ECHO_PERFIL_AMOSTRA', 0))
+ECHO_PERFIL_LENTA_MS = int(os.getenv('ECHO_PERFIL_LENTA_MS', 500))
+ECHO_PERFIL_FERRAMENTA = os.getenv('ECHO_PERFIL_FERRAMENTA', 'cprofile')
+ECHO_PERFIL_DIR = os.getenv('ECHO_PERFIL_DIR', str(BASE_DIR / 'perfis'))
+
+# ==============================================================
+# 🐢 CONSULTAS LENTAS (Echo_app/consultas_lentas.py) 🐢
+# ==============================================================
+
+# Consultas acima de ECHO_CONSULTAS_LENTAS_MS vão para o arquivo JSONL com a
+# linha do app que as disparou; `python manage.py consultas_lentas` mostra as piores.
+# Com 0 toda consulta é registrada (útil para auditar uma rota no desenvolvimento).
+# Desligado por padrão em produção: o arquivo só cresce (não há rotação) e é gravado por
+# todos os processos; ligue com ECHO_CONSULTAS_LENTAS=1 por um período e apague depois.
+ECHO_CONSULTAS_LENTAS = os.getenv('ECHO_CONSULTAS_LENTAS', '1' if NOT_PROD else '0').lower() in ['true', 't', '1']
+ECHO_CONSULTAS_LENTAS_MS = float(os.getenv('ECHO_CONSULTAS_LENTAS_MS', 100))
+ECHO_CONSULTAS_LENTAS_ARQUIVO = os.getenv('ECHO_CONSULTAS_LENTAS_ARQUIVO', str(BASE_DIR / 'consultas_lentas.jsonl'))
+
 # --- INTERNACIONALIZAÇÃO (caso ainda não tenha) ---
 LANGUAGE_CODE = 'pt-br'
 TIME_ZONE = 'America/Recife'